@@ -0,0 +1,102 @@
+# app/core/checkpoint.py
+import json
+import os
+import shutil
+from app.models import Page
+from config import (
+    PIPELINE_VERSION, OCR_LANG, OCR_CONFIG, OCR_ENGINE, OCR_TARGET_DPI, OCR_BINARIZE,
+    OCR_MIN_TEXT_CHARS, OCR_MAX_GARBAGE_RATIO, OCR_MIN_IMAGE_COVERAGE,
+)
+from typing import Dict, Optional, Set, Tuple
+
+# Version of the on-disk checkpoint layout. Bump it when the files change shape.
+CHECKPOINT_FORMAT = 2
+
+def pipeline_fingerprint() -> Dict:
+    """
+    Describes everything that changes the content of a page checkpoint. A
+    checkpoint written under a different fingerprint is discarded.
+    """
+    return {
+        "format": CHECKPOINT_FORMAT,
+        "pipeline": PIPELINE_VERSION,
+        "ocr": [OCR_LANG, OCR_CONFIG, OCR_ENGINE, OCR_TARGET_DPI, OCR_BINARIZE,
+                OCR_MIN_TEXT_CHARS, OCR_MAX_GARBAGE_RATIO, OCR_MIN_IMAGE_COVERAGE],
+    }
+
+class PageCheckpoint:
+    """
+    Stores the extraction and OCR result of each page of a job under a job
+    directory, so an interrupted conversion can resume where it stopped.
+
+    Pages may be saved in any order; a resumed run redoes only the pages that
+    are missing. Pages whose OCR failed are not saved, so they are retried.
+    """
+    def __init__(self, job_dir: str, content_hash: str = ""):
+        self.job_dir = job_dir
+        self.pages_dir = os.path.join(job_dir, "pages")
+        self.manifest_path = os.path.join(job_dir, "manifest.json")
+        manifest = dict(pipeline_fingerprint(), content_hash=content_hash)
+
+        if self._read_manifest() != manifest:
+            # Written by another pipeline version or for another file
+            self.clear()
+        os.makedirs(self.pages_dir, exist_ok=True)
+        if not os.path.exists(self.manifest_path):
+            self._write_json(self.manifest_path, manifest)
+
+    def completed_pages(self) -> Set[int]:
+        """
+        Returns the 1-based numbers of the pages that have been checkpointed.
+        """
+        try:
+            names = os.listdir(self.pages_dir)
+        except OSError:
+            return set()
+        return {int(name[len("page_"):-len(".json")]) for name in names
+                if name.startswith("page_") and name.endswith(".json")}
+
+    def save_page(self, page: Page, decision: Optional[Dict] = None):
+        """
+        Checkpoints a page once it has been extracted and, if needed, OCR'd.
+
+        Args:
+            page: The page, with ocr_text set if it was OCR'd.
+            decision: The OCR triage decision for the page.
+        """
+        self._write_json(self._page_path(page.number), {"page": page.to_dict(), "decision": decision})
+
+    def load_page(self, number: int) -> Tuple[Page, Optional[Dict]]:
+        """
+        Loads a checkpointed page.
+
+        Returns:
+            A tuple of the page and its OCR triage decision.
+        """
+        with open(self._page_path(number), "r", encoding="utf-8") as f:
+            record = json.load(f)
+        return Page.from_dict(record["page"]), record["decision"]
+
+    def clear(self):
+        """
+        Deletes the job directory and everything checkpointed in it.
+        """
+        if os.path.exists(self.job_dir):
+            shutil.rmtree(self.job_dir)
+
+    def _page_path(self, number: int) -> str:
+        return os.path.join(self.pages_dir, f"page_{number:06d}.json")
+
+    def _read_manifest(self) -> Optional[Dict]:
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_json(self, path: str, data: Dict):
+        # Write to a temporary file first so a crash never leaves a partial checkpoint
+        temp_path = path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(temp_path, path)
@@ -0,0 +1,155 @@
+# app/core/conversion_cache.py
+import hashlib
+import json
+import os
+import shutil
+import time
+from app.core.checkpoint import pipeline_fingerprint
+from app.core.output_profiles import get_output_profile
+from config import (
+    CONVERSION_CACHE_FOLDER, CONVERSION_CACHE_MAX_BYTES, CONVERSION_CACHE_MAX_AGE,
+    STREAMING_MIN_PAGES, FONT_SAMPLE_MIN_PAGES, FONT_SAMPLE_BATCH, FONT_SAMPLE_MAX_FRACTION, FONT_SAMPLE_MAX_ERROR,
+    RUNNING_LINE_MARGIN, RUNNING_LINE_BAND, RUNNING_LINE_MIN_SHARE, RUNNING_LINE_MIN_PAGES, RUNNING_LINE_SAMPLE_PAGES,
+    READING_ORDER, READING_ORDER_MIN_GAP, TABLE_DETECTION, TABLE_MIN_ROWS, TABLE_MIN_COLUMNS,
+    IMAGE_EXTRACTION, IMAGE_MIN_SIZE, IMAGE_SCAN_COVERAGE, IMAGE_MAX_WIDTH, IMAGE_MAX_HEIGHT, IMAGE_JPEG_QUALITY,
+    OCR_ALLOW_PARTIAL, OCR_PAGE_TIMEOUT,
+    PARAGRAPH_LINE_GAP, PARAGRAPH_INDENT, PARAGRAPH_SHORT_LINE, STRUCTURE_USE_OUTLINE, OUTLINE_MIN_ENTRIES,
+    EPUB_BACKEND, EPUB_MAX_CHAPTER_BYTES,
+)
+from typing import Dict, List, Optional, Tuple
+
+def conversion_key(content_hash: str, profile: Optional[str] = None) -> str:
+    """
+    Builds the cache key of a conversion: the content hash of the PDF plus a
+    fingerprint of the pipeline version and every option that changes the EPUB.
+    Code changes are covered by PIPELINE_VERSION, through pipeline_fingerprint().
+    """
+    options = dict(
+        pipeline_fingerprint(),
+        settings=[
+            STREAMING_MIN_PAGES, FONT_SAMPLE_MIN_PAGES, FONT_SAMPLE_BATCH, FONT_SAMPLE_MAX_FRACTION, FONT_SAMPLE_MAX_ERROR,
+            RUNNING_LINE_MARGIN, RUNNING_LINE_BAND, RUNNING_LINE_MIN_SHARE, RUNNING_LINE_MIN_PAGES, RUNNING_LINE_SAMPLE_PAGES,
+            READING_ORDER, READING_ORDER_MIN_GAP, TABLE_DETECTION, TABLE_MIN_ROWS, TABLE_MIN_COLUMNS,
+            IMAGE_EXTRACTION, IMAGE_MIN_SIZE, IMAGE_SCAN_COVERAGE, IMAGE_MAX_WIDTH, IMAGE_MAX_HEIGHT, IMAGE_JPEG_QUALITY,
+            OCR_ALLOW_PARTIAL, OCR_PAGE_TIMEOUT,
+            PARAGRAPH_LINE_GAP, PARAGRAPH_INDENT, PARAGRAPH_SHORT_LINE, STRUCTURE_USE_OUTLINE, OUTLINE_MIN_ENTRIES,
+            EPUB_BACKEND, EPUB_MAX_CHAPTER_BYTES,
+        ],
+        profile=get_output_profile(profile).name,
+    )
+    fingerprint = hashlib.sha256(json.dumps(options, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+    return f"{content_hash}-{fingerprint}"
+
+class ConversionCache:
+    """
+    Stores finished EPUBs on disk, one directory per conversion key, with
+    age- and size-based eviction.
+
+    An entry's directory is touched whenever it is served, so its modification
+    time is the time it was last used.
+    """
+    def __init__(self, directory: str = CONVERSION_CACHE_FOLDER, max_bytes: int = CONVERSION_CACHE_MAX_BYTES,
+                 max_age: float = CONVERSION_CACHE_MAX_AGE):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Returns the path of the cached EPUB for a key, or None on a miss.
+        """
+        entry_dir = os.path.join(self.directory, key)
+        path = self._epub_path(entry_dir)
+        if path is not None and time.time() - os.path.getmtime(entry_dir) > self.max_age:
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            path = None
+        if path is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        os.utime(entry_dir)
+        return path
+
+    def put(self, key: str, epub_path: str) -> str:
+        """
+        Moves a finished EPUB into the cache and evicts entries as needed.
+
+        The file keeps its name. If another conversion stored the same key in
+        the meantime, that entry is kept and this file is discarded.
+
+        Returns:
+            The path of the cached EPUB.
+        """
+        entry_dir = os.path.join(self.directory, key)
+        staging_dir = os.path.join(self.directory, f".{key}.{os.getpid()}.tmp")
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        os.makedirs(staging_dir)
+        shutil.move(epub_path, os.path.join(staging_dir, os.path.basename(epub_path)))
+        try:
+            os.rename(staging_dir, entry_dir)  # Atomic: the entry appears complete or not at all
+        except OSError:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            if self._epub_path(entry_dir) is None:
+                raise
+        self._evict(keep=key)
+        return self._epub_path(entry_dir)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns the hit/miss counts of this process and the current size of the cache.
+        """
+        entries = self._entries()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+        }
+
+    def _epub_path(self, entry_dir: str) -> Optional[str]:
+        try:
+            names = [name for name in os.listdir(entry_dir) if name.endswith(".epub")]
+        except OSError:
+            return None
+        return os.path.join(entry_dir, names[0]) if names else None
+
+    def _entries(self) -> List[Tuple[str, int, float]]:
+        """
+        Returns (key, bytes, last used) for every complete entry.
+        """
+        entries = []
+        for key in os.listdir(self.directory):
+            entry_dir = os.path.join(self.directory, key)
+            path = self._epub_path(entry_dir)
+            if key.startswith(".") or path is None:
+                continue
+            try:
+                entries.append((key, os.path.getsize(path), os.path.getmtime(entry_dir)))
+            except OSError:  # Evicted by another process meanwhile
+                continue
+        return entries
+
+    def _evict(self, keep: str):
+        now = time.time()
+        entries = sorted(self._entries(), key=lambda entry: entry[2])  # Least recently used first
+        total = sum(size for _, size, _ in entries)
+        for key, size, last_used in entries:
+            if key != keep and (now - last_used > self.max_age or total > self.max_bytes):
+                shutil.rmtree(os.path.join(self.directory, key), ignore_errors=True)
+                total -= size
+
+_default_cache: Optional[ConversionCache] = None
+
+def get_conversion_cache() -> Optional[ConversionCache]:
+    """
+    Returns the process-wide cache configured in config.py, or None if caching is disabled.
+    """
+    global _default_cache
+    if CONVERSION_CACHE_FOLDER is None:
+        return None
+    if _default_cache is None:
+        _default_cache = ConversionCache(CONVERSION_CACHE_FOLDER, CONVERSION_CACHE_MAX_BYTES, CONVERSION_CACHE_MAX_AGE)
+    return _default_cache
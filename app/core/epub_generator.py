@@ -1,82 +1,177 @@
 # app/core/epub_generator.py
 import os
-from ebooklib import epub
-from app.models import ParsedPDF, Chapter, Heading
+from html import escape
+from app.models import ParsedPDF, Chapter, Figure, Heading, Paragraph, Table
+from app.core.epub_writer import EpubWriter, open_epub_writer
+from app.core.image_pipeline import ImagePipeline
+from app.core.output_profiles import OutputProfile
 from app.core.utils import sanitize_filename
-from typing import List
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
-def create_epub(pdf: ParsedPDF, output_path: str):
+def create_epub(pdf: ParsedPDF, output_path: str, backend: Optional[str] = None,
+                profile: Union[str, OutputProfile, None] = None):
     """
     Creates an EPUB file from a ParsedPDF object.
 
     Args:
         pdf: The ParsedPDF object containing the parsed data.
         output_path: The path where the EPUB file should be saved.
+        backend: The EPUB writer backend. Defaults to EPUB_BACKEND.
+        profile: The output profile, or its name. Defaults to OUTPUT_PROFILE.
+            The bytes written and the time spent are recorded as metadata["output"].
     """
     print("Inside create_epub")
-    book = epub.EpubBook()
-
-    # Set metadata
-    book.set_identifier(pdf.metadata.get("id", "unknown"))
-    book.set_title(pdf.metadata.get("title", "Untitled"))
-    book.set_language("en")  # Assuming English for now
-    if pdf.metadata.get("author"):
-        book.add_author(pdf.metadata.get("author"))
-
-    # Create chapters and add them to the book
-    chapters = []
-    for i, chapter_data in enumerate(pdf.chapters):
-        chapter_title = chapter_data.title
-        chapter_file_name = f"chapter_{i+1}.xhtml"
-        chapter = epub.EpubHtml(
-            title=chapter_title,
-            file_name=chapter_file_name,
-            lang="en"
-        )
-
-        # Create chapter content with headings
-        chapter_content = f"<h1>{chapter_title}</h1>"  # Add chapter title as h1
-        for part in chapter_data.content:
-            if part in [h.text for h in chapter_data.headings]:
-                chapter_content += f"<h2>{part}</h2>"  # Add headings as h2
-            else:
-                chapter_content += f"<p>{part}</p>"  # Add paragraphs
-
-        chapter.set_content(chapter_content)
-        book.add_item(chapter)
-        chapters.append(chapter)
-
-    # Define Table of Contents
-    book.toc = (chapters)
-
-    # Add default NCX and Nav files
-    book.add_item(epub.EpubNcx())
-    book.add_item(epub.EpubNav())
-
-    # Define CSS style
-    style = """
-        body {
-            font-family: sans-serif;
-        }
-        h1 {
-            text-align: center;
-            font-weight: bold;
-        }
-        h2 {
-            font-weight: bold;
-        }
-        p {
-            text-indent: 1.5em;
-            line-height: 1.4;
-        }
-    """
-    nav_css = epub.EpubItem(
-        uid="style_nav", file_name="style/nav.css", media_type="text/css", content=style
-    )
-    book.add_item(nav_css)
-
-    # Set the basic book structure
-    book.spine = ["nav"] + chapters
-
-    # Write the EPUB file
-    epub.write_epub(output_path, book, {})
\ No newline at end of file
+    writer = open_epub_writer(pdf.metadata, output_path, backend, profile=profile)
+
+    # Write chapters with headings
+    for chapter_data in pdf.chapters:
+        writer.start_chapter(chapter_data.title)
+        for html, heading in iter_chapter_blocks(chapter_data):
+            writer.write(html, heading)
+        writer.end_chapter()
+        _add_images(writer, pdf.images)
+
+    _add_images(writer, pdf.images)
+    if pdf.images is not None:
+        pdf.metadata["images"] = pdf.images.stats()
+    pdf.metadata["output"] = writer.close()
+
+def create_epub_from_events(events: Iterable[Tuple], metadata: Dict, output_path: str,
+                            backend: Optional[str] = None, images: Optional[ImagePipeline] = None,
+                            profile: Union[str, OutputProfile, None] = None):
+    """
+    Creates an EPUB file from a stream of chapter events.
+
+    Each chapter is rendered to XHTML as its events arrive. With the streaming
+    backend the markup goes straight into the zip archive, so neither the pages
+    nor the rendered chapters are held in memory.
+
+    Args:
+        events: Chapter events, as produced by structure_analyzer.iter_structure().
+        metadata: The document metadata (title, author, id).
+        output_path: The path where the EPUB file should be saved.
+        backend: The EPUB writer backend. Defaults to EPUB_BACKEND.
+        images: The image pipeline behind the ("image", Figure) events. The
+            images of each chapter are added to the book after it.
+        profile: The output profile, or its name. Defaults to OUTPUT_PROFILE.
+            The bytes written and the time spent are recorded as metadata["output"].
+    """
+    writer = open_epub_writer(metadata, output_path, backend, profile=profile)
+
+    for event in events:
+        kind = event[0]
+        if kind == "chapter_start":
+            writer.start_chapter(event[1])
+            writer.write(f"<h1>{escape(event[1], quote=False)}</h1>")  # Add chapter title as h1
+        elif kind == "heading":
+            writer.write(_heading_html(event[1], event[2]), heading=True)
+        elif kind == "text":
+            writer.write(f"<p>{_inline_html(event[1])}</p>")  # Add paragraphs
+        elif kind == "table":
+            writer.write(_table_html(event[1]))
+        elif kind == "image":
+            writer.write(_figure_html(event[1]))
+            if images is not None:
+                # Long chapters keep no more than IMAGE_MAX_PENDING images in memory
+                _add_images(writer, images, images.max_pending)
+        elif kind == "chapter_end":
+            writer.end_chapter()
+            _add_images(writer, images)
+
+    _add_images(writer, images)
+    if images is not None:
+        metadata["images"] = images.stats()
+    metadata["output"] = writer.close()
+
+def _add_images(writer: EpubWriter, images: Optional[ImagePipeline], keep: int = 0):
+    """
+    Adds the images submitted to the pipeline so far to the book, oldest first,
+    until at most `keep` are left, waiting for those still being encoded.
+
+    How many are added only depends on how many were submitted, so the archive
+    layout does not depend on how fast the workers were.
+    """
+    if images is None:
+        return
+    for image in images.drain(keep):
+        writer.add_image(image)
+
+def render_chapter(chapter: Chapter) -> str:
+    """
+    Renders the body markup of a chapter in one pass over its content.
+
+    Args:
+        chapter: The Chapter object.
+
+    Returns:
+        The XHTML body markup, starting with the chapter title as h1.
+    """
+    return "".join(html for html, _ in iter_chapter_blocks(chapter))
+
+def iter_chapter_blocks(chapter: Chapter) -> Iterator[Tuple[str, bool]]:
+    """
+    Renders a chapter block by block, the units a chapter file may be split between.
+
+    Headings are taken from the Heading markers in the content. Chapters built
+    with heading texts in the content instead are matched against a lookup
+    table built once per chapter, so rendering stays linear in both cases.
+
+    Yields:
+        (html, is_heading) tuples, starting with the chapter title as h1.
+    """
+    if any(isinstance(part, Heading) for part in chapter.content):
+        heading_levels = {}
+    else:
+        heading_levels = {heading.text: heading.level for heading in chapter.headings}
+
+    yield f"<h1>{escape(chapter.title, quote=False)}</h1>", True  # Add chapter title as h1
+    for part in chapter.content:
+        if isinstance(part, Heading):
+            yield _heading_html(part.text, part.level), True
+        elif isinstance(part, Table):
+            yield _table_html(part), False
+        elif isinstance(part, Figure):
+            yield _figure_html(part), False
+        elif isinstance(part, str) and part in heading_levels:
+            yield _heading_html(part, heading_levels[part]), True
+        else:
+            yield f"<p>{_inline_html(part)}</p>", False  # Add paragraphs
+
+def _heading_html(text: str, level: int) -> str:
+    """
+    Renders a heading below the chapter title: level 1 as h2, down to h6.
+    """
+    tag = f"h{min(max(level, 1) + 1, 6)}"
+    return f"<{tag}>{escape(text, quote=False)}</{tag}>"
+
+def _inline_html(part: Union[str, Paragraph]) -> str:
+    """
+    Returns the inner markup of a paragraph, with bold and italic runs kept.
+    """
+    if not isinstance(part, Paragraph):
+        return escape(part, quote=False)
+    html = []
+    for run in part.runs:
+        text = escape(run.text, quote=False)
+        if run.italic:
+            text = f"<i>{text}</i>"
+        if run.bold:
+            text = f"<b>{text}</b>"
+        html.append(text)
+    return "".join(html)
+
+def _figure_html(figure: Figure) -> str:
+    """
+    Renders an image placed in the text flow.
+    """
+    return f'<div class="figure"><img src="{escape(figure.file_name)}" alt=""/></div>'
+
+def _table_html(table: Table) -> str:
+    """
+    Renders a table as XHTML, with a header row when the table has one.
+    """
+    rows = []
+    for i, row in enumerate(table.rows):
+        tag = "th" if i == 0 and table.header else "td"
+        rows.append("<tr>" + "".join(f"<{tag}>{escape(cell, quote=False)}</{tag}>" for cell in row) + "</tr>")
+    return "<table>" + "".join(rows) + "</table>"
@@ -0,0 +1,498 @@
+# app/core/epub_writer.py
+import os
+import re
+import time
+import zipfile
+from datetime import datetime, timedelta
+from html import escape
+from ebooklib import epub
+from config import EPUB_BACKEND, EPUB_MAX_CHAPTER_BYTES
+from app.models import BookImage
+from app.core.output_profiles import OutputProfile, get_output_profile
+from typing import Dict, List, Optional, Tuple, Union
+
+# Style sheet shared by both backends
+STYLE = """
+    body {
+        font-family: sans-serif;
+    }
+    h1 {
+        text-align: center;
+        font-weight: bold;
+    }
+    h2 {
+        font-weight: bold;
+    }
+    p {
+        text-indent: 1.5em;
+        line-height: 1.4;
+    }
+    div.figure {
+        text-align: center;
+        margin: 1em 0;
+    }
+    div.figure img {
+        max-width: 100%;
+    }
+"""
+
+# Chapter markup is collected up to this many bytes before it is compressed
+# into the archive
+WRITE_BUFFER_BYTES = 64 * 1024
+
+# Images added while a chapter file is open wait until it is closed, since the
+# archive is written one entry at a time. Once they hold this many bytes, the
+# file is split at the next block so they can be written.
+MAX_WAITING_IMAGE_BYTES = 4 * 1024 * 1024
+
+# dcterms:modified of books whose PDF carries no date
+DEFAULT_MODIFIED = "1980-01-01T00:00:00Z"
+
+PDF_DATE = re.compile(r"(?:D:)?(\d{4})(\d{2})?(\d{2})?(\d{2})?(\d{2})?(\d{2})?(?:([Zz+\-])(\d{2})?'?(\d{2})?'?)?")
+
+# Timestamp of every zip entry, so the archive only depends on its content
+ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+# Whether epub.write_epub() honours the compresslevel option; ebooklib 0.18 ignores it
+EBOOKLIB_COMPRESSLEVEL = "compresslevel" in epub.EpubWriter.DEFAULT_OPTIONS
+
+# Deflate level zlib uses when none is given
+ZLIB_DEFAULT_LEVEL = 6
+
+CONTAINER_XML = """<?xml version="1.0" encoding="utf-8"?>
+<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">
+  <rootfiles>
+    <rootfile full-path="EPUB/content.opf" media-type="application/oebps-package+xml"/>
+  </rootfiles>
+</container>
+"""
+
+class EpubWriter:
+    """
+    Base class of the EPUB backends. Chapters are written one at a time:
+    start_chapter(), one write() call per block of XHTML body markup (heading,
+    paragraph or table), then end_chapter(). close() finishes the book.
+
+    A chapter whose markup grows past max_chapter_bytes continues in a new
+    spine item, so no file gets much larger than the budget whatever the
+    structure detection found. Files are only split between blocks, preferably
+    before a heading once the current file is half full; a single block larger
+    than the budget gets a file of its own. The table of contents links to the
+    first file of each chapter.
+
+    close() reports the size of the book and the time spent since the writer
+    was opened, under the output profile it was written with.
+    """
+    def __init__(self, metadata: Dict, output_path: str, max_chapter_bytes: Optional[int] = None,
+                 profile: Union[str, OutputProfile, None] = None):
+        self.started = time.perf_counter()
+        self.metadata = metadata
+        self.output_path = output_path
+        self.profile = get_output_profile(profile)
+        self.max_chapter_bytes = EPUB_MAX_CHAPTER_BYTES if max_chapter_bytes is None else max_chapter_bytes
+        self.chapters: List[Tuple[str, str]] = []  # (title, file name of the first part)
+        self.files: List[Tuple[str, str]] = []  # (file name, title), in spine order
+        self._part = 0
+        self._size = 0
+
+    def start_chapter(self, title: str):
+        file_name = f"chapter_{len(self.chapters) + 1}.xhtml"
+        self.chapters.append((title, file_name))
+        self._part = 1
+        self._start_file(file_name, title)
+
+    def write(self, html: str, heading: bool = False):
+        data = html.encode("utf-8")
+        if self._size and (self._holding_images() or self.max_chapter_bytes and (
+            self._size + len(data) > self.max_chapter_bytes
+            or (heading and self._size * 2 >= self.max_chapter_bytes)
+        )):
+            self._close_file()
+            self._part += 1
+            self._start_file(f"chapter_{len(self.chapters)}_{self._part}.xhtml", self.chapters[-1][0])
+        self._size += len(data)
+        self._write_file(data)
+
+    def end_chapter(self):
+        self._close_file()
+
+    def add_image(self, image: BookImage):
+        """
+        Adds an image file to the book, at any time before close().
+        """
+        raise NotImplementedError
+
+    def close(self) -> Dict:
+        """
+        Finishes the book.
+
+        Returns:
+            The output report: profile name, bytes written and seconds spent.
+        """
+        raise NotImplementedError
+
+    def add_chapter(self, title: str, html: str):
+        self.start_chapter(title)
+        self.write(html)
+        self.end_chapter()
+
+    def _report(self) -> Dict:
+        return {
+            "profile": self.profile.name,
+            "bytes": os.path.getsize(self.output_path),
+            "seconds": round(time.perf_counter() - self.started, 3),
+        }
+
+    def _start_file(self, file_name: str, title: str):
+        self.files.append((file_name, title))
+        self._size = 0
+        self._open_file(file_name, title)
+
+    def _holding_images(self) -> bool:
+        """
+        Whether images waiting for the current file to close should be written now.
+        """
+        return False
+
+    def _open_file(self, file_name: str, title: str):
+        raise NotImplementedError
+
+    def _write_file(self, data: bytes):
+        raise NotImplementedError
+
+    def _close_file(self):
+        raise NotImplementedError
+
+class StreamingEpubWriter(EpubWriter):
+    """
+    Writes an EPUB3 file straight into the zip archive.
+
+    The uncompressed `mimetype` entry goes first, as the format requires, and
+    each chapter is streamed into its own entries as it is written. Only the
+    file names and titles are kept, so memory stays flat however long the book
+    is. The package document, NCX and nav document are written last.
+    """
+    def __init__(self, metadata: Dict, output_path: str, max_chapter_bytes: Optional[int] = None,
+                 profile: Union[str, OutputProfile, None] = None):
+        super().__init__(metadata, output_path, max_chapter_bytes, profile)
+        self.zip = zipfile.ZipFile(output_path, "w", compression=zipfile.ZIP_DEFLATED,
+                                   compresslevel=self.profile.compress_level)
+        self._entry = None
+        self._buffer: List[bytes] = []
+        self._buffered = 0
+        self.images: List[Tuple[str, str]] = []  # (file name, media type)
+        self._waiting_images: List[BookImage] = []  # Added while a chapter file was open
+        self._waiting_bytes = 0
+        self._writestr("mimetype", "application/epub+zip", zipfile.ZIP_STORED)
+        self._writestr("META-INF/container.xml", CONTAINER_XML)
+        self._writestr("EPUB/style/nav.css", minify_css(STYLE) if self.profile.minify else STYLE)
+
+    def _open_file(self, file_name: str, title: str):
+        self._entry = self.zip.open(self._streamed_info(f"EPUB/{file_name}"), "w")
+        self._write_text(
+            "<?xml version='1.0' encoding='utf-8'?>\n<!DOCTYPE html>\n"
+            '<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops" lang="en" xml:lang="en">\n'
+            f"<head><title>{escape(title)}</title>"
+            '<link href="style/nav.css" rel="stylesheet" type="text/css"/></head>\n<body>',
+            xml=True,
+        )
+
+    def _write_file(self, data: bytes):
+        self._write_raw(data)
+
+    def _close_file(self):
+        self._write_text("</body>\n</html>\n", xml=True)
+        self._flush()
+        self._entry.close()
+        self._entry = None
+        for image in self._waiting_images:
+            self._write_image(image)
+        self._waiting_images = []
+        self._waiting_bytes = 0
+
+    def add_image(self, image: BookImage):
+        # Only one zip entry can be written at a time
+        if self._entry is not None:
+            self._waiting_images.append(image)
+            self._waiting_bytes += len(image.data)
+        else:
+            self._write_image(image)
+
+    def _holding_images(self) -> bool:
+        return self._waiting_bytes >= MAX_WAITING_IMAGE_BYTES
+
+    def _write_image(self, image: BookImage):
+        self.images.append((image.file_name, image.media_type))
+        # Images are compressed already; deflate only squeezes out the last bytes
+        compress_type = zipfile.ZIP_STORED if self.profile.store_media else zipfile.ZIP_DEFLATED
+        self.zip.writestr(self._info(f"EPUB/{image.file_name}", compress_type), image.data,
+                          compresslevel=self.profile.compress_level)
+
+    def _write_text(self, text: str, xml: bool = False):
+        self._write_raw((minify_xml(text) if xml and self.profile.minify else text).encode("utf-8"))
+
+    def _write_raw(self, data: bytes):
+        self._buffer.append(data)
+        self._buffered += len(data)
+        if self._buffered >= WRITE_BUFFER_BYTES:
+            self._flush()
+
+    def _flush(self):
+        self._entry.write(b"".join(self._buffer))
+        self._buffer = []
+        self._buffered = 0
+
+    def close(self) -> Dict:
+        minify = minify_xml if self.profile.minify else (lambda xml: xml)
+        self._writestr("EPUB/toc.ncx", minify(self._ncx()))
+        self._writestr("EPUB/nav.xhtml", minify(self._nav()))
+        self._writestr("EPUB/content.opf", minify(self._opf()))
+        self.zip.close()
+        return self._report()
+
+    def _info(self, name: str, compress_type: int = zipfile.ZIP_DEFLATED) -> zipfile.ZipInfo:
+        info = zipfile.ZipInfo(name, date_time=ZIP_DATE_TIME)
+        info.compress_type = compress_type
+        return info
+
+    def _streamed_info(self, name: str) -> zipfile.ZipInfo:
+        # Entries given as ZipInfo do not inherit the level of the archive, and
+        # ZipFile.open() takes none; ZipInfo.compress_level is public from Python 3.13
+        info = self._info(name)
+        if hasattr(info, "compress_level"):
+            info.compress_level = self.profile.compress_level
+        else:
+            info._compresslevel = self.profile.compress_level
+        return info
+
+    def _writestr(self, name: str, data: str, compress_type: int = zipfile.ZIP_DEFLATED):
+        self.zip.writestr(self._info(name, compress_type), data.encode("utf-8"),
+                          compresslevel=self.profile.compress_level)
+
+    def _opf(self) -> str:
+        identifier = escape(book_identifier(self.metadata))
+        title = escape(self.metadata.get("title") or "Untitled")
+        author = self.metadata.get("author")
+        modified = book_modified(self.metadata)
+        items = "".join(
+            f'\n    <item href="{file_name}" id="{_item_id(file_name)}" media-type="application/xhtml+xml"/>'
+            for file_name, _ in self.files
+        ) + "".join(
+            f'\n    <item href="{file_name}" id="{_item_id(file_name)}" media-type="{media_type}"/>'
+            for file_name, media_type in self.images
+        )
+        itemrefs = "".join(f'\n    <itemref idref="{_item_id(file_name)}"/>' for file_name, _ in self.files)
+        creator = f'\n    <dc:creator id="creator">{escape(author)}</dc:creator>' if author else ""
+        return (
+            '<?xml version="1.0" encoding="utf-8"?>\n'
+            '<package xmlns="http://www.idpf.org/2007/opf" unique-identifier="id" version="3.0">\n'
+            '  <metadata xmlns:dc="http://purl.org/dc/elements/1.1/">\n'
+            f'    <dc:identifier id="id">{identifier}</dc:identifier>\n'
+            f"    <dc:title>{title}</dc:title>\n"
+            f"    <dc:language>en</dc:language>{creator}\n"
+            f'    <meta property="dcterms:modified">{modified}</meta>\n'
+            "  </metadata>\n"
+            "  <manifest>\n"
+            '    <item href="nav.xhtml" id="nav" media-type="application/xhtml+xml" properties="nav"/>\n'
+            '    <item href="toc.ncx" id="ncx" media-type="application/x-dtbncx+xml"/>\n'
+            f'    <item href="style/nav.css" id="style_nav" media-type="text/css"/>{items}\n'
+            "  </manifest>\n"
+            '  <spine toc="ncx">\n'
+            f'    <itemref idref="nav"/>{itemrefs}\n'
+            "  </spine>\n"
+            "</package>\n"
+        )
+
+    def _ncx(self) -> str:
+        points = "".join(
+            f'\n    <navPoint id="chapter_{i}" playOrder="{i}"><navLabel><text>{escape(title)}</text></navLabel>'
+            f'<content src="{file_name}"/></navPoint>'
+            for i, (title, file_name) in enumerate(self.chapters, 1)
+        )
+        return (
+            '<?xml version="1.0" encoding="utf-8"?>\n'
+            '<ncx xmlns="http://www.daisy.org/z3986/2005/ncx/" version="2005-1">\n'
+            f'  <head><meta content="{escape(book_identifier(self.metadata))}" name="dtb:uid"/></head>\n'
+            f'  <docTitle><text>{escape(self.metadata.get("title") or "Untitled")}</text></docTitle>\n'
+            f"  <navMap>{points}\n  </navMap>\n"
+            "</ncx>\n"
+        )
+
+    def _nav(self) -> str:
+        entries = "".join(
+            f'\n      <li><a href="{file_name}">{escape(title)}</a></li>' for title, file_name in self.chapters
+        )
+        return (
+            "<?xml version='1.0' encoding='utf-8'?>\n<!DOCTYPE html>\n"
+            '<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops" lang="en" xml:lang="en">\n'
+            f"<head><title>{escape(self.metadata.get('title') or 'Untitled')}</title></head>\n"
+            f'<body>\n  <nav epub:type="toc" id="id" role="doc-toc">\n    <ol>{entries}\n    </ol>\n  </nav>\n</body>\n</html>\n'
+        )
+
+class EbooklibEpubWriter(EpubWriter):
+    """
+    Compatibility backend that builds an ebooklib EpubBook in memory and writes
+    it with epub.write_epub() on close(). Of the output profile only the deflate
+    level applies: ebooklib compresses every entry and pretty-prints the XHTML.
+    Versions of ebooklib that ignore the compresslevel option, such as 0.18,
+    write at zlib's default level, so the archive is then recompressed.
+    """
+    def __init__(self, metadata: Dict, output_path: str, max_chapter_bytes: Optional[int] = None,
+                 profile: Union[str, OutputProfile, None] = None):
+        super().__init__(metadata, output_path, max_chapter_bytes, profile)
+        self.book = epub.EpubBook()
+        self.items: List[epub.EpubHtml] = []
+        self.parts: List[bytes] = []
+
+        # Set metadata
+        self.book.set_identifier(book_identifier(metadata))
+        self.book.set_title(metadata.get("title", "Untitled"))
+        self.book.set_language("en")  # Assuming English for now
+        if metadata.get("author"):
+            self.book.add_author(metadata.get("author"))
+
+    def add_image(self, image: BookImage):
+        self.book.add_item(epub.EpubImage(
+            uid=_item_id(image.file_name), file_name=image.file_name, media_type=image.media_type, content=image.data
+        ))
+
+    def close(self) -> Dict:
+        # Define Table of Contents: the first part of each chapter
+        first_parts = {file_name for _, file_name in self.chapters}
+        self.book.toc = [item for item in self.items if item.file_name in first_parts]
+
+        # Add default NCX and Nav files
+        self.book.add_item(epub.EpubNcx())
+        self.book.add_item(epub.EpubNav())
+
+        nav_css = epub.EpubItem(
+            uid="style_nav", file_name="style/nav.css", media_type="text/css", content=STYLE
+        )
+        self.book.add_item(nav_css)
+
+        # Set the basic book structure
+        self.book.spine = ["nav"] + self.items
+
+        # Write the EPUB file
+        modified = datetime.strptime(book_modified(self.metadata), "%Y-%m-%dT%H:%M:%SZ")
+        epub.write_epub(self.output_path, self.book, {"compresslevel": self.profile.compress_level, "mtime": modified})
+        if not EBOOKLIB_COMPRESSLEVEL and self.profile.compress_level != ZLIB_DEFAULT_LEVEL:
+            recompress_epub(self.output_path, self.profile.compress_level)
+        return self._report()
+
+    def _open_file(self, file_name: str, title: str):
+        self.items.append(epub.EpubHtml(uid=_item_id(file_name), title=title, file_name=file_name, lang="en"))
+        self.parts = []
+
+    def _write_file(self, data: bytes):
+        self.parts.append(data)
+
+    def _close_file(self):
+        self.items[-1].set_content(b"".join(self.parts))
+        self.book.add_item(self.items[-1])
+        self.parts = []
+
+def recompress_epub(path: str, compress_level: int):
+    """
+    Rewrites an EPUB file with its deflated entries at the given level. The
+    order, timestamps and compression method of the entries are kept, so the
+    stored `mimetype` entry stays first.
+    """
+    temp_path = f"{path}.tmp"
+    try:
+        with zipfile.ZipFile(path) as source, zipfile.ZipFile(temp_path, "w") as target:
+            for info in source.infolist():
+                target.writestr(info, source.read(info), compresslevel=compress_level)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+def book_identifier(metadata: Dict) -> str:
+    """
+    Returns the unique identifier of the book: metadata["id"] if set, else one
+    derived from the content hash of the PDF, so the same PDF always gets the
+    same identifier.
+    """
+    if metadata.get("id"):
+        return str(metadata["id"])
+    if metadata.get("content_hash"):
+        return f"urn:sha256:{metadata['content_hash']}"
+    return "unknown"
+
+def book_modified(metadata: Dict) -> str:
+    """
+    Returns the dcterms:modified date of the book, in UTC.
+
+    It is taken from metadata["modified"], or from the modification or
+    creation date of the PDF, and is never the time of writing: converting the
+    same PDF twice gives byte-identical books.
+    """
+    if metadata.get("modified"):
+        return metadata["modified"]
+    for key in ("modification_date", "creation_date"):
+        date = _pdf_date(metadata.get(key) or "")
+        if date is not None:
+            return date.strftime("%Y-%m-%dT%H:%M:%SZ")
+    return DEFAULT_MODIFIED
+
+def _pdf_date(value: str) -> Optional[datetime]:
+    """
+    Parses a PDF date string (D:YYYYMMDDHHmmSSOHH'mm) and converts it to UTC.
+    """
+    match = PDF_DATE.match(value.strip())
+    if match is None:
+        return None
+    year, month, day, hour, minute, second, sign, offset_hours, offset_minutes = match.groups()
+    try:
+        date = datetime(int(year), int(month or 1), int(day or 1), int(hour or 0), int(minute or 0), int(second or 0))
+    except ValueError:
+        return None
+    if sign in ("+", "-"):
+        offset = timedelta(hours=int(offset_hours or 0), minutes=int(offset_minutes or 0))
+        date = date - offset if sign == "+" else date + offset
+    return date
+
+def minify_css(css: str) -> str:
+    """
+    Strips the layout whitespace from a style sheet.
+    """
+    css = re.sub(r"\s+", " ", css)
+    return re.sub(r"\s*([{};:,])\s*", r"\1", css).replace(";}", "}").strip()
+
+def minify_xml(xml: str) -> str:
+    """
+    Strips the whitespace between tags of generated markup. Only for markup
+    without mixed content, where that whitespace is layout only.
+    """
+    return re.sub(r">\s+<", "><", xml).strip()
+
+def _item_id(file_name: str) -> str:
+    """
+    Returns the manifest id of a file: its name without directory and extension.
+    """
+    return file_name.rsplit("/", 1)[-1].rsplit(".", 1)[0]
+
+EPUB_WRITERS = {
+    "streaming": StreamingEpubWriter,
+    "ebooklib": EbooklibEpubWriter,
+}
+
+def open_epub_writer(metadata: Dict, output_path: str, backend: Optional[str] = None,
+                     max_chapter_bytes: Optional[int] = None,
+                     profile: Union[str, OutputProfile, None] = None) -> EpubWriter:
+    """
+    Opens an EPUB writer for the given backend, EPUB_BACKEND by default.
+
+    Args:
+        metadata: The document metadata (title, author, id).
+        output_path: The path where the EPUB file should be saved.
+        backend: "streaming" or "ebooklib".
+        max_chapter_bytes: Size budget of a chapter file. Defaults to
+            EPUB_MAX_CHAPTER_BYTES; 0 disables splitting.
+        profile: The output profile, or its name. Defaults to OUTPUT_PROFILE.
+    """
+    backend = backend or EPUB_BACKEND
+    if backend not in EPUB_WRITERS:
+        raise ValueError(f"Unknown EPUB backend: {backend}")
+    return EPUB_WRITERS[backend](metadata, output_path, max_chapter_bytes, profile)
@@ -0,0 +1,281 @@
+# app/core/image_pipeline.py
+import hashlib
+import io
+import fitz
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from PIL import Image
+from app.models import BookImage, Figure, Page
+from app.core.ocr import bbox_coverage
+from app.core.output_profiles import OutputProfile, get_output_profile
+from config import (
+    IMAGE_MIN_SIZE, IMAGE_SCAN_COVERAGE, IMAGE_MAX_WIDTH, IMAGE_MAX_HEIGHT, IMAGE_JPEG_QUALITY, IMAGE_WORKERS, IMAGE_MAX_PENDING,
+)
+from typing import Deque, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+# Source formats that hold photos and stay JPEG; everything else (line art,
+# scans, images with a transparency mask) becomes PNG
+JPEG_SOURCES = {"jpeg", "jpx"}
+
+# Source formats PIL reads directly; others are decoded by MuPDF first
+PIL_SOURCES = {"jpeg", "png"}
+
+MEDIA_TYPES = {"jpeg": "image/jpeg", "png": "image/png"}
+EXTENSIONS = {"jpeg": "jpg", "png": "png"}
+
+def encode_image(data: bytes, target: str, max_width: int = IMAGE_MAX_WIDTH, max_height: int = IMAGE_MAX_HEIGHT,
+                 quality: int = IMAGE_JPEG_QUALITY, optimize: bool = True, recompress: bool = False) -> Tuple[bytes, int, int]:
+    """
+    Downscales an image to fit max_width x max_height pixels and encodes it.
+
+    An image that already is in the target format, fits and uses a color mode
+    e-readers display is kept byte for byte: re-encoding it would only lose
+    quality or make it larger. With `recompress` it is re-encoded anyway, and
+    the smaller of the two is kept.
+
+    Args:
+        data: The encoded image, in a format PIL reads.
+        target: "jpeg" or "png".
+        max_width: Maximum width in pixels.
+        max_height: Maximum height in pixels.
+        quality: JPEG quality, 1-95.
+        optimize: Let the encoder spend extra time on a smaller file.
+        recompress: Re-encode images that could be kept as they are.
+
+    Returns:
+        A tuple of the encoded image and its width and height in pixels.
+    """
+    image = Image.open(io.BytesIO(data))
+    fits = image.width <= max_width and image.height <= max_height
+    if fits and (image.format or "").lower() == target and image.mode in ("1", "L", "P", "LA", "RGB", "RGBA"):
+        if not recompress:
+            return data, image.width, image.height
+        encoded = _save(image, target, quality, optimize)
+        return min(encoded, data, key=len), image.width, image.height
+    if not fits:
+        image.thumbnail((max_width, max_height), Image.LANCZOS)
+    return _save(image, target, quality, optimize), image.width, image.height
+
+def _save(image: Image.Image, target: str, quality: int, optimize: bool) -> bytes:
+    output = io.BytesIO()
+    if target == "jpeg":
+        if image.mode not in ("L", "RGB"):
+            image = image.convert("RGB")
+        image.save(output, "JPEG", quality=quality, optimize=optimize)
+    else:
+        if image.mode not in ("1", "L", "P", "LA", "RGB", "RGBA"):
+            image = image.convert("RGBA" if "A" in image.mode else "RGB")
+        image.save(output, "PNG", optimize=optimize)
+    return output.getvalue()
+
+def _pixmap_png(doc: fitz.Document, xref: int, smask: int = 0) -> bytes:
+    """
+    Decodes an image with MuPDF, applying its transparency mask, and returns it as PNG.
+    """
+    pixmap = fitz.Pixmap(doc, xref)
+    if pixmap.colorspace and pixmap.colorspace.n not in (1, 3):
+        pixmap = fitz.Pixmap(fitz.csRGB, pixmap)
+    if smask:
+        pixmap = fitz.Pixmap(pixmap, fitz.Pixmap(doc, smask))
+    return pixmap.tobytes("png")
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_workers = 0
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    Returns the long-lived image worker pool, so jobs do not pay for starting it.
+    """
+    global _pool, _pool_workers
+    if _pool is None or _pool_workers != workers:
+        shutdown_image_pool()
+        _pool = ProcessPoolExecutor(max_workers=workers)
+        _pool_workers = workers
+    return _pool
+
+def shutdown_image_pool(wait: bool = True):
+    """
+    Stops the image worker pool. A new one is started when the next image is submitted.
+    """
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=wait, cancel_futures=True)
+        _pool = None
+
+class ImagePipeline:
+    """
+    Turns the image placements of pages into Figures, and the images behind
+    them into BookImages for the EPUB writer.
+
+    Each image is extracted once per document: placements are deduplicated by
+    xref, and images stored under several xrefs by a hash of their data. The
+    file name of an image is known as soon as it is extracted, so pages move on
+    while the unique images are downscaled and re-encoded on a worker pool.
+    Encoded images are handed back in submission order by drain() and finish().
+    """
+    def __init__(self, doc: fitz.Document, workers: Optional[int] = None, max_pending: Optional[int] = None,
+                 max_width: int = IMAGE_MAX_WIDTH, max_height: int = IMAGE_MAX_HEIGHT,
+                 min_size: float = IMAGE_MIN_SIZE, profile: Union[str, OutputProfile, None] = None,
+                 scan_coverage: float = IMAGE_SCAN_COVERAGE):
+        profile = get_output_profile(profile)
+        self.doc = doc
+        self.workers = IMAGE_WORKERS if workers is None else workers
+        self.max_pending = IMAGE_MAX_PENDING if max_pending is None else max_pending
+        self.max_width = max_width
+        self.max_height = max_height
+        self.min_size = min_size
+        self.scan_coverage = scan_coverage
+        # Encoder settings of the output profile
+        self.quality = profile.jpeg_quality
+        self.optimize = profile.optimize_images
+        self.recompress = profile.recompress_images
+        self.xref_names: Dict[int, Optional[str]] = {}
+        self.hash_names: Dict[str, str] = {}
+        self.placements = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        # (file name, xref, target format, future or encoded result), in submission order
+        self._pending: Deque[Tuple[str, int, str, Union[Future, Tuple[bytes, int, int]]]] = deque()
+        self._running: Deque[Future] = deque()
+
+    def figures(self, page: Page) -> List[Figure]:
+        """
+        Returns the figures of a page, extracting and submitting images not seen before.
+
+        Pages that were OCR'd are represented by their text, so their images
+        (usually the scan itself) are left out. So are the scans of searchable
+        PDFs: images covering at least scan_coverage of a page whose text
+        layer is used. Images placed smaller than min_size points either way
+        and inline images without an xref are left out too.
+        """
+        if page.ocr_text is not None:
+            return []
+        has_text = any(span.text.strip() for span in page.spans)
+        figures = []
+        for image in page.images:
+            x0, y0, x1, y1 = image.bbox
+            if not image.xref or x1 - x0 < self.min_size or y1 - y0 < self.min_size:
+                continue
+            if has_text and bbox_coverage(page, image.bbox) >= self.scan_coverage:
+                continue
+            file_name = self._file_name(image.xref)
+            if file_name is not None:
+                figures.append(Figure(file_name=file_name, page_number=page.number, bbox=image.bbox))
+        self.placements += len(figures)
+        return figures
+
+    def finish(self) -> Iterator[BookImage]:
+        """
+        Yields every image submitted so far, waiting for those still being encoded.
+        """
+        return self.drain(0)
+
+    def drain(self, keep: int) -> Iterator[BookImage]:
+        """
+        Yields the oldest images, waiting for them if needed, until at most
+        `keep` are left. Which images come back only depends on how many were
+        submitted, not on how fast the workers are.
+        """
+        while len(self._pending) > keep:
+            yield self._collect(self._pending.popleft())
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns the number of unique images and placements, and the bytes extracted and written.
+        """
+        return {
+            "images": len(self.hash_names),
+            "placements": self.placements,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+        }
+
+    def _file_name(self, xref: int) -> Optional[str]:
+        if xref in self.xref_names:
+            return self.xref_names[xref]
+        try:
+            base_image = self.doc.extract_image(xref)
+        except Exception:
+            base_image = None
+        if not base_image or not base_image.get("image"):
+            self.xref_names[xref] = None
+            return None
+
+        data = base_image["image"]
+        digest = hashlib.sha256(data).hexdigest()
+        if digest in self.hash_names:  # Same image under another xref
+            self.xref_names[xref] = self.hash_names[digest]
+            return self.hash_names[digest]
+
+        smask = base_image.get("smask", 0)
+        target = "jpeg" if base_image["ext"] in JPEG_SOURCES and not smask else "png"
+        file_name = f"images/image_{digest[:16]}.{EXTENSIONS[target]}"
+        self.hash_names[digest] = file_name
+        self.xref_names[xref] = file_name
+        self.bytes_in += len(data)
+
+        if base_image["ext"] not in PIL_SOURCES or smask:
+            data = _pixmap_png(self.doc, xref, smask)
+        self._submit(file_name, xref, target, data)
+        return file_name
+
+    def _submit(self, file_name: str, xref: int, target: str, data: bytes):
+        if self.workers <= 1:
+            self._pending.append((file_name, xref, target, self._encode(xref, data, target)))
+            return
+        future = _get_pool(self.workers).submit(encode_image, data, target, *self._settings())
+        self._pending.append((file_name, xref, target, future))
+        # Bound the work in flight: wait for the oldest image still being encoded
+        self._running.append(future)
+        while self._running and self._running[0].done():
+            self._running.popleft()
+        if len(self._running) > max(self.max_pending, 1):
+            self._running.popleft().exception()
+
+    def _settings(self) -> Tuple[int, int, int, bool, bool]:
+        return self.max_width, self.max_height, self.quality, self.optimize, self.recompress
+
+    def _encode(self, xref: int, data: bytes, target: str) -> Tuple[bytes, int, int]:
+        try:
+            return encode_image(data, target, *self._settings())
+        except Exception:
+            return self._encode_decoded(xref, target)
+
+    def _encode_decoded(self, xref: int, target: str) -> Tuple[bytes, int, int]:
+        # PIL could not read the image; MuPDF decodes whatever a PDF viewer could show
+        try:
+            return encode_image(_pixmap_png(self.doc, xref), target, *self._settings())
+        except Exception as e:
+            raise ValueError(f"Error encoding image {xref}: {e}")
+
+    def _collect(self, entry: Tuple) -> BookImage:
+        file_name, xref, target, result = entry
+        if isinstance(result, Future):
+            try:
+                result = result.result()
+            except Exception:
+                result = self._encode_decoded(xref, target)
+        data, width, height = result
+        self.bytes_out += len(data)
+        return BookImage(file_name=file_name, media_type=MEDIA_TYPES[target], data=data, width=width, height=height)
+
+def attach_figures(pages: List[Page], images: ImagePipeline) -> int:
+    """
+    Sets `figures` on the pages that have any.
+
+    Returns:
+        The number of figures placed.
+    """
+    count = 0
+    for page in pages:
+        page.figures = images.figures(page) or None
+        count += len(page.figures or [])
+    return count
+
+def iter_with_figures(pages: Iterable[Page], images: ImagePipeline) -> Iterator[Page]:
+    """
+    Streaming counterpart of attach_figures.
+    """
+    for page in pages:
+        page.figures = images.figures(page) or None
+        yield page
@@ -0,0 +1,174 @@
+# app/core/job_queue.py
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from app.models import Job
+from app.core.upload import copy_upload
+from config import JOB_WORKERS, JOB_QUEUE_DEPTH, JOB_FOLDER, JOB_RETENTION
+from typing import Callable, Deque, Dict, Optional
+
+class JobQueue:
+    """
+    Runs conversions in the background on a pool of worker processes.
+
+    submit() copies the upload, hashing it on the way, and returns a Job at
+    once; the job waits in a bounded queue until a worker is free. Jobs are handed to the pool only
+    when a worker is free, so a job marked running really is, and the
+    position of a waiting job is its place in the queue. Finished jobs are
+    kept for `retention` seconds so their result can still be fetched.
+
+    Args:
+        convert: Picklable function taking the path of a PDF, a profile name
+            and the SHA-256 digest of the PDF, and returning the path of the EPUB.
+        key: Function building the key of a job from the digest of its upload
+            and its profile. Jobs with the same key are merged; without it,
+            every upload is a job of its own.
+        workers: Number of worker processes. Defaults to JOB_WORKERS, which
+            config.py sizes together with the pools each conversion starts.
+        max_depth: Maximum number of jobs waiting for a worker. Defaults to JOB_QUEUE_DEPTH.
+        directory: Directory the uploads of jobs are copied to. Defaults to JOB_FOLDER.
+        retention: Seconds a finished job is kept. Defaults to JOB_RETENTION.
+    """
+    def __init__(self, convert: Callable[[str, Optional[str], Optional[str]], str], workers: Optional[int] = None,
+                 max_depth: Optional[int] = None, directory: str = JOB_FOLDER, retention: float = JOB_RETENTION,
+                 key: Optional[Callable[[str, Optional[str]], str]] = None):
+        self.convert = convert
+        self.key = key
+        self.workers = max(JOB_WORKERS if workers is None else workers, 1)
+        self.max_depth = JOB_QUEUE_DEPTH if max_depth is None else max_depth
+        self.directory = directory
+        self.retention = retention
+        self.jobs: Dict[str, Job] = {}
+        self._waiting: Deque[Job] = deque()
+        self._running = 0
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.RLock()  # Done callbacks may run in the thread that submitted
+        os.makedirs(directory, exist_ok=True)
+
+    def submit(self, pdf_path: str, profile: Optional[str] = None) -> Job:
+        """
+        Queues the conversion of a PDF.
+
+        The upload is copied first, so the job does not depend on the caller
+        keeping it, and hashed in the same pass; the digest is passed on to
+        the conversion so the upload is not hashed again. A job with the same
+        key that is still waiting or running is returned instead of queueing
+        the work twice.
+
+        Raises:
+            ValueError: If the queue is full.
+        """
+        job_id = uuid.uuid4().hex
+        job_dir = os.path.join(self.directory, job_id)
+        os.makedirs(job_dir)
+        job = Job(job_id, os.path.join(job_dir, os.path.basename(pdf_path)), profile)
+        try:
+            job.digest = copy_upload(pdf_path, job.pdf_path)
+            job.key = self.key(job.digest, profile) if self.key is not None else None
+            with self._lock:
+                self._prune()
+                if job.key is not None:
+                    for other in self.jobs.values():
+                        if other.key == job.key and other.status in ("queued", "running"):
+                            shutil.rmtree(job_dir, ignore_errors=True)
+                            return other
+                if len(self._waiting) >= self.max_depth:
+                    raise ValueError("The conversion queue is full, please try again later")
+                job.submitted = time.time()
+                self.jobs[job_id] = job
+                self._waiting.append(job)
+                self._dispatch()
+                return job
+        except BaseException:
+            shutil.rmtree(job_dir, ignore_errors=True)
+            raise
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """
+        Returns a job by its ID, or None if it is unknown or expired.
+        """
+        return self.jobs.get(job_id)
+
+    def position(self, job: Job) -> int:
+        """
+        Returns the 1-based place of a waiting job in the queue, or 0 if it is not waiting.
+        """
+        with self._lock:
+            for position, waiting in enumerate(self._waiting, 1):
+                if waiting is job:
+                    return position
+        return 0
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns the number of jobs waiting, running and finished.
+        """
+        with self._lock:
+            finished = sum(job.status in ("done", "failed") for job in self.jobs.values())
+            return {"queued": len(self._waiting), "running": self._running, "finished": finished}
+
+    def shutdown(self, wait: bool = True):
+        """
+        Stops the worker pool. Jobs still waiting are dropped.
+        """
+        with self._lock:
+            self._waiting.clear()
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait, cancel_futures=True)
+
+    def _dispatch(self):
+        # Called with the lock held
+        while self._waiting and self._running < self.workers:
+            job = self._waiting.popleft()
+            job.status = "running"
+            job.started = time.time()
+            self._running += 1
+            try:
+                future = self._submit(job)
+            except Exception as e:
+                future = Future()
+                future.set_exception(e)
+            future.add_done_callback(partial(self._finished, job))
+
+    def _submit(self, job: Job) -> Future:
+        if self._pool is not None:
+            try:
+                return self._pool.submit(self.convert, job.pdf_path, job.profile, job.digest)
+            except BrokenProcessPool:  # A worker died; its jobs have failed, later ones get a new pool
+                self._pool.shutdown(wait=False)
+        # Spawned, not forked: the queue is driven from the threads of the web
+        # server and from done callbacks, and a forked child can inherit locks
+        # (logging, sqlite, imports) held by another thread and deadlock on them
+        self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool.submit(self.convert, job.pdf_path, job.profile, job.digest)
+
+    def _finished(self, job: Job, future: Future):
+        with self._lock:
+            try:
+                job.result = future.result()
+                job.status = "done"
+            except BrokenProcessPool as e:
+                job.error = f"A conversion worker stopped unexpectedly: {e}"
+                job.status = "failed"
+            except Exception as e:
+                job.error = str(e) or type(e).__name__
+                job.status = "failed"
+            job.finished = time.time()
+            self._running -= 1
+            shutil.rmtree(os.path.dirname(job.pdf_path), ignore_errors=True)
+            self._dispatch()
+
+    def _prune(self):
+        # Called with the lock held
+        now = time.time()
+        for job_id, job in list(self.jobs.items()):
+            if job.finished is not None and now - job.finished > self.retention:
+                del self.jobs[job_id]
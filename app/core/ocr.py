@@ -0,0 +1,573 @@
+# app/core/ocr.py
+import io
+import shlex
+import time
+import fitz
+import pytesseract
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from PIL import Image, ImageOps
+from app.models import Page
+from config import (
+    OCR_WORKERS, OCR_MAX_PENDING, OCR_PAGE_TIMEOUT, OCR_ALLOW_PARTIAL,
+    OCR_MIN_TEXT_CHARS, OCR_MAX_GARBAGE_RATIO, OCR_MIN_IMAGE_COVERAGE, OCR_LANG, OCR_CONFIG,
+    OCR_ENGINE, OCR_TARGET_DPI, OCR_BINARIZE,
+)
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+# Pixels lighter than this are treated as background when cropping margins
+MARGIN_THRESHOLD = 240
+
+# Threshold used when OCR_BINARIZE is on
+BINARIZE_THRESHOLD = 160
+
+# Extra time the collector grants a page on top of OCR_PAGE_TIMEOUT before it
+# stops waiting for a worker that did not honour its own deadline.
+TIMEOUT_GRACE = 5.0
+
+# Times a page is resubmitted after the worker running it died. A page that
+# takes down a worker once more is marked failed.
+OCR_CRASH_RETRIES = 1
+
+class OCRResult:
+    """
+    Holds the OCR text of each page and the pages that could not be processed.
+    """
+    def __init__(self, page_texts: Dict[int, str], failed_pages: List[int], image_texts: Optional[Dict[int, List[str]]] = None,
+                 cache_hits: int = 0, cache_misses: int = 0):
+        self.page_texts = page_texts
+        self.failed_pages = failed_pages
+        self.image_texts = image_texts if image_texts is not None else {}
+        self.cache_hits = cache_hits
+        self.cache_misses = cache_misses
+
+    @property
+    def text(self) -> str:
+        return "".join(self.page_texts[page_number] for page_number in sorted(self.page_texts))
+
+def classify_page(page: Page) -> Dict:
+    """
+    Decides whether a page needs OCR or whether its text layer can be used.
+
+    Args:
+        page: The page model from extract_pages().
+
+    Returns:
+        A dictionary with the decision ("ocr"), the reason for it and the
+        measurements it was based on.
+    """
+    # Control characters were removed from the spans by the normalizer
+    chars = page.control_chars
+    garbage = page.control_chars
+    for span in page.spans:
+        for char in span.text:
+            if char.isspace():
+                continue
+            chars += 1
+            if _is_garbage(char):
+                garbage += 1
+    garbage_ratio = garbage / chars if chars else 0.0
+    coverage = image_coverage(page)
+
+    if not any(image.xref for image in page.images):
+        needs_ocr, reason = False, "no_images"
+    elif chars >= OCR_MIN_TEXT_CHARS and garbage_ratio <= OCR_MAX_GARBAGE_RATIO:
+        needs_ocr, reason = False, "text_layer"
+    elif coverage < OCR_MIN_IMAGE_COVERAGE:
+        needs_ocr, reason = False, "small_images"
+    elif chars == 0:
+        needs_ocr, reason = True, "no_text_layer"
+    elif garbage_ratio > OCR_MAX_GARBAGE_RATIO:
+        needs_ocr, reason = True, "garbled_text_layer"
+    else:
+        needs_ocr, reason = True, "sparse_text_layer"
+
+    return {
+        "page": page.number,
+        "ocr": needs_ocr,
+        "reason": reason,
+        "chars": chars,
+        "garbage_ratio": round(garbage_ratio, 4),
+        "image_coverage": round(coverage, 4),
+    }
+
+def _is_garbage(char: str) -> bool:
+    """
+    Tells whether a glyph could not be decoded to meaningful text.
+    """
+    code = ord(char)
+    return (
+        char == "\ufffd"                  # Replacement character
+        or 0xE000 <= code <= 0xF8FF       # Private use area
+        or (code < 0x20 and char not in "\t\n\r")
+    )
+
+def image_coverage(page: Page) -> float:
+    """
+    Returns the share of the page area covered by images (overlaps are counted
+    twice, the result is capped at 1.0).
+    """
+    return min(sum(bbox_coverage(page, image.bbox) for image in page.images), 1.0)
+
+def bbox_coverage(page: Page, bbox: Tuple[float, float, float, float]) -> float:
+    """
+    Returns the share of the page area covered by a bbox, clipped to the page.
+    """
+    page_area = page.width * page.height
+    if page_area <= 0:
+        return 0.0
+    x0, y0, x1, y1 = bbox
+    width = min(x1, page.width) - max(x0, 0)
+    height = min(y1, page.height) - max(y0, 0)
+    return width * height / page_area if width > 0 and height > 0 else 0.0
+
+class OCREngine:
+    """
+    Base class for OCR backends. Engines are created once per process and reused.
+    """
+    name = "base"
+
+    def __init__(self, lang: str = OCR_LANG, config: str = OCR_CONFIG):
+        self.lang = lang
+        self.config = config
+
+    def image_to_string(self, image: Image.Image, timeout: float = 0) -> str:
+        """
+        Recognizes the text in an image.
+
+        Args:
+            image: The PIL image.
+            timeout: Seconds allowed, or 0 for no limit.
+
+        Returns:
+            The recognized text.
+        """
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+class PytesseractEngine(OCREngine):
+    """
+    Runs the tesseract executable through pytesseract, one process per image.
+    """
+    name = "pytesseract"
+
+    def image_to_string(self, image: Image.Image, timeout: float = 0) -> str:
+        # pytesseract kills the tesseract process once the timeout expires
+        return pytesseract.image_to_string(image, lang=self.lang, config=self.config, timeout=timeout)
+
+class TesserocrEngine(OCREngine):
+    """
+    Keeps a Tesseract instance loaded in-process through the tesserocr C API
+    bindings, so the language model is loaded once per worker instead of once
+    per image. Tesseract itself cancels recognition once the timeout expires.
+    """
+    name = "tesserocr"
+
+    def __init__(self, lang: str = OCR_LANG, config: str = OCR_CONFIG):
+        super().__init__(lang, config)
+        import tesserocr
+
+        options = _parse_tesseract_config(config)
+        kwargs = {"lang": lang}
+        if "psm" in options:
+            kwargs["psm"] = int(options.pop("psm"))
+        if "oem" in options:
+            kwargs["oem"] = int(options.pop("oem"))
+        self.api = tesserocr.PyTessBaseAPI(**kwargs)
+        for name, value in options.items():
+            self.api.SetVariable(name, value)
+
+    def image_to_string(self, image: Image.Image, timeout: float = 0) -> str:
+        self.api.SetImage(image)
+        # Recognize() takes milliseconds and returns False when it was cancelled
+        if timeout and not self.api.Recognize(timeout=max(int(timeout * 1000), 1)):
+            raise TimeoutError("Tesseract timeout")
+        return self.api.GetUTF8Text()
+
+    def close(self):
+        self.api.End()
+
+def _parse_tesseract_config(config: str) -> Dict[str, str]:
+    """
+    Turns a tesseract command-line config ("--psm 6 -c name=value") into options.
+    """
+    options: Dict[str, str] = {}
+    args = shlex.split(config)
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        if arg in ("--psm", "--oem") and i + 1 < len(args):
+            options[arg[2:]] = args[i + 1]
+            i += 1
+        elif arg == "-c" and i + 1 < len(args) and "=" in args[i + 1]:
+            name, value = args[i + 1].split("=", 1)
+            options[name] = value
+            i += 1
+        i += 1
+    return options
+
+OCR_ENGINES = {
+    PytesseractEngine.name: PytesseractEngine,
+    TesserocrEngine.name: TesserocrEngine,
+}
+
+_engine: Optional[OCREngine] = None
+
+def get_ocr_engine(name: str = OCR_ENGINE, lang: str = OCR_LANG, config: str = OCR_CONFIG) -> OCREngine:
+    """
+    Returns the OCR engine for this process, creating it on first use.
+
+    "auto" prefers tesserocr and falls back to pytesseract when tesserocr is not
+    installed; an explicitly requested engine that fails to load also falls back.
+
+    Args:
+        name: "auto", "tesserocr" or "pytesseract".
+        lang: The Tesseract language.
+        config: Extra Tesseract configuration.
+
+    Returns:
+        A warm OCREngine instance.
+    """
+    global _engine
+    wanted = [TesserocrEngine.name, PytesseractEngine.name] if name == "auto" else [name, PytesseractEngine.name]
+    if _engine is not None and _engine.name in wanted and (_engine.lang, _engine.config) == (lang, config):
+        return _engine
+    if _engine is not None:
+        _engine.close()
+        _engine = None
+
+    for engine_name in wanted:
+        try:
+            _engine = OCR_ENGINES[engine_name](lang, config)
+            return _engine
+        except (ImportError, RuntimeError, KeyError) as e:
+            if name != "auto":
+                print(f"OCR engine {engine_name} unavailable, falling back: {e}")
+    raise ValueError(f"No OCR engine available for {name}")
+
+def ocr_scale(pixel_width: int, placement: Optional[Tuple[float, float]], target_dpi: int = OCR_TARGET_DPI) -> float:
+    """
+    Returns the factor that brings an image to the target DPI at the size it is
+    placed on the page. Images are never upscaled.
+
+    Args:
+        pixel_width: The width of the image in pixels.
+        placement: The (width, height) of the image on the page, in points.
+        target_dpi: The effective resolution wanted for OCR.
+    """
+    if not placement or placement[0] <= 0 or pixel_width <= 0:
+        return 1.0
+    effective_dpi = pixel_width / (placement[0] / 72.0)
+    return min(1.0, target_dpi / effective_dpi)
+
+def preprocess_signature(pixel_width: int, placement: Optional[Tuple[float, float]]) -> str:
+    """
+    Describes the preprocessing applied to an image, for use in OCR cache keys.
+    """
+    return f"scale={ocr_scale(pixel_width, placement):.3f};binarize={int(OCR_BINARIZE)}"
+
+def preprocess_image(image_data: bytes, placement: Optional[Tuple[float, float]] = None,
+                     target_dpi: int = OCR_TARGET_DPI, binarize: bool = OCR_BINARIZE) -> Optional[Image.Image]:
+    """
+    Prepares an embedded image for OCR.
+
+    The image is resampled down to the target DPI for its size on the page,
+    converted to grayscale (or black and white) and cropped to its content.
+    JPEG images are decoded directly at the reduced size, so a high-resolution
+    scan never has to be held in memory at full size.
+
+    Args:
+        image_data: The encoded image data.
+        placement: The (width, height) of the image on the page, in points.
+        target_dpi: The effective resolution wanted for OCR.
+        binarize: Whether to convert the image to black and white.
+
+    Returns:
+        The prepared image, or None if the image is blank.
+    """
+    image = Image.open(io.BytesIO(image_data))
+    scale = ocr_scale(image.width, placement, target_dpi)
+    size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+    if scale < 1.0:
+        image.draft("L", size)  # Only has an effect on JPEG; decodes at a reduced scale
+        factor = int(image.width / size[0])
+        if factor > 1:
+            image = image.reduce(factor)
+        if image.size != size:
+            image = image.resize(size, Image.LANCZOS)
+
+    image = ImageOps.exif_transpose(image).convert("L")
+    if binarize:
+        image = image.point(lambda p: 255 if p >= BINARIZE_THRESHOLD else 0)
+
+    # Crop away empty margins
+    content = image.point(lambda p: 255 if p < MARGIN_THRESHOLD else 0).getbbox()
+    if content is None:
+        return None
+    return image.crop(content)
+
+def ocr_images(images: List[Union[bytes, int]], timeout: Optional[float] = None, lang: str = OCR_LANG, config: str = OCR_CONFIG,
+               placements: Optional[List[Optional[Tuple[float, float]]]] = None, path: Optional[str] = None) -> List[str]:
+    """
+    Runs Tesseract on the images of one page.
+
+    Args:
+        images: The encoded image data, or the xrefs of the images in the
+            document at `path`, in page order.
+        timeout: Seconds allowed for the whole page, or None for no limit.
+        lang: The Tesseract language.
+        config: Extra Tesseract configuration.
+        placements: The (width, height) in points at which each image is placed
+            on the page, used to normalize its resolution.
+        path: Path of the PDF the xrefs refer to. The image is extracted and
+            decoded here, so a worker does it rather than the process feeding
+            the pool.
+
+    Returns:
+        The recognized text of each image.
+    """
+    engine = get_ocr_engine(OCR_ENGINE, lang, config)
+    deadline = time.monotonic() + timeout if timeout else None
+    parts = []
+    for i, image in enumerate(images):
+        remaining = 0
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError("OCR page timeout")
+        image_data = _worker_document(path).extract_image(image)["image"] if isinstance(image, int) else image
+        pil_image = preprocess_image(image_data, placements[i] if placements else None)
+        if pil_image is None:  # Blank image
+            parts.append("")
+            continue
+        parts.append(engine.image_to_string(pil_image, timeout=remaining))
+    return parts
+
+# Document a process keeps open to extract images by xref, with its path
+_worker_doc: Optional[Tuple[str, fitz.Document]] = None
+
+def _worker_document(path: Optional[str]) -> fitz.Document:
+    """
+    Returns the open document at `path`, opening it once per process.
+    """
+    global _worker_doc
+    if path is None:
+        raise ValueError("Images given by xref need the path of their document")
+    if _worker_doc is None or _worker_doc[0] != path:
+        if _worker_doc is not None:
+            _worker_doc[1].close()
+        _worker_doc = (path, fitz.open(path))
+    return _worker_doc[1]
+
+def _init_worker():
+    """
+    Pool initializer: loads the OCR engine before the first page arrives.
+    """
+    get_ocr_engine()
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_workers = 0
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    Returns the long-lived OCR worker pool, so warm engines are reused across jobs.
+    """
+    global _pool, _pool_workers
+    if _pool is None or _pool_workers != workers:
+        shutdown_ocr_pool()
+        _pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+        _pool_workers = workers
+    return _pool
+
+def shutdown_ocr_pool(wait: bool = True):
+    """
+    Stops the OCR worker pool. A new one is started on the next run_ocr call.
+    """
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=wait, cancel_futures=True)
+        _pool = None
+
+def run_ocr(jobs: Iterable[Tuple], workers: Optional[int] = None, max_pending: Optional[int] = None,
+            page_timeout: Optional[float] = None, allow_partial: Optional[bool] = None) -> OCRResult:
+    """
+    OCRs pages on a bounded pool of worker processes and collects the results.
+
+    Args:
+        jobs: (page_number, images) or (page_number, images, placements) tuples
+            in page order, as accepted by ocr_images. May be a generator.
+        workers: Number of worker processes. Defaults to OCR_WORKERS; 1 runs in-process.
+        max_pending: Maximum number of pages submitted but not yet collected.
+            Defaults to OCR_MAX_PENDING.
+        page_timeout: Seconds allowed per page. Defaults to OCR_PAGE_TIMEOUT.
+        allow_partial: Whether failed or timed-out pages are skipped instead of
+            aborting the run. Defaults to OCR_ALLOW_PARTIAL.
+
+    Returns:
+        An OCRResult with the text of every page that succeeded, and the text of
+        each of its images in image_texts.
+    """
+    image_texts: Dict[int, List[str]] = {}
+    failed_pages: List[int] = []
+    for page_number, texts in iter_ocr(jobs, workers, max_pending, page_timeout, allow_partial):
+        if texts is None:
+            failed_pages.append(page_number)
+        else:
+            image_texts[page_number] = texts
+    return _result(image_texts, failed_pages)
+
+def iter_ocr(jobs: Iterable[Tuple], workers: Optional[int] = None, max_pending: Optional[int] = None,
+             page_timeout: Optional[float] = None, allow_partial: Optional[bool] = None,
+             path: Optional[str] = None) -> Iterator[Tuple[Any, Optional[List[str]]]]:
+    """
+    OCRs pages on a bounded pool of worker processes, yielding results in job order.
+
+    Jobs are pulled from `jobs` only when a slot frees up, so at most
+    `max_pending` pages are held in memory at a time. A job without images is
+    passed through and yielded as soon as the jobs before it are done. The pool
+    outlives the call, so each worker keeps its OCR engine loaded between
+    documents.
+
+    Args:
+        jobs: (tag, images) or (tag, images, placements) tuples. The tag is
+            yielded back unchanged, usually the page number. May be a generator.
+        workers: Number of worker processes. Defaults to OCR_WORKERS; 1 runs in-process.
+        max_pending: Maximum number of pages submitted but not yet collected.
+            Defaults to OCR_MAX_PENDING.
+        page_timeout: Seconds allowed per page. Defaults to OCR_PAGE_TIMEOUT.
+        allow_partial: Whether failed or timed-out pages are skipped instead of
+            aborting the run. Defaults to OCR_ALLOW_PARTIAL.
+        path: Path of the PDF that images given by xref are extracted from; see ocr_images.
+
+    Yields:
+        (tag, texts) tuples, where texts holds the text of each image, or is
+        None if the page failed.
+    """
+    workers = OCR_WORKERS if workers is None else workers
+    max_pending = OCR_MAX_PENDING if max_pending is None else max_pending
+    page_timeout = OCR_PAGE_TIMEOUT if page_timeout is None else page_timeout
+    allow_partial = OCR_ALLOW_PARTIAL if allow_partial is None else allow_partial
+    stuck = False
+
+    def collect(tag, get_texts):
+        nonlocal stuck
+        try:
+            return tag, get_texts()
+        except Exception as e:
+            if isinstance(e, FutureTimeoutError):
+                stuck = True
+            if not allow_partial:
+                raise ValueError(f"OCR failed on page {_page_label(tag)}: {e}")
+            print(f"OCR failed on page {_page_label(tag)}: {e}")
+            return tag, None
+
+    if workers <= 1:
+        # The engines enforce the page timeout themselves
+        for job in jobs:
+            tag, images, placements = _unpack_job(job)
+            yield collect(tag, lambda: ocr_images(images, page_timeout, placements=placements, path=path))
+        return
+
+    wait = page_timeout + TIMEOUT_GRACE if page_timeout else None
+    # [tag, images, placements, future, attempts, pool] per page, in job order
+    pending = deque()
+    executor = _get_pool(workers)
+
+    def submit(entry):
+        entry[4] += 1
+        try:
+            entry[3] = executor.submit(ocr_images, entry[1], page_timeout, placements=entry[2], path=path)
+        except BrokenProcessPool:
+            recover(executor)
+            entry[3] = executor.submit(ocr_images, entry[1], page_timeout, placements=entry[2], path=path)
+        entry[5] = executor
+
+    def recover(broken):
+        # A worker died and took its pool down with it, failing every page on
+        # it. Start a new pool and rerun those pages one at a time, so a page
+        # that kills its worker again does so alone and is the only one to
+        # fail; a page that already had its retry stays failed, so it cannot
+        # loop forever.
+        nonlocal executor
+        if executor is broken:
+            executor = renew_pool()
+        for entry in pending:
+            if entry[5] is broken and entry[4] <= OCR_CRASH_RETRIES and not succeeded(entry[3]):
+                rerun(entry)
+
+    def renew_pool():
+        shutdown_ocr_pool(wait=False)
+        return _get_pool(workers)
+
+    def rerun(entry):
+        nonlocal executor
+        entry[4] += 1
+        entry[3], entry[5] = Future(), executor
+        try:
+            future = executor.submit(ocr_images, entry[1], page_timeout, placements=entry[2], path=path)
+            entry[3].set_result(future.result(timeout=wait))
+        except BrokenProcessPool as e:
+            executor = renew_pool()
+            entry[3].set_exception(e)
+        except Exception as e:
+            entry[3].set_exception(e)
+
+    def succeeded(future):
+        return future.done() and not future.cancelled() and future.exception() is None
+
+    def texts(entry, timeout):
+        while entry[3] is not None:
+            try:
+                return entry[3].result(timeout=timeout)
+            except BrokenProcessPool:
+                if entry[4] > OCR_CRASH_RETRIES:
+                    raise
+                broken = entry[5]
+                pending.appendleft(entry)  # Rerun with the rest of the broken pool
+                recover(broken)
+                pending.popleft()
+        return []
+
+    try:
+        for job in jobs:
+            tag, images, placements = _unpack_job(job)
+            entry = [tag, images, placements, None, 0, None]
+            if images:
+                submit(entry)
+            pending.append(entry)
+            # Hand back whatever is ready at the head without blocking
+            while pending and (pending[0][3] is None or pending[0][3].done()):
+                oldest = pending.popleft()
+                yield collect(oldest[0], lambda: texts(oldest, wait))
+            if len(pending) >= max(max_pending, 1):
+                oldest = pending.popleft()
+                yield collect(oldest[0], lambda: texts(oldest, wait))
+        while pending:
+            oldest = pending.popleft()
+            yield collect(oldest[0], lambda: texts(oldest, wait))
+    finally:
+        for entry in pending:
+            if entry[3] is not None:
+                entry[3].cancel()
+        if stuck:
+            # Replace the pool rather than block on workers stuck past their deadline
+            shutdown_ocr_pool(wait=False)
+
+def _page_label(tag: Any) -> Any:
+    """
+    Returns the page number of a job tag: a page number, or a tuple that starts with the Page.
+    """
+    page = tag[0] if isinstance(tag, tuple) and tag else tag
+    return getattr(page, "number", page)
+
+def _unpack_job(job: Tuple) -> Tuple[Any, List[bytes], Optional[List[Optional[Tuple[float, float]]]]]:
+    if len(job) > 2:
+        return job[0], job[1], job[2]
+    return job[0], job[1], None
+
+def _result(image_texts: Dict[int, List[str]], failed_pages: List[int]) -> OCRResult:
+    page_texts = {page_number: "".join(texts) for page_number, texts in image_texts.items()}
+    return OCRResult(page_texts, failed_pages, image_texts)
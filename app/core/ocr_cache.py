@@ -0,0 +1,116 @@
+# app/core/ocr_cache.py
+import hashlib
+import os
+import sqlite3
+import time
+from config import OCR_CACHE_PATH, OCR_CACHE_MAX_BYTES
+from typing import Dict, Optional
+
+def cache_key(image_data: bytes, lang: str, config: str) -> str:
+    """
+    Builds the cache key for an image: its content hash plus the Tesseract
+    settings that influence the result.
+    """
+    digest = hashlib.sha256(image_data).hexdigest()
+    settings = hashlib.sha256(f"{lang}\0{config}".encode("utf-8")).hexdigest()[:16]
+    return f"{digest}:{settings}"
+
+class OCRCache:
+    """
+    Persistent OCR result cache stored in SQLite, with a size cap and LRU eviction.
+    """
+    def __init__(self, path: str = OCR_CACHE_PATH, max_bytes: int = OCR_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS ocr_cache ("
+            "key TEXT PRIMARY KEY, text TEXT NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS ocr_cache_last_access ON ocr_cache (last_access)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS ocr_cache_stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self.conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Returns the cached text for a key, or None on a miss.
+        """
+        row = self.conn.execute("SELECT text FROM ocr_cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            self._count("misses")
+            self.conn.commit()
+            return None
+        self.hits += 1
+        self.conn.execute("UPDATE ocr_cache SET last_access = ? WHERE key = ?", (time.time(), key))
+        self._count("hits")
+        self.conn.commit()
+        return row[0]
+
+    def put(self, key: str, text: str):
+        """
+        Stores the text for a key and evicts the least recently used entries
+        while the cache is over its size cap.
+        """
+        size = len(text.encode("utf-8"))
+        self.conn.execute(
+            "INSERT OR REPLACE INTO ocr_cache (key, text, size, last_access) VALUES (?, ?, ?, ?)",
+            (key, text, size, time.time()),
+        )
+        self._evict()
+        self.conn.commit()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns the persisted hit/miss totals and the current size of the cache.
+        """
+        totals = dict(self.conn.execute("SELECT name, value FROM ocr_cache_stats").fetchall())
+        entries, size = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM ocr_cache").fetchone()
+        return {
+            "hits": totals.get("hits", 0),
+            "misses": totals.get("misses", 0),
+            "entries": entries,
+            "bytes": size,
+        }
+
+    def close(self):
+        self.conn.close()
+
+    def _count(self, name: str):
+        self.conn.execute(
+            "INSERT INTO ocr_cache_stats (name, value) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + 1",
+            (name,),
+        )
+
+    def _evict(self):
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM ocr_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self.conn.execute("SELECT key, size FROM ocr_cache ORDER BY last_access ASC")
+        evicted = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            evicted.append((key,))
+            total -= size
+        self.conn.executemany("DELETE FROM ocr_cache WHERE key = ?", evicted)
+
+_default_cache: Optional[OCRCache] = None
+
+def get_ocr_cache() -> Optional[OCRCache]:
+    """
+    Returns the process-wide cache configured in config.py, or None if caching is disabled.
+    """
+    global _default_cache
+    if OCR_CACHE_PATH is None:
+        return None
+    if _default_cache is None:
+        _default_cache = OCRCache(OCR_CACHE_PATH, OCR_CACHE_MAX_BYTES)
+    return _default_cache
@@ -0,0 +1,42 @@
+# app/core/output_profiles.py
+from config import OUTPUT_PROFILE, IMAGE_JPEG_QUALITY
+from typing import Dict, Union
+
+class OutputProfile:
+    """
+    Settings trading the time spent writing an EPUB against its size.
+    """
+    def __init__(self, name: str, compress_level: int, store_media: bool, minify: bool,
+                 jpeg_quality: int, optimize_images: bool, recompress_images: bool):
+        self.name = name
+        self.compress_level = compress_level  # Deflate level of text entries, 1-9
+        self.store_media = store_media  # Store images uncompressed; they are compressed already
+        self.minify = minify  # Strip layout whitespace from CSS and the generated XML
+        self.jpeg_quality = jpeg_quality
+        self.optimize_images = optimize_images  # Let the encoders search for smaller output
+        self.recompress_images = recompress_images  # Re-encode images that could be kept, if smaller
+
+    def __repr__(self):
+        return f"OutputProfile({self.name!r})"
+
+OUTPUT_PROFILES: Dict[str, OutputProfile] = {
+    # Interactive use: get the book back quickly
+    "fast": OutputProfile("fast", compress_level=1, store_media=True, minify=False,
+                          jpeg_quality=IMAGE_JPEG_QUALITY, optimize_images=False, recompress_images=False),
+    "balanced": OutputProfile("balanced", compress_level=6, store_media=True, minify=False,
+                              jpeg_quality=IMAGE_JPEG_QUALITY, optimize_images=True, recompress_images=False),
+    # Archiving: the smallest file, however long it takes
+    "small": OutputProfile("small", compress_level=9, store_media=False, minify=True,
+                           jpeg_quality=60, optimize_images=True, recompress_images=True),
+}
+
+def get_output_profile(profile: Union[str, OutputProfile, None] = None) -> OutputProfile:
+    """
+    Returns the named output profile, OUTPUT_PROFILE by default.
+    """
+    if isinstance(profile, OutputProfile):
+        return profile
+    name = profile or OUTPUT_PROFILE
+    if name not in OUTPUT_PROFILES:
+        raise ValueError(f"Unknown output profile: {name}")
+    return OUTPUT_PROFILES[name]
@@ -0,0 +1,270 @@
+# app/core/page_extractor.py
+import mmap
+import os
+import fitz
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from app.models import Page, Span, PageImage, UploadedPDF
+from app.core.span_table import iter_span_tables
+from app.core.reading_order import order_spans
+from app.core.text_normalizer import normalize_page
+from config import ANALYSIS_WORKERS, PARALLEL_MIN_PAGES, READING_ORDER
+from typing import Collection, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+# Flags used for the single text extraction pass. Image blocks are left out:
+# image placements come from get_image_info(), which does not decode pixels.
+EXTRACTION_FLAGS = fitz.TEXTFLAGS_DICT & ~fitz.TEXT_PRESERVE_IMAGES
+
+# PyMuPDF reads memoryviews in place from 1.26 on; older versions only open
+# bytes and bytearray streams, so other buffers are copied for them
+STREAM_ACCEPTS_MEMORYVIEW = tuple(int(part) for part in fitz.VersionBind.split(".")[:2]) >= (1, 26)
+
+# Everything open_pdf accepts
+PDFSource = Union[str, bytes, bytearray, memoryview, mmap.mmap, UploadedPDF, fitz.Document]
+
+def open_pdf(source: PDFSource) -> Tuple[fitz.Document, bool]:
+    """
+    Returns an open document for a path, an in-memory buffer or an already opened document.
+
+    Buffers are handed to PyMuPDF as memoryviews, which it reads in place
+    without copying them. PyMuPDF before 1.26 gets bytes or a bytearray instead.
+
+    Args:
+        source: A path to a PDF file, the PDF data (bytes, bytearray,
+            memoryview, mmap or UploadedPDF) or a PyMuPDF Document object.
+
+    Returns:
+        A tuple of the document and a flag telling whether the caller opened it
+        here and is therefore responsible for closing it.
+    """
+    if isinstance(source, fitz.Document):
+        return source, False
+    if isinstance(source, UploadedPDF):
+        source = source.data
+    try:
+        if isinstance(source, (bytes, bytearray, memoryview, mmap.mmap)):
+            return fitz.open(stream=_stream(source), filetype="pdf"), True
+        return fitz.open(source), True
+    except Exception as e:
+        raise ValueError(f"Error opening PDF file: {e}")
+
+def _stream(source: Union[bytes, bytearray, memoryview, mmap.mmap]) -> Union[bytes, bytearray, memoryview]:
+    if STREAM_ACCEPTS_MEMORYVIEW:
+        return memoryview(source)
+    if isinstance(source, (bytes, bytearray)):
+        return source
+    return bytes(source)
+
+def extract_page(page: fitz.Page) -> Page:
+    """
+    Extracts spans and image placements from a single PDF page, with the
+    text blocks in reading order and the span texts normalized.
+
+    Args:
+        page: The PyMuPDF Page object.
+
+    Returns:
+        A Page object holding the extracted content.
+    """
+    spans: List[Span] = []
+    for block in page.get_text("dict", flags=EXTRACTION_FLAGS)["blocks"]:
+        if block["type"] != 0:  # Text blocks only
+            continue
+        for line_no, line in enumerate(block["lines"]):
+            for span in line["spans"]:
+                spans.append(Span(
+                    text=span["text"],
+                    font=span["font"],
+                    size=span["size"],
+                    flags=span["flags"],
+                    bbox=tuple(span["bbox"]),
+                    block=block["number"],
+                    line=line_no,
+                ))
+    if READING_ORDER:
+        spans = order_spans(spans)
+
+    return normalize_page(Page(number=page.number + 1, width=page.rect.width, height=page.rect.height, spans=spans, images=extract_page_images(page)))
+
+def extract_page_images(page: fitz.Page) -> List[PageImage]:
+    """
+    Returns where images are placed on a page, without decoding them.
+    """
+    images: List[PageImage] = []
+    for info in page.get_image_info(xrefs=True):
+        images.append(PageImage(
+            xref=info["xref"],
+            bbox=tuple(info["bbox"]),
+            width=info["width"],
+            height=info["height"],
+        ))
+    return images
+
+def page_lines(page: Page) -> List[List[Span]]:
+    """
+    Groups the spans of a page into text lines, in reading order.
+    """
+    lines: List[List[Span]] = []
+    current_line = None
+    for span in page.spans:
+        if (span.block, span.line) != current_line:
+            lines.append([])
+            current_line = (span.block, span.line)
+        lines[-1].append(span)
+    return lines
+
+def page_text(page: Page) -> str:
+    """
+    Returns the text layer of a page, one line of spans per line of text.
+    """
+    return "".join("".join(span.text for span in line) + "\n" for line in page_lines(page))
+
+def iter_pages(doc: fitz.Document, start: int = 0, skip: Collection[int] = ()) -> Iterator[Page]:
+    """
+    Extracts pages one at a time, for pipelines that should not hold the whole
+    page model in memory.
+
+    Args:
+        doc: The PyMuPDF Document object.
+        start: 0-based index of the first page to extract.
+        skip: 1-based numbers of pages to leave out, such as pages already checkpointed.
+    """
+    for page_num in range(start, doc.page_count):
+        if page_num + 1 not in skip:
+            yield extract_page(doc[page_num])
+
+def extract_pages(doc: fitz.Document, workers: Optional[int] = None, path: Optional[str] = None) -> List[Page]:
+    """
+    Walks every page of the document once and builds the intermediate page model.
+
+    Args:
+        doc: The PyMuPDF Document object.
+        workers: Number of worker processes. Defaults to ANALYSIS_WORKERS.
+        path: Path the workers open, for documents opened from memory.
+
+    Returns:
+        A list of Page objects in page order.
+    """
+    pages, _ = extract_pages_with_font_stats(doc, workers, path)
+    return pages
+
+def extract_pages_with_font_stats(doc: fitz.Document, workers: Optional[int] = None,
+                                  path: Optional[str] = None) -> Tuple[List[Page], Optional[Dict[Tuple[str, float], int]]]:
+    """
+    Extracts the page model, splitting the work across processes for large documents.
+
+    See iter_extracted_pages.
+
+    Returns:
+        A tuple of the Page objects in page order and the merged font counts.
+        The font counts are None when the document was extracted serially.
+    """
+    partial_counts: List[Dict[Tuple[str, float], int]] = []
+    pages = list(iter_extracted_pages(doc, workers, path, partial_counts=partial_counts))
+    return pages, merge_font_counts(partial_counts) if partial_counts else None
+
+def iter_extracted_pages(doc: fitz.Document, workers: Optional[int] = None, path: Optional[str] = None,
+                         skip: Collection[int] = (),
+                         partial_counts: Optional[List[Dict[Tuple[str, float], int]]] = None,
+                         range_size: Optional[int] = None) -> Iterator[Page]:
+    """
+    Extracts pages in page order, across processes for large documents.
+
+    In parallel mode each worker opens its own copy of the document, extracts a
+    contiguous run of the pages and counts the fonts in it. Runs are yielded in
+    page order as each one comes back, so the result is identical to a serial
+    run and callers can act on the first pages while later ones are extracted.
+
+    By default the pages are split into one run per worker. With `range_size`,
+    runs hold that many pages and at most two per worker are submitted ahead of
+    the one being yielded, so memory stays bounded however long the document is.
+
+    Args:
+        doc: The PyMuPDF Document object.
+        workers: Number of worker processes. Defaults to ANALYSIS_WORKERS.
+        path: Path the workers open. Defaults to the document's own file; an
+            in-memory document without one is extracted serially.
+        skip: 1-based numbers of pages to leave out, such as pages already checkpointed.
+        partial_counts: Optional list that receives the font counts of each
+            run, in page order. Left empty when the pages are extracted serially.
+        range_size: Number of pages per run, for streaming; see above.
+    """
+    if workers is None:
+        workers = ANALYSIS_WORKERS
+    page_nums = [page_num for page_num in range(doc.page_count) if page_num + 1 not in skip]
+    if range_size:
+        ranges = [(start, min(start + range_size, len(page_nums))) for start in range(0, len(page_nums), range_size)]
+    else:
+        ranges = page_ranges(len(page_nums), workers)
+    path = path or doc.name
+
+    # Workers reopen the document by path, so in-memory documents stay serial
+    if (workers < 2 or len(ranges) < 2 or len(page_nums) < PARALLEL_MIN_PAGES
+            or not path or not os.path.isfile(path)):
+        for page_num in page_nums:
+            yield extract_page(doc[page_num])
+        return
+
+    window = deque()
+    with ProcessPoolExecutor(max_workers=min(workers, len(ranges))) as executor:
+        for start, stop in ranges:
+            window.append(executor.submit(_extract_page_list, path, page_nums[start:stop]))
+            # Collect in range order once the window is full
+            if len(window) > 2 * workers:
+                yield from _collect_range(window.popleft(), partial_counts)
+        while window:
+            yield from _collect_range(window.popleft(), partial_counts)
+
+def _collect_range(future: Future, partial_counts: Optional[List[Dict[Tuple[str, float], int]]]) -> List[Page]:
+    range_pages, range_counts = future.result()
+    if partial_counts is not None:
+        partial_counts.append(range_counts)
+    return range_pages
+
+def page_ranges(page_count: int, workers: int) -> List[Tuple[int, int]]:
+    """
+    Splits the pages of a document into at most `workers` contiguous (start, stop) ranges.
+    """
+    workers = max(1, min(workers, page_count))
+    size, extra = divmod(page_count, workers)
+    ranges = []
+    start = 0
+    for i in range(workers):
+        stop = start + size + (1 if i < extra else 0)
+        if stop > start:
+            ranges.append((start, stop))
+        start = stop
+    return ranges
+
+def count_fonts(pages: Iterable[Page]) -> Dict[Tuple[str, float], int]:
+    """
+    Counts how many spans use each (font, size) pair, in first-seen order.
+
+    Spans are counted in columnar chunks, so the count is a few array passes
+    per chunk rather than one dictionary update per span.
+    """
+    return merge_font_counts([table.font_counts() for _, table in iter_span_tables(pages, with_text=False)])
+
+def merge_font_counts(partial_counts: List[Dict[Tuple[str, float], int]]) -> Dict[Tuple[str, float], int]:
+    """
+    Merges per-range font counts given in page order.
+
+    Keys keep the order in which they first appear in the document, which is the
+    order a serial count would produce; ties in identify_heading_fonts depend on it.
+    """
+    font_counts: Dict[Tuple[str, float], int] = {}
+    for counts in partial_counts:
+        for font_identifier, count in counts.items():
+            font_counts[font_identifier] = font_counts.get(font_identifier, 0) + count
+    return font_counts
+
+def _extract_page_list(path: str, page_nums: List[int]) -> Tuple[List[Page], Dict[Tuple[str, float], int]]:
+    """
+    Worker entry point: opens its own document and extracts the pages with the given 0-based indices.
+    """
+    doc = fitz.open(path)
+    try:
+        pages = [extract_page(doc[page_num]) for page_num in page_nums]
+    finally:
+        doc.close()
+    return pages, count_fonts(pages)
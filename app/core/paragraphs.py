@@ -0,0 +1,155 @@
+# app/core/paragraphs.py
+import re
+import fitz
+from app.models import Paragraph, Span, TextRun
+from config import PARAGRAPH_LINE_GAP, PARAGRAPH_INDENT, PARAGRAPH_SHORT_LINE
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+# A line ending like this ends a sentence
+SENTENCE_END = re.compile(r"[.!?:;][\"'”’)\]]*$")
+
+# Hyphens that may split a word across lines; a soft hyphen always does
+HYPHENS = "-\u2010\u00ad"
+
+# A line starting like this is a list item
+LIST_ITEM = re.compile(r"^([•◦‣–—*-]|\(?\d{1,3}[.)]|\(?[a-z][.)])\s")
+
+class TextLine:
+    """
+    A line of text on a page with its geometry, as fed to the paragraph builder.
+    """
+    def __init__(self, spans: List[Span], page_number: int):
+        self.spans = spans
+        self.page_number = page_number
+        self.block = spans[0].block
+        self.x0 = min(span.bbox[0] for span in spans)
+        self.y0 = min(span.bbox[1] for span in spans)
+        self.x1 = max(span.bbox[2] for span in spans)
+        self.y1 = max(span.bbox[3] for span in spans)
+        self.size = max(span.size for span in spans)
+        self.text = "".join(span.text for span in spans).strip()
+
+def span_style(span: Span) -> Tuple[bool, bool]:
+    """
+    Returns the (bold, italic) style of a span.
+    """
+    return bool(span.flags & fitz.TEXT_FONT_BOLD), bool(span.flags & fitz.TEXT_FONT_ITALIC)
+
+def continues_across(previous: TextLine, line: TextLine) -> bool:
+    """
+    Tells whether a paragraph cut by a block or page boundary goes on with `line`:
+    the previous line does not end a sentence and the next one starts in lower
+    case, or the previous line ends with a hyphen.
+    """
+    if previous.text[-1] in HYPHENS:
+        return True
+    return not SENTENCE_END.search(previous.text) and line.text[:1].islower()
+
+class ParagraphBuilder:
+    """
+    Merges consecutive text lines into paragraphs, using line geometry,
+    indentation and punctuation to find where paragraphs end.
+    """
+    def __init__(self, line_gap: float = PARAGRAPH_LINE_GAP, indent: float = PARAGRAPH_INDENT,
+                 short_line: float = PARAGRAPH_SHORT_LINE):
+        self.line_gap = line_gap
+        self.indent = indent
+        self.short_line = short_line
+        self.lines: List[TextLine] = []
+        self.left = 0.0
+        self.right = 0.0
+
+    def add(self, line: TextLine) -> Optional[Paragraph]:
+        """
+        Adds a line. Returns the previous paragraph if the line starts a new one.
+        """
+        finished = None
+        if self.lines and self.starts_paragraph(line):
+            finished = self.flush()
+        if not self.lines:
+            self.left, self.right = line.x0, line.x1
+        self.lines.append(line)
+        self.left = min(self.left, line.x0)
+        self.right = max(self.right, line.x1)
+        return finished
+
+    def flush(self) -> Optional[Paragraph]:
+        """
+        Ends the current paragraph and returns it, or None if it is empty.
+        """
+        if not self.lines:
+            return None
+        paragraph = join_lines(self.lines)
+        self.lines = []
+        return paragraph
+
+    def starts_paragraph(self, line: TextLine) -> bool:
+        """
+        Tells whether `line` starts a new paragraph after the current one.
+        """
+        previous = self.lines[-1]
+        if line.page_number != previous.page_number or line.block != previous.block:
+            return not continues_across(previous, line)
+        if LIST_ITEM.match(line.text):
+            return True
+        if abs(line.size - previous.size) > 0.2 * previous.size:
+            return True
+        if line.y0 - previous.y1 > self.line_gap * (previous.y1 - previous.y0):
+            return True
+        if line.x0 - self.left > self.indent * line.size:
+            return True
+        return bool(SENTENCE_END.search(previous.text)) and previous.x1 < self.right - self.short_line * previous.size
+
+def join_lines(lines: List[TextLine]) -> Paragraph:
+    """
+    Joins lines into one paragraph of styled runs. Words hyphenated across a
+    line break are rejoined, and adjacent spans of the same style are merged.
+    """
+    runs: List[TextRun] = []
+    for i, line in enumerate(lines):
+        if i and runs:
+            previous = runs[-1]
+            if previous.text[-1:] == "\u00ad" or (previous.text[-1:] in HYPHENS and previous.text[-2:-1].isalpha()
+                                                    and line.text[:1].islower()):
+                previous.text = previous.text[:-1]  # Rejoin the hyphenated word
+            elif not previous.text.endswith(" "):
+                previous.text += " "
+        for j, span in enumerate(line.spans):
+            text = span.text
+            if j == 0:
+                text = text.lstrip()
+            if j == len(line.spans) - 1:
+                text = text.rstrip()
+            if not text:
+                continue
+            bold, italic = span_style(span)
+            if runs and (runs[-1].bold, runs[-1].italic) == (bold, italic):
+                runs[-1].text += text
+            elif runs and not text.strip():
+                runs[-1].text += text  # Keep styles from switching on bare whitespace
+            else:
+                runs.append(TextRun(text, bold, italic))
+    for run in runs:
+        run.text = run.text.replace("\u00ad", "")  # Soft hyphens left at span ends
+    return Paragraph(runs, lines[0].page_number)
+
+def build_paragraphs(items: Iterable[Tuple]) -> Iterator[Tuple]:
+    """
+    Turns ("line", TextLine, page_number) items into ("text", Paragraph,
+    page_number) items. Any other item ends the current paragraph and is passed
+    through unchanged, in order.
+    """
+    builder = ParagraphBuilder()
+    for item in items:
+        if item[0] == "line":
+            paragraph = builder.add(item[1])
+            if paragraph is not None:
+                yield ("text", paragraph, paragraph.page_number)
+            continue
+        paragraph = builder.flush()
+        if paragraph is not None:
+            yield ("text", paragraph, paragraph.page_number)
+        yield item
+    paragraph = builder.flush()
+    if paragraph is not None:
+        yield ("text", paragraph, paragraph.page_number)
@@ -1,68 +1,316 @@
 # app/core/pdf_parser.py
+import os
 import fitz
-import pytesseract
-from PIL import Image
-import io
-from app.models import ParsedPDF, Chapter, Heading
-from typing import List
+from app.models import ParsedPDF, Chapter, Heading, Page, PageImage, UploadedPDF
+from app.core.page_extractor import (
+    PDFSource, open_pdf, iter_extracted_pages, extract_page_images, iter_pages, merge_font_counts, page_text,
+)
+from app.core.ocr import OCRResult, classify_page, preprocess_signature, iter_ocr
+from app.core.ocr_cache import OCRCache, cache_key, get_ocr_cache
+from app.core.checkpoint import PageCheckpoint
+from app.core.text_normalizer import normalize_text
+from config import OCR_LANG, OCR_CONFIG, STREAM_RANGE_PAGES
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
 
-def extract_text_from_pdf(filepath: str) -> str:
+def extract_text_from_pdf(source: PDFSource, pages: Optional[List[Page]] = None) -> str:
     """
     Extracts text from a PDF file using OCR.
 
     Args:
-        filepath: The path to the PDF file.
+        source: The path to the PDF file, the PDF data in memory or an already
+            opened PyMuPDF Document.
+        pages: Optional page models from extract_pages(). When given, image
+            xrefs are taken from them instead of querying every page again.
 
     Returns:
         The extracted text as a single string.
     """
+    return ocr_document(source, pages).text
+
+def ocr_document(source: PDFSource, pages: Optional[List[Page]] = None, page_numbers: Optional[Set[int]] = None,
+                 cache: Union[OCRCache, None, bool] = True) -> OCRResult:
+    """
+    OCRs the images of every page on the OCR worker pool.
+
+    Args:
+        source: The path to the PDF file, the PDF data in memory or an already
+            opened PyMuPDF Document.
+        pages: Optional page models from extract_pages().
+        page_numbers: Optional 1-based numbers of the pages to OCR. All pages
+            are OCR'd when omitted.
+        cache: The OCR cache to use. True uses the cache configured in
+            config.py; None or False disables caching.
+
+    Returns:
+        An OCRResult with the text of each page, in page order.
+    """
+    doc, owned = open_pdf(source)
+    path = source if isinstance(source, str) else (source.path if isinstance(source, UploadedPDF) else None)
+    if pages is None:
+        pages = [Page(number=page.number + 1, width=page.rect.width, height=page.rect.height, spans=[], images=extract_page_images(page))
+                 for page in doc]
+    needs_ocr = None if page_numbers is None else (lambda page: page.number in page_numbers)
+
+    page_texts: Dict[int, str] = {}
+    failed_pages: List[int] = []
+    stats = {"hits": 0, "misses": 0}
     try:
-        doc = fitz.open(filepath)
-        text = ""
-        for page in doc:
-            image_list = page.get_images(full=True)
-            for img in image_list:
-                xref = img[0]
-                base_image = doc.extract_image(xref)
-                image_data = base_image["image"]
-
-                # Convert to PIL Image
-                pil_image = Image.open(io.BytesIO(image_data))
-
-                # Use pytesseract to extract text
-                text += pytesseract.image_to_string(pil_image)
-        doc.close()
-        return text
+        for page, failed in iter_ocr_pages(doc, pages, needs_ocr, cache, stats, path):
+            if failed:
+                failed_pages.append(page.number)
+            elif page.ocr_text is not None:
+                page_texts[page.number] = page.ocr_text
     except Exception as e:
         raise ValueError(f"Error during OCR processing: {e}")
+    finally:
+        if owned:
+            doc.close()
+
+    return OCRResult(page_texts, failed_pages, cache_hits=stats["hits"], cache_misses=stats["misses"])
+
+def iter_ocr_pages(doc: fitz.Document, pages: Iterable[Page], needs_ocr: Optional[Callable[[Page], bool]] = None,
+                   cache: Union[OCRCache, None, bool] = True, stats: Optional[Dict[str, int]] = None,
+                   path: Optional[str] = None) -> Iterator[Tuple[Page, bool]]:
+    """
+    OCRs pages as they stream through, setting Page.ocr_text on the pages that were OCR'd.
+
+    Images are looked up page by page, as the pool has room for them. The OCR
+    cache key is built from the raw image stream, which is read without
+    decoding it; with a file the workers can open, the workers extract and
+    decode the images themselves, so this process only hands out xrefs. An
+    image used on several pages is OCR'd once per document, and images already
+    in the OCR cache are not OCR'd at all. Pages come back in the order they
+    went in; pages that need no OCR are passed through unchanged.
 
-def parse_pdf(filepath: str) -> ParsedPDF:
+    Args:
+        doc: The PyMuPDF Document object.
+        pages: Page models in page order. May be a generator.
+        needs_ocr: Decides which pages to OCR. All pages with images are OCR'd when omitted.
+        cache: The OCR cache to use. True uses the cache configured in
+            config.py; None or False disables caching.
+        stats: Optional dictionary in which cache "hits" and "misses" are counted.
+        path: Path the workers open to extract the images. Defaults to the
+            document's own file; images of an in-memory document without one
+            are extracted here.
+
+    Yields:
+        (page, failed) tuples, where failed tells whether OCR of the page failed.
+    """
+    stats = stats if stats is not None else {}
+    stats.setdefault("hits", 0)
+    stats.setdefault("misses", 0)
+    xref_keys: Dict[int, str] = {}
+    xref_texts: Dict[int, str] = {}
+    path = path or doc.name
+    if not path or not os.path.isfile(path):
+        path = None
+
+    def jobs():
+        nonlocal cache
+        for page in pages:
+            placements = _image_placements(page.images) if needs_ocr is None or needs_ocr(page) else {}
+            new_xrefs, images, new_placements = [], [], []
+            for xref, placement in placements.items():
+                if xref in xref_keys:  # Already seen in this document
+                    continue
+                if cache is True:
+                    cache = get_ocr_cache()
+                # The key covers the preprocessing too, since it changes the OCR
+                # result, and the image dictionary, which says how to decode the stream
+                settings = (f"{OCR_CONFIG}\0{preprocess_signature(_image_width(doc, xref), placement)}"
+                            f"\0{doc.xref_object(xref, compressed=True)}")
+                xref_keys[xref] = cache_key(doc.xref_stream_raw(xref), OCR_LANG, settings)
+                cached = cache.get(xref_keys[xref]) if cache else None
+                if cached is not None:
+                    xref_texts[xref] = cached
+                    stats["hits"] += 1
+                else:
+                    new_xrefs.append(xref)
+                    images.append(xref if path else doc.extract_image(xref)["image"])
+                    new_placements.append(placement)
+                    if cache:
+                        stats["misses"] += 1
+            yield (page, list(placements), new_xrefs), images, new_placements
+
+    for (page, xrefs, new_xrefs), texts in iter_ocr(jobs(), path=path):
+        if texts is not None:
+            for xref, text in zip(new_xrefs, texts):
+                xref_texts[xref] = text
+                if cache:
+                    cache.put(xref_keys[xref], text)
+        failed = not all(xref in xref_texts for xref in xrefs)
+        if xrefs and not failed:
+            page.ocr_text = normalize_text("".join(xref_texts[xref] for xref in xrefs))
+        yield page, failed
+
+def _image_width(doc: fitz.Document, xref: int) -> int:
+    """
+    Returns the width in pixels of an image from its dictionary, without decoding it.
+    """
+    kind, value = doc.xref_get_key(xref, "Width")
+    return int(value) if kind == "int" else 0
+
+def _image_placements(images: List[PageImage]) -> Dict[int, Tuple[float, float]]:
+    """
+    Maps the xref of each image on a page to the largest (width, height) at which
+    it is placed, in placement order. Inline images have no xref and are skipped.
+    """
+    placements: Dict[int, Tuple[float, float]] = {}
+    for image in images:
+        if not image.xref:
+            continue
+        x0, y0, x1, y1 = image.bbox
+        size = (abs(x1 - x0), abs(y1 - y0))
+        if image.xref not in placements or size[0] > placements[image.xref][0]:
+            placements[image.xref] = size
+    return placements
+
+def parse_pdf(source: PDFSource, upload: Optional[UploadedPDF] = None, checkpoint: Optional[PageCheckpoint] = None) -> ParsedPDF:
     """
     Parses a PDF file, extracts metadata, content, and basic structure.
 
+    The document is opened once and every page is extracted once (in parallel for
+    large documents); the resulting page model is kept on the ParsedPDF so the
+    structure analyzer can reuse it.
+
     Args:
-        filepath: The path to the PDF file.
+        source: The path to the PDF file, the PDF data in memory (see
+            page_extractor.open_pdf) or an already opened PyMuPDF Document.
+        upload: The upload the document was opened from, if any. Its digest is
+            recorded as metadata["content_hash"] and its path is handed to the
+            extraction workers. Defaults to `source` when that is an UploadedPDF.
+        checkpoint: Optional page checkpoint of an earlier, interrupted run.
+            Pages it holds are loaded instead of extracted and OCR'd again, and
+            each new page is saved to it as soon as the extraction workers
+            return it and it has been OCR'd.
 
     Returns:
         A ParsedPDF object containing the parsed data.
     """
+    doc, owned = open_pdf(source)
+
     try:
-        doc = fitz.open(filepath)
-    except Exception as e:
-        raise ValueError(f"Error opening PDF file: {e}")
+        metadata = extract_metadata(doc)
+        title = metadata.get("title", "Untitled")
+        author = metadata.get("author", "Unknown")
+        if isinstance(source, UploadedPDF):
+            upload = source
+        if upload is not None:
+            metadata["content_hash"] = upload.digest
+        # Worker processes reopen the document from its file
+        path = (upload.path if upload is not None else None) or doc.name or None
+
+        # Only OCR pages without a usable text layer; use the text layer elsewhere.
+        # Checkpointed pages are not extracted again.
+        completed = checkpoint.completed_pages() if checkpoint is not None else set()
+        partial_counts: List[Dict] = []
+        extracted = iter_extracted_pages(doc, path=path, skip=completed,
+                                         partial_counts=partial_counts)
+        pages = list(_iter_triaged_pages(doc, metadata, extracted, checkpoint, completed, path))
+        # Worker font counts cover the extracted pages only
+        font_counts = merge_font_counts(partial_counts) if partial_counts and not completed else None
+        content = "".join(page.ocr_text if page.ocr_text is not None else page_text(page) for page in pages)
+        chapters: List[Chapter] = []
+
+        # Basic structure analysis will be done in structure_analyzer.py
+        # For now, just create a single chapter with all content
+        chapters.append(Chapter(title="Chapter 1", content=[content], headings=[], page_number=1))
+    finally:
+        if owned:
+            doc.close()
 
-    metadata = extract_metadata(doc)
-    title = metadata.get("title", "Untitled")
-    author = metadata.get("author", "Unknown")
-    content = extract_text_from_pdf(filepath)  # Use OCR to extract text
-    chapters: List[Chapter] = []
+    parsed_pdf = ParsedPDF(title=title, author=author, chapters=chapters, metadata=metadata, content=content, pages=pages, font_counts=font_counts)
+    parsed_pdf.path = path
+    return parsed_pdf
 
-    # Basic structure analysis will be done in structure_analyzer.py
-    # For now, just create a single chapter with all content
-    chapters.append(Chapter(title="Chapter 1", content=[content], headings=[], page_number=1))
+def iter_parse_pdf(source: PDFSource, metadata: Optional[dict] = None, upload: Optional[UploadedPDF] = None,
+                   checkpoint: Optional[PageCheckpoint] = None) -> Iterator[Page]:
+    """
+    Parses a PDF file page by page, for conversions that must run in constant memory.
+
+    Pages are extracted, triaged and OCR'd as they are consumed; nothing is
+    kept once a page has been yielded. Large documents are extracted on the
+    extraction workers in runs of STREAM_RANGE_PAGES pages, a bounded number
+    of runs ahead of the page being yielded.
+
+    Args:
+        source: The path to the PDF file, the PDF data in memory or an already
+            opened PyMuPDF Document.
+        metadata: Optional dictionary that receives the per-page OCR decisions,
+            failed pages and cache counts, as in ParsedPDF.metadata.
+        upload: The upload the document was opened from, if any; see parse_pdf.
+        checkpoint: Optional page checkpoint; see parse_pdf.
 
-    doc.close()
-    return ParsedPDF(title=title, author=author, chapters=chapters, metadata=metadata, content=content)
+    Yields:
+        Page objects in page order, with ocr_text set on the pages that were OCR'd.
+    """
+    doc, owned = open_pdf(source)
+    metadata = metadata if metadata is not None else {}
+    if isinstance(source, UploadedPDF):
+        upload = source
+    if upload is not None:
+        metadata["content_hash"] = upload.digest
+    path = (upload.path if upload is not None else None) or doc.name or None
+    completed = checkpoint.completed_pages() if checkpoint is not None else set()
+    try:
+        extracted = iter_extracted_pages(doc, path=path, skip=completed, range_size=STREAM_RANGE_PAGES)
+        yield from _iter_triaged_pages(doc, metadata, extracted, checkpoint, completed, path)
+    finally:
+        if owned:
+            doc.close()
+
+def _iter_triaged_pages(doc: fitz.Document, metadata: dict, pages: Optional[Iterable[Page]] = None,
+                        checkpoint: Optional[PageCheckpoint] = None, completed: Optional[Set[int]] = None,
+                        path: Optional[str] = None) -> Iterator[Page]:
+    """
+    OCRs the pages that have no usable text layer and records the decisions in metadata.
+
+    Pages are extracted lazily unless `pages` is given. With a checkpoint, the
+    pages it already holds (`completed`, read from it when omitted) are loaded
+    in their place, and every further page is saved to it as soon as it is
+    done, unless its OCR failed. `path` is the file the OCR workers extract
+    images from; see iter_ocr_pages.
+    """
+    ocr_decisions = metadata.setdefault("ocr_pages", [])
+    failed_pages = metadata.setdefault("ocr_failed_pages", [])
+    stats = metadata.setdefault("ocr_cache", {"hits": 0, "misses": 0})
+    decisions: Dict[int, Dict] = {}
+
+    if completed is None:
+        completed = checkpoint.completed_pages() if checkpoint is not None else set()
+    resumed = sorted(number for number in completed if number <= doc.page_count)
+    if resumed:
+        print(f"Resuming from checkpoint with {len(resumed)} of {doc.page_count} pages done")
+    if pages is None:
+        pages = iter_pages(doc, skip=completed)
+    else:
+        pages = (page for page in pages if page.number not in completed)
+
+    def needs_ocr(page: Page) -> bool:
+        decision = classify_page(page)
+        decisions[page.number] = decision
+        return decision["ocr"]
+
+    def load_resumed(before: float) -> Iterator[Page]:
+        # Checkpointed pages are merged back in page order
+        while resumed and resumed[0] < before:
+            page, decision = checkpoint.load_page(resumed.pop(0))
+            ocr_decisions.append(decision)
+            yield page
+
+    try:
+        for page, failed in iter_ocr_pages(doc, pages, needs_ocr, stats=stats, path=path):
+            yield from load_resumed(page.number)
+            decision = decisions.pop(page.number, None)
+            ocr_decisions.append(decision)
+            if failed:
+                failed_pages.append(page.number)
+            elif checkpoint is not None:
+                checkpoint.save_page(page, decision)
+            yield page
+    except Exception as e:
+        raise ValueError(f"Error during OCR processing: {e}")
+    yield from load_resumed(float("inf"))
 
 def extract_metadata(doc: fitz.Document) -> dict:
     """
@@ -0,0 +1,118 @@
+# app/core/reading_order.py
+from bisect import bisect_left, bisect_right
+from app.models import Span
+from config import READING_ORDER_MIN_GAP
+from typing import Dict, List, Sequence, Tuple
+
+BBox = Tuple[float, float, float, float]
+
+def xy_cut(boxes: Sequence[BBox], min_gap: float = READING_ORDER_MIN_GAP) -> List[int]:
+    """
+    Returns the reading order of the blocks with the given bboxes, as indexes
+    into `boxes`, using a recursive XY-cut.
+
+    A region is first split into columns at vertical whitespace gaps at least
+    `min_gap` wide, read left to right. A region without a column gap, for
+    instance because a full-width heading spans it, is split into rows at
+    horizontal gaps. Consecutive rows that together still have a column gap
+    are regrouped, so multi-column text between full-width elements is read
+    column by column rather than row by row. Each cut sorts its blocks once,
+    and regrouping adds each block once to the sorted column intervals of its
+    group, so a page costs O(n log n) comparisons per level of nesting.
+
+    Args:
+        boxes: (x0, y0, x1, y1) bboxes of the blocks of a page.
+        min_gap: Narrowest vertical gap that separates two columns.
+    """
+    order: List[int] = []
+    _cut(list(range(len(boxes))), boxes, min_gap, order)
+    return order
+
+def _split(indexes: List[int], boxes: Sequence[BBox], axis: int, min_gap: float) -> List[List[int]]:
+    """
+    Splits blocks into groups separated by gaps along an axis (0 for x, 1 for y),
+    in axis order. Sweeps the blocks by start coordinate, tracking the furthest end.
+    """
+    indexes = sorted(indexes, key=lambda i: boxes[i][axis])
+    groups = [[indexes[0]]]
+    end = boxes[indexes[0]][axis + 2]
+    for i in indexes[1:]:
+        if boxes[i][axis] - end >= min_gap:
+            groups.append([])
+        groups[-1].append(i)
+        end = max(end, boxes[i][axis + 2])
+    return groups
+
+def _cut(indexes: List[int], boxes: Sequence[BBox], min_gap: float, order: List[int]):
+    if len(indexes) <= 1:
+        order.extend(indexes)
+        return
+
+    columns = _split(indexes, boxes, 0, min_gap)
+    if len(columns) > 1:
+        for column in columns:
+            _cut(column, boxes, min_gap, order)
+        return
+
+    rows = _split(indexes, boxes, 1, 0.0)
+    if len(rows) == 1:
+        # Overlapping blocks: fall back to top-to-bottom, left-to-right
+        order.extend(sorted(indexes, key=lambda i: (boxes[i][1], boxes[i][0])))
+        return
+
+    group = list(rows[0])
+    starts, ends = _column_intervals(group, boxes, min_gap)
+    for row in rows[1:]:
+        for i in row:
+            _add_interval(starts, ends, boxes[i][0], boxes[i][2], min_gap)
+        if len(starts) > 1:
+            group.extend(row)  # Still side-by-side columns
+        else:
+            _cut(group, boxes, min_gap, order)
+            group = list(row)
+            starts, ends = _column_intervals(group, boxes, min_gap)
+    _cut(group, boxes, min_gap, order)
+
+def _column_intervals(indexes: List[int], boxes: Sequence[BBox], min_gap: float) -> Tuple[List[float], List[float]]:
+    """
+    Returns the starts and ends of the x intervals of the columns of the given
+    blocks, the same columns _split() finds, in left to right order.
+    """
+    starts: List[float] = []
+    ends: List[float] = []
+    for i in indexes:
+        _add_interval(starts, ends, boxes[i][0], boxes[i][2], min_gap)
+    return starts, ends
+
+def _add_interval(starts: List[float], ends: List[float], x0: float, x1: float, min_gap: float):
+    """
+    Adds a block spanning x0 to x1 to sorted, disjoint column intervals, merging
+    it with every column it is less than `min_gap` away from.
+    """
+    # Columns are disjoint, so both their starts and their ends are sorted
+    lo = bisect_right(ends, x0 - min_gap)
+    hi = bisect_left(starts, x1 + min_gap)
+    if lo < hi:
+        x0 = min(x0, starts[lo])
+        x1 = max(x1, ends[hi - 1])
+    starts[lo:hi] = [x0]
+    ends[lo:hi] = [x1]
+
+def order_spans(spans: List[Span], min_gap: float = READING_ORDER_MIN_GAP) -> List[Span]:
+    """
+    Reorders the spans of a page block by block into reading order. Spans keep
+    their order within a block.
+    """
+    blocks: Dict[int, List[Span]] = {}
+    for span in spans:
+        blocks.setdefault(span.block, []).append(span)
+    if len(blocks) < 2:
+        return spans
+
+    block_spans = list(blocks.values())
+    boxes = [
+        (min(s.bbox[0] for s in group), min(s.bbox[1] for s in group),
+         max(s.bbox[2] for s in group), max(s.bbox[3] for s in group))
+        for group in block_spans
+    ]
+    return [span for i in xy_cut(boxes, min_gap) for span in block_spans[i]]
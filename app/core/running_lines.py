@@ -0,0 +1,114 @@
+# app/core/running_lines.py
+import math
+import re
+import fitz
+from app.models import Page, Span
+from app.core.page_extractor import extract_page, page_lines
+from config import RUNNING_LINE_MARGIN, RUNNING_LINE_BAND, RUNNING_LINE_MIN_SHARE, RUNNING_LINE_MIN_PAGES
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Fingerprint of a text line: normalized text, page region and vertical band
+Fingerprint = Tuple[str, str, int]
+
+def normalize_line(text: str) -> str:
+    """
+    Normalizes a line for comparison across pages: whitespace collapsed, case
+    folded and every run of digits replaced by "#", so "Page 12" matches "Page 13".
+    """
+    return re.sub(r"\d+", "#", " ".join(text.split()).casefold())
+
+class RunningLineIndex:
+    """
+    Index of the lines in the top and bottom margins of pages, keyed by their
+    fingerprint, that finds running heads, footers and page numbers.
+
+    A line is running when lines with the same normalized text at about the
+    same height appear on at least `min_share` of the indexed pages (and on at
+    least `min_pages` pages).
+    """
+    def __init__(self, margin: float = RUNNING_LINE_MARGIN, band: float = RUNNING_LINE_BAND,
+                 min_share: float = RUNNING_LINE_MIN_SHARE, min_pages: int = RUNNING_LINE_MIN_PAGES):
+        self.margin = margin
+        self.band = band
+        self.min_share = min_share
+        self.min_pages = min_pages
+        self.page_count = 0
+        self.counts: Dict[Fingerprint, int] = {}
+        self.removed_lines = 0
+
+    @classmethod
+    def from_pages(cls, pages: Iterable[Page], **kwargs) -> "RunningLineIndex":
+        """
+        Builds the index in one pass over the given pages.
+        """
+        index = cls(**kwargs)
+        for page in pages:
+            index.add_page(page)
+        return index
+
+    @classmethod
+    def from_document_sample(cls, doc: fitz.Document, sample_pages: int, **kwargs) -> "RunningLineIndex":
+        """
+        Builds the index from up to `sample_pages` pages spread evenly over the
+        document, for pipelines that cannot look at every page first.
+        """
+        step = max(1, doc.page_count / max(1, sample_pages))
+        page_nums = sorted({int(i * step) for i in range(min(sample_pages, doc.page_count))})
+        return cls.from_pages((extract_page(doc[page_num]) for page_num in page_nums), **kwargs)
+
+    def add_page(self, page: Page):
+        """
+        Counts each fingerprint of a page once.
+        """
+        fingerprints = {self.fingerprint(page, line) for line in page_lines(page)}
+        fingerprints.discard(None)
+        for fingerprint in fingerprints:
+            self.counts[fingerprint] = self.counts.get(fingerprint, 0) + 1
+        self.page_count += 1
+
+    def fingerprint(self, page: Page, line: List[Span]) -> Optional[Fingerprint]:
+        """
+        Returns the fingerprint of a line, or None for a blank line or one
+        outside the top and bottom margins.
+        """
+        text = normalize_line("".join(span.text for span in line))
+        if not text or not page.height:
+            return None
+        top = min(span.bbox[1] for span in line)
+        bottom = max(span.bbox[3] for span in line)
+        if bottom <= self.margin * page.height:
+            region = "top"
+        elif top >= (1 - self.margin) * page.height:
+            region = "bottom"
+        else:
+            return None
+        center = (top + bottom) / 2 / page.height
+        return (text, region, int(center / self.band))
+
+    def is_running(self, fingerprint: Optional[Fingerprint]) -> bool:
+        """
+        Tells whether a fingerprint recurs often enough to be a running line.
+        Neighbouring bands are checked as well, so a line drifting slightly
+        in height still matches.
+        """
+        if fingerprint is None:
+            return False
+        threshold = max(self.min_pages, math.ceil(self.min_share * self.page_count))
+        text, region, band = fingerprint
+        return any(self.counts.get((text, region, band + offset), 0) >= threshold for offset in (-1, 0, 1))
+
+    def strip(self, page: Page) -> Page:
+        """
+        Returns a copy of the page without its running lines. The number of
+        lines dropped is added to `removed_lines`.
+        """
+        spans: List[Span] = []
+        for line in page_lines(page):
+            if self.is_running(self.fingerprint(page, line)):
+                self.removed_lines += 1
+            else:
+                spans.extend(line)
+        if len(spans) == len(page.spans):
+            return page
+        return Page(number=page.number, width=page.width, height=page.height, spans=spans,
+                    images=page.images, ocr_text=page.ocr_text)
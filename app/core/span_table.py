@@ -0,0 +1,152 @@
+# app/core/span_table.py
+import numpy as np
+from app.models import Page
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+# Number of spans gathered into one table when walking a stream of pages. Bounds
+# memory in streaming mode while keeping the array passes long enough to pay off.
+TABLE_CHUNK_SPANS = 65536
+
+# (font id, size) pair of a span, the columnar form of Span.font_key
+KEY_DTYPE = np.dtype([("font", np.int32), ("size", np.float64)])
+
+class SpanTable:
+    """
+    Columnar view of the spans of a range of pages.
+
+    Every span is one row of parallel NumPy arrays: font id (an index into
+    `fonts`), size, flags, page number and bbox. Stripped span texts are kept
+    in one string and addressed by start/end offsets.
+    """
+    def __init__(self, fonts: List[str], font_ids: np.ndarray, sizes: np.ndarray, flags: np.ndarray,
+                 pages: np.ndarray, bboxes: np.ndarray, text: str, text_starts: np.ndarray, text_ends: np.ndarray):
+        self.fonts = fonts
+        self.font_ids = font_ids
+        self.sizes = sizes
+        self.flags = flags
+        self.pages = pages
+        self.bboxes = bboxes
+        self.text = text
+        self.text_starts = text_starts
+        self.text_ends = text_ends
+        self._keys = None
+
+    @classmethod
+    def from_pages(cls, pages: Iterable[Page], with_text: bool = True) -> "SpanTable":
+        """
+        Builds the table for the spans of the given pages, in page order.
+
+        Args:
+            pages: Page objects.
+            with_text: Whether to keep span texts. Font statistics do not need them.
+        """
+        font_index: Dict[str, int] = {}
+        font_ids: List[int] = []
+        sizes: List[float] = []
+        flags: List[int] = []
+        page_numbers: List[int] = []
+        bboxes: List[Tuple[float, float, float, float]] = []
+        texts: List[str] = []
+        for page in pages:
+            for span in page.spans:
+                font_id = font_index.get(span.font)
+                if font_id is None:
+                    font_id = font_index[span.font] = len(font_index)
+                font_ids.append(font_id)
+                sizes.append(span.size)
+                flags.append(span.flags)
+                page_numbers.append(page.number)
+                bboxes.append(span.bbox)
+                if with_text:
+                    texts.append(span.text.strip())
+
+        lengths = np.fromiter(map(len, texts), dtype=np.int64, count=len(texts))
+        text_ends = np.cumsum(lengths)
+        return cls(
+            fonts=list(font_index),
+            font_ids=np.array(font_ids, dtype=np.int32),
+            sizes=np.array(sizes, dtype=np.float64),
+            flags=np.array(flags, dtype=np.int32),
+            pages=np.array(page_numbers, dtype=np.int32),
+            bboxes=np.array(bboxes, dtype=np.float64).reshape(-1, 4),
+            text="".join(texts),
+            text_starts=text_ends - lengths,
+            text_ends=text_ends,
+        )
+
+    def __len__(self) -> int:
+        return len(self.font_ids)
+
+    def span_text(self, row: int) -> str:
+        return self.text[self.text_starts[row]:self.text_ends[row]]
+
+    def font_counts(self) -> Dict[Tuple[str, float], int]:
+        """
+        Counts how many spans use each (font, size) pair, in first-seen order,
+        like page_extractor.count_fonts().
+        """
+        keys, first_rows, _, counts = self._unique_keys()
+        order = np.argsort(first_rows, kind="stable")
+        return {
+            (self.fonts[keys["font"][i]], float(keys["size"][i])): int(counts[i])
+            for i in order
+        }
+
+    def heading_mask(self, heading_fonts: Iterable[Tuple[str, float]]) -> np.ndarray:
+        """
+        Returns a boolean array marking the spans set in one of the heading fonts.
+        """
+        keys, _, inverse, _ = self._unique_keys()
+        font_index = {font: font_id for font_id, font in enumerate(self.fonts)}
+        heading_keys = np.zeros(len(keys), dtype=bool)
+        for font, size in heading_fonts:
+            font_id = font_index.get(font)
+            if font_id is not None:
+                heading_keys |= (keys["font"] == font_id) & (keys["size"] == size)
+        return heading_keys[inverse]
+
+    def nonblank_mask(self) -> np.ndarray:
+        """
+        Returns a boolean array marking the spans whose stripped text is not empty.
+        """
+        return self.text_ends > self.text_starts
+
+    def _unique_keys(self):
+        # Distinct (font id, size) pairs, computed once per table
+        if self._keys is None:
+            pairs = np.empty(len(self), dtype=KEY_DTYPE)
+            pairs["font"] = self.font_ids
+            pairs["size"] = self.sizes
+            keys, first_rows, inverse, counts = np.unique(pairs, return_index=True, return_inverse=True, return_counts=True)
+            self._keys = (keys, first_rows, inverse.reshape(-1), counts)
+        return self._keys
+
+def iter_span_tables(pages: Iterable[Page], max_spans: int = TABLE_CHUNK_SPANS,
+                     with_text: bool = True) -> Iterator[Tuple[List[Page], SpanTable]]:
+    """
+    Groups a stream of pages into runs of whole pages holding about `max_spans`
+    spans and builds a table for each run.
+
+    Yields:
+        (pages, table) tuples in page order.
+    """
+    chunk: List[Page] = []
+    span_count = 0
+    for page in pages:
+        chunk.append(page)
+        span_count += len(page.spans)
+        if span_count >= max_spans:
+            yield chunk, SpanTable.from_pages(chunk, with_text)
+            chunk, span_count = [], 0
+    if chunk:
+        yield chunk, SpanTable.from_pages(chunk, with_text)
+
+def select_heading_fonts(font_counts: Dict[Tuple[str, float], int], ratio: float = 0.2) -> List[Tuple[str, float]]:
+    """
+    Returns the least frequent `ratio` of the fonts, least frequent first.
+    Fonts with equal counts keep their first-seen order.
+    """
+    fonts = list(font_counts)
+    counts = np.fromiter(font_counts.values(), dtype=np.int64, count=len(fonts))
+    order = np.argsort(counts, kind="stable")
+    return [fonts[i] for i in order[:int(ratio * len(fonts))]]
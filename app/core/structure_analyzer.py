@@ -1,47 +1,209 @@
 # app/core/structure_analyzer.py
+import itertools
+import random
 import re
-from typing import List, Tuple
-from app.models import ParsedPDF, Chapter, Heading
+import numpy as np
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from app.models import ParsedPDF, Chapter, Heading, Page, Paragraph, Table
+from app.core.page_extractor import (
+    extract_page, extract_pages, extract_pages_with_font_stats, count_fonts, iter_pages, merge_font_counts, page_ranges,
+    page_lines,
+)
+from app.core.paragraphs import TextLine, build_paragraphs
+from app.core.running_lines import RunningLineIndex
+from app.core.table_detector import attach_tables
+from app.core.image_pipeline import ImagePipeline, attach_figures
+from config import (
+    FONT_SAMPLE_MIN_PAGES, FONT_SAMPLE_BATCH, FONT_SAMPLE_MAX_FRACTION, FONT_SAMPLE_MAX_ERROR,
+    STRUCTURE_USE_OUTLINE, OUTLINE_MIN_ENTRIES, IMAGE_EXTRACTION,
+)
+from app.core.span_table import iter_span_tables, select_heading_fonts
 import fitz
 
-def analyze_structure(pdf: ParsedPDF, doc: fitz.Document) -> ParsedPDF:
+def analyze_structure(pdf: ParsedPDF, doc: fitz.Document, profile: Optional[str] = None) -> ParsedPDF:
     """
     Analyzes the structure of a parsed PDF document to identify chapters and headings.
 
     Args:
         pdf: The ParsedPDF object containing the parsed content.
         doc: The fitz document.
+        profile: Name of the output profile the images are encoded for.
+            Defaults to OUTPUT_PROFILE.
 
     Returns:
         The ParsedPDF object with the identified structure.
     """
     # Analyze font sizes and styles for headings
     print("Inside analyze_structure")
-    font_counts = get_font_stats(doc)
-    heading_fonts = identify_heading_fonts(font_counts)
+    # Reuse the page model from parse_pdf so the document is only extracted once
+    if pdf.pages is not None:
+        pages, font_counts = pdf.pages, pdf.font_counts
+    else:
+        pages, font_counts = extract_pages_with_font_stats(doc, path=pdf.path)
 
-    # Analyze the text content to identify chapters and headings
-    chapters = identify_chapters_and_headings(pdf.content, doc, heading_fonts)
+    # Drop running heads, footers and page numbers before anything is classified
+    running_lines = RunningLineIndex.from_pages(pages)
+    pages = [running_lines.strip(page) for page in pages]
+    pdf.metadata["running_lines_removed"] = running_lines.removed_lines
+    if running_lines.removed_lines:
+        font_counts = None
 
+    # Tables: a cheap span-based prefilter picks the pages the table finder runs on
+    pdf.metadata["table_candidate_pages"] = attach_tables(doc, pages, path=pdf.path)
+    pdf.metadata["tables"] = sum(len(page.tables or []) for page in pages)
+
+    # Images: placed as figures now, encoded in the background until the EPUB is written
+    if IMAGE_EXTRACTION:
+        pdf.images = ImagePipeline(doc, profile=profile)
+        pdf.metadata["figures"] = attach_figures(pages, pdf.images)
+
+    entries = outline_entries(doc)
+    if entries:
+        # The outline gives the chapters; fonts only matter before its first entry
+        front_pages = [page for page in pages if page.number < entries[0][2]]
+        heading_fonts = identify_heading_fonts(get_font_stats(front_pages))
+        chapters = collect_chapters(iter_outline_structure(pages, entries, heading_fonts))
+        if not chapters:
+            chapters.append(Chapter(title="Document", content=[pdf.content], headings=[], page_number=1))
+    else:
+        if font_counts is None:
+            font_counts = get_font_stats(pages)
+        heading_fonts = identify_heading_fonts(font_counts)
+
+        # Analyze the text content to identify chapters and headings
+        chapters = identify_chapters_and_headings(pdf.content, pages, heading_fonts)
+
+    pdf.metadata["structure_strategy"] = structure_strategy(entries)
     pdf.chapters = chapters
     print("Exiting analyze_structure")
 
     return pdf
 
-def get_font_stats(doc: fitz.Document):
+def _as_pages(source: Union[fitz.Document, Iterable[Page]]) -> Iterable[Page]:
+    """
+    Returns the page model for a document, or the page model itself if one is given.
+    """
+    if isinstance(source, fitz.Document):
+        return extract_pages(source)
+    return source
+
+def get_font_stats(doc: Union[fitz.Document, Iterable[Page]]):
     """
     Analyzes font sizes and styles used on each page of the PDF.
+    Accepts either the fitz document or the page model from extract_pages(),
+    which may also be a generator such as iter_pages().
     Returns a dictionary of font statistics.
     """
-    font_counts = {}
-    for page in doc:
-        for block in page.get_text("dict", flags=11)["blocks"]:
-            if block['type'] == 0:  # Text block
-                for line in block["lines"]:
-                    for span in line["spans"]:
-                        font_identifier = (span["font"], span["size"])
-                        font_counts[font_identifier] = font_counts.get(font_identifier, 0) + 1
-    return font_counts
+    return count_fonts(_as_pages(doc))
+
+def sample_font_stats(doc: fitz.Document, min_pages: int = FONT_SAMPLE_MIN_PAGES, batch: int = FONT_SAMPLE_BATCH,
+                      max_fraction: float = FONT_SAMPLE_MAX_FRACTION,
+                      max_error: float = FONT_SAMPLE_MAX_ERROR,
+                      page_filter: Optional[Callable[[Page], Page]] = None) -> Tuple[Dict[Tuple[str, float], int], Dict]:
+    """
+    Builds the font histogram from a stratified sample of pages.
+
+    The document is split into `batch` strata of consecutive pages, and every
+    round samples one more page from each stratum. Sampling stops once two
+    rounds in a row select the same heading fonts, the frequency of the font
+    at the heading cut-off is clearly apart from the next one, and the largest
+    standard error of the font frequencies is at most `max_error`. If that
+    does not happen within `max_fraction` of the pages, or the document is
+    shorter than `min_pages`, every page is counted instead.
+
+    Args:
+        doc: The PyMuPDF Document object.
+        min_pages: Documents with fewer pages are always scanned in full.
+        batch: Number of strata, i.e. pages sampled per round.
+        max_fraction: Largest fraction of the pages sampled before falling back.
+        max_error: Largest accepted standard error of a font frequency.
+        page_filter: Optional function applied to every page before its fonts
+            are counted, e.g. RunningLineIndex.strip.
+
+    Returns:
+        A tuple of the font counts and a report with the "mode" ("sampled" or
+        "full"), "sample_pages", "page_count", "estimated_error" and, after a
+        fallback, the "fallback" reason.
+    """
+    page_count = doc.page_count
+    page_filter = page_filter or (lambda page: page)
+    report = {"mode": "full", "sample_pages": page_count, "page_count": page_count, "estimated_error": 0.0}
+    if page_count < max(min_pages, 2 * batch):
+        return count_fonts(map(page_filter, iter_pages(doc))), report
+
+    page_counts: Dict[int, Dict[Tuple[str, float], int]] = {}
+    previous_selection = None
+    error = None
+    max_pages = max(2 * batch, int(max_fraction * page_count))
+    for round_pages in _stratified_rounds(page_count, batch):
+        for page_num in round_pages:
+            page_counts[page_num] = count_fonts([page_filter(extract_page(doc[page_num]))])
+
+        # Merge in page order so first-seen order, and thus tie-breaking, follows the document
+        font_counts = merge_font_counts([page_counts[page_num] for page_num in sorted(page_counts)])
+        error, ambiguous = _sample_error(list(page_counts.values()), font_counts, page_count)
+        selection = identify_heading_fonts(font_counts)
+        if selection == previous_selection and not ambiguous and error <= max_error:
+            report.update(mode="sampled", sample_pages=len(page_counts), estimated_error=error)
+            return font_counts, report
+        previous_selection = selection
+        if len(page_counts) >= max_pages:
+            break
+
+    report.update(fallback="ambiguous sample", estimated_error=0.0)
+    print(f"Font sample of {len(page_counts)} pages is ambiguous (error {error:.4f}), scanning all pages")
+    return count_fonts(map(page_filter, iter_pages(doc))), report
+
+def _stratified_rounds(page_count: int, batch: int) -> Iterator[List[int]]:
+    """
+    Yields rounds of page indexes holding one not yet sampled page per stratum.
+    The order is pseudo-random but fixed for a page count, so runs are reproducible.
+    """
+    rng = random.Random(page_count)
+    strata = []
+    for start, stop in page_ranges(page_count, batch):
+        stratum = list(range(start, stop))
+        rng.shuffle(stratum)
+        strata.append(stratum)
+    for i in range(max(len(stratum) for stratum in strata)):
+        yield [stratum[i] for stratum in strata if i < len(stratum)]
+
+def _sample_error(page_counts: List[Dict[Tuple[str, float], int]], font_counts: Dict[Tuple[str, float], int],
+                  page_count: int) -> Tuple[float, bool]:
+    """
+    Estimates the standard error of each font's share of all spans from a page
+    sample, treating pages as clusters (ratio estimator with finite population
+    correction).
+
+    Returns:
+        The largest standard error, and whether the shares of the last font
+        selected as a heading font and the first one left out are within two
+        standard errors of each other.
+    """
+    fonts = list(font_counts)
+    column = {font: i for i, font in enumerate(fonts)}
+    matrix = np.zeros((len(page_counts), len(fonts)))
+    for row, counts in enumerate(page_counts):
+        for font, count in counts.items():
+            matrix[row, column[font]] = count
+
+    sampled = len(page_counts)
+    page_totals = matrix.sum(axis=1)
+    if sampled < 2 or page_totals.sum() == 0:
+        return 0.0, False
+    shares = matrix.sum(axis=0) / page_totals.sum()
+    residuals = matrix - page_totals[:, None] * shares
+    correction = 1 - sampled / page_count
+    variance = correction * (residuals ** 2).sum(axis=0) / (sampled - 1) / (sampled * page_totals.mean() ** 2)
+    errors = np.sqrt(variance)
+
+    cutoff = int(0.2 * len(fonts))
+    if cutoff == 0 or cutoff == len(fonts):
+        return float(errors.max()), False
+    order = np.argsort(shares, kind="stable")
+    last, first = order[cutoff - 1], order[cutoff]
+    gap = shares[first] - shares[last]
+    return float(errors.max()), bool(gap <= 2 * np.hypot(errors[last], errors[first]))
 
 def identify_heading_fonts(font_counts: dict):
     """
@@ -51,60 +213,302 @@ def identify_heading_fonts(font_counts: dict):
     if not font_counts:
         return []
 
-    # Sort fonts by frequency (ascending)
-    sorted_fonts = sorted(font_counts.items(), key=lambda item: item[1])
-
     # Assume the least frequent fonts are potential headings
-    heading_threshold = 0.2 * len(sorted_fonts)
-    heading_fonts = [font for font, count in sorted_fonts[:int(heading_threshold)]]
-
-    return heading_fonts
+    return select_heading_fonts(font_counts, 0.2)
 
-def identify_chapters_and_headings(text: str, doc: fitz.Document, heading_fonts: List[Tuple[str, float]]) -> List[Chapter]:
+def identify_chapters_and_headings(text: str, doc: Union[fitz.Document, List[Page]], heading_fonts: List[Tuple[str, float]]) -> List[Chapter]:
     """
     Identifies chapters and headings in the text content using font information.
 
     Args:
         text: The raw text content of the PDF.
-        doc: The fitz document.
+        doc: The fitz document, or the page model from extract_pages().
         heading_fonts: A list of font identifiers potentially used for headings.
 
     Returns:
         A list of Chapter objects with identified headings.
     """
-    chapters: List[Chapter] = []
-    current_chapter = None
-    current_heading = None
-
-    for page_num, page in enumerate(doc):
-        blocks = page.get_text("dict")["blocks"]
-        for b in blocks:
-            if b["type"] == 0:
-                for line in b["lines"]:
-                    for span in line["spans"]:
-                        font_identifier = (span["font"], span["size"])
-                        text = span["text"].strip()
-                        if not text:
-                            continue
-                        if any(font_identifier == h_font for h_font in heading_fonts):
-                            # Likely a heading
-                            if current_chapter is None:
-                                # Start of a new chapter (e.g., first page)
-                                current_chapter = Chapter(title=text, content=[], headings=[], page_number=page_num + 1)
-                                chapters.append(current_chapter)
-                            elif current_heading is None or current_heading.text != text:
-                                current_heading = Heading(text=text, level=1)
-                                current_chapter.headings.append(current_heading)
-                                current_chapter.content.append(text)
-                        elif current_chapter is not None:
-                            current_chapter.content.append(text)
-                        else:
-                            current_chapter = Chapter(title="Chapter", content=[], headings=[], page_number=page_num + 1)
-                            current_chapter.content.append(text)
-                            chapters.append(current_chapter)
+    chapters = build_chapters(classify_spans(_as_pages(doc), heading_fonts))
 
     # If no chapters were identified, treat the whole document as one chapter
     if not chapters:
         chapters.append(Chapter(title="Document", content=[text], headings=[], page_number=1))
 
-    return chapters
\ No newline at end of file
+    return chapters
+
+def classify_spans(pages: Iterable[Page], heading_fonts: List[Tuple[str, float]]) -> Iterator[Tuple[str, Union[str, Paragraph], int]]:
+    """
+    Tags the text of the pages as headings or body paragraphs.
+
+    Lines are classified by classify_lines() and the body lines are then merged
+    into paragraphs by paragraphs.build_paragraphs().
+
+    Args:
+        pages: The page model, or any contiguous range of it. May be a generator.
+        heading_fonts: A list of font identifiers potentially used for headings.
+
+    Yields:
+        (kind, text, page_number) tuples, where kind is "heading" or "text".
+        Body text comes as Paragraph objects, OCR text as plain strings.
+    """
+    return build_paragraphs(classify_lines(pages, heading_fonts))
+
+def classify_lines(pages: Iterable[Page], heading_fonts: List[Tuple[str, float]]) -> Iterator[Tuple]:
+    """
+    Tags every non-empty line as a heading or body text.
+
+    A line is a heading when all of its non-empty spans are set in a heading
+    font. Classification only looks at one line at a time, so page ranges can
+    be classified independently and their results concatenated in page order.
+    Pages are tagged in columnar chunks with one array pass per chunk.
+    OCR text of a page follows its lines as body text, one entry per paragraph.
+
+    Args:
+        pages: The page model, or any contiguous range of it. May be a generator.
+        heading_fonts: A list of font identifiers potentially used for headings.
+
+    Yields:
+        ("heading", text, page_number), ("line", TextLine, page_number) and,
+        for OCR text, ("text", text, page_number) tuples. Lines inside a table
+        found on the page are replaced by one ("table", Table, page_number).
+        Figures of the page come as ("image", Figure, page_number), above the
+        first line that starts below their top edge.
+    """
+    for chunk, table in iter_span_tables(pages):
+        # Headings are likely set in a heading font
+        is_heading = table.heading_mask(heading_fonts).tolist()
+        nonblank = table.nonblank_mask().tolist()
+        row = 0
+        for page in chunk:
+            tables = page.tables or []
+            pending = list(tables)
+            figures = sorted(page.figures or [], key=lambda figure: figure.bbox[1])
+            for line in page_lines(page):
+                # A figure goes before the first line that starts below its top edge
+                while figures and figures[0].bbox[1] <= min(span.bbox[1] for span in line):
+                    yield ("image", figures.pop(0), page.number)
+                rows = [r for r in range(row, row + len(line)) if nonblank[r]]
+                row += len(line)
+                table = _table_at(tables, line) if tables else None
+                if table is not None:
+                    # The table replaces its text, at the position of its first line
+                    if table in pending:
+                        pending.remove(table)
+                        yield ("table", table, page.number)
+                elif rows and all(is_heading[r] for r in rows):
+                    yield ("heading", " ".join("".join(span.text for span in line).split()), page.number)
+                elif rows:
+                    yield ("line", TextLine(line, page.number), page.number)
+            for table in pending:
+                yield ("table", table, page.number)
+            for figure in figures:
+                yield ("image", figure, page.number)
+            if page.ocr_text:
+                for paragraph in re.split(r"\n\s*\n", page.ocr_text):
+                    text = " ".join(paragraph.split())
+                    if text:
+                        yield ("text", text, page.number)
+
+def _table_at(tables: List[Table], line: List) -> Optional[Table]:
+    """
+    Returns the table, among those found on the page, holding the center of a line.
+    """
+    x = (min(span.bbox[0] for span in line) + max(span.bbox[2] for span in line)) / 2
+    y = (min(span.bbox[1] for span in line) + max(span.bbox[3] for span in line)) / 2
+    for table in tables:
+        x0, y0, x1, y1 = table.bbox
+        if x0 <= x <= x1 and y0 <= y <= y1:
+            return table
+    return None
+
+def iter_chapter_events(classified: Iterable[Tuple[str, Union[str, Paragraph], int]]) -> Iterator[Tuple]:
+    """
+    Turns classified text into a stream of chapter events.
+
+    This is the merge step: it walks the classified text of all page ranges in
+    page order, so a chapter started in one range continues into the next.
+
+    Args:
+        classified: (kind, text, page_number) tuples from classify_spans().
+
+    Yields:
+        ("chapter_start", title, page_number), ("heading", text, level),
+        ("text", text), ("table", Table), ("image", Figure) and ("chapter_end",) events.
+    """
+    in_chapter = False
+    current_heading = None
+
+    for kind, text, page_number in classified:
+        if kind == "heading":
+            if not in_chapter:
+                # Start of a new chapter (e.g., first page)
+                in_chapter = True
+                yield ("chapter_start", text, page_number)
+            elif current_heading is None or current_heading != text:
+                current_heading = text
+                yield ("heading", text, 1)
+        elif in_chapter:
+            yield (kind, text)
+        else:
+            in_chapter = True
+            yield ("chapter_start", "Chapter", page_number)
+            yield (kind, text)
+
+    if in_chapter:
+        yield ("chapter_end",)
+
+def build_chapters(classified: Iterable[Tuple[str, Union[str, Paragraph], int]]) -> List[Chapter]:
+    """
+    Groups classified spans into chapters and headings.
+
+    Args:
+        classified: (kind, text, page_number) tuples from classify_spans().
+
+    Returns:
+        A list of Chapter objects with identified headings.
+    """
+    return collect_chapters(iter_chapter_events(classified))
+
+def collect_chapters(events: Iterable[Tuple]) -> List[Chapter]:
+    """
+    Builds Chapter objects from a stream of chapter events.
+
+    Args:
+        events: Chapter events, as described in iter_chapter_events().
+
+    Returns:
+        A list of Chapter objects with identified headings.
+    """
+    chapters: List[Chapter] = []
+    for event in events:
+        kind = event[0]
+        if kind == "chapter_start":
+            chapters.append(Chapter(title=event[1], content=[], headings=[], page_number=event[2]))
+        elif kind == "heading":
+            heading = Heading(text=event[1], level=event[2])
+            chapters[-1].headings.append(heading)
+            chapters[-1].content.append(heading)  # Marks where the heading goes
+        elif kind in ("text", "table", "image"):
+            chapters[-1].content.append(event[1])
+    return chapters
+
+def outline_entries(doc: fitz.Document, min_entries: int = OUTLINE_MIN_ENTRIES) -> List[Tuple[int, str, int]]:
+    """
+    Returns the usable entries of the document outline, or an empty list if
+    there is no outline fit to build the structure from.
+
+    Entries without a page in the document or without a title are dropped, and
+    levels are shifted so the top level is 1. An outline whose entries are not
+    in page order does not describe the reading order and is rejected.
+
+    Returns:
+        (level, title, page_number) tuples in outline order.
+    """
+    if not STRUCTURE_USE_OUTLINE:
+        return []
+    entries = []
+    for level, title, page_number in doc.get_toc(simple=True):
+        title = " ".join(title.split())
+        if title and 1 <= page_number <= doc.page_count:
+            entries.append((level, title, page_number))
+    if len(entries) < min_entries:
+        return []
+    if any(entries[i][2] > entries[i + 1][2] for i in range(len(entries) - 1)):
+        return []
+    top = min(level for level, _, _ in entries)
+    return [(level - top + 1, title, page_number) for level, title, page_number in entries]
+
+def structure_strategy(entries: List[Tuple[int, str, int]]) -> str:
+    """
+    Names the strategy used for a document: "outline", "outline+fonts" when
+    pages before the first outline entry were analyzed by font, or "fonts".
+    """
+    if not entries:
+        return "fonts"
+    return "outline" if entries[0][2] == 1 else "outline+fonts"
+
+def iter_outline_structure(pages: Iterable[Page], entries: List[Tuple[int, str, int]],
+                           heading_fonts: List[Tuple[str, float]]) -> Iterator[Tuple]:
+    """
+    Emits chapter events from the document outline instead of font analysis.
+
+    Top-level entries start chapters and deeper entries become headings. An
+    entry is placed at the line on its page that carries its title, or at the
+    top of the page if no line does. Pages before the first entry are
+    structured by font analysis with the given heading fonts.
+
+    Args:
+        pages: Page objects in page order. May be a generator.
+        entries: Outline entries, from outline_entries().
+        heading_fonts: Heading fonts of the pages before the first entry.
+
+    Yields:
+        Chapter events, as described in iter_chapter_events(). Every chapter
+        is closed by a ("chapter_end",) event.
+    """
+    pages = iter(pages)
+    first_page = entries[0][2]
+    pending: List[Page] = []
+
+    def front_pages() -> Iterator[Page]:
+        for page in pages:
+            if page.number >= first_page:
+                pending.append(page)
+                return
+            yield page
+
+    yield from iter_chapter_events(classify_spans(front_pages(), heading_fonts))
+
+    by_page: Dict[int, List[Tuple[int, str]]] = {}
+    for level, title, page_number in entries:
+        by_page.setdefault(page_number, []).append((level, title))
+
+    def outline_items() -> Iterator[Tuple]:
+        # The lines of every page, with each entry placed at the line carrying its title
+        for page in itertools.chain(pending, pages):
+            items = list(classify_lines([page], []))
+            keys = [item[1].text.casefold() if item[0] == "line" else None for item in items]
+            position = 0
+            for level, title in by_page.get(page.number, []):
+                if title.casefold() in keys[position:]:
+                    match = keys.index(title.casefold(), position)
+                    yield from items[position:match]
+                    position = match + 1
+                yield ("outline", (level, title), page.number)
+            yield from items[position:]
+
+    in_chapter = False
+    preamble: List[Tuple] = []  # Text on the first outline page above its entry
+    for kind, payload, page_number in build_paragraphs(outline_items()):
+        if kind != "outline":
+            if in_chapter:
+                yield (kind, payload)
+            else:
+                preamble.append((kind, payload))
+            continue
+        level, title = payload
+        if level == 1 or not in_chapter:
+            if in_chapter:
+                yield ("chapter_end",)
+            in_chapter = True
+            yield ("chapter_start", title, page_number)
+            yield from preamble
+            preamble = []
+        else:
+            yield ("heading", title, level - 1)
+
+    if in_chapter:
+        yield ("chapter_end",)
+
+def iter_structure(pages: Iterable[Page], heading_fonts: List[Tuple[str, float]]) -> Iterator[Tuple]:
+    """
+    Streaming counterpart of analyze_structure: consumes pages and emits chapter events.
+
+    Args:
+        pages: Page objects in page order, e.g. from iter_parse_pdf().
+        heading_fonts: Heading fonts, from identify_heading_fonts().
+
+    Yields:
+        Chapter events, as described in iter_chapter_events().
+    """
+    return iter_chapter_events(classify_spans(pages, heading_fonts))
@@ -0,0 +1,168 @@
+# app/core/table_detector.py
+import os
+import fitz
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from app.models import Page, Table
+from app.core.page_extractor import page_lines, page_ranges
+from config import (
+    ANALYSIS_WORKERS, TABLE_DETECTION, TABLE_MIN_ROWS, TABLE_MIN_COLUMNS, TABLE_PARALLEL_MIN_PAGES,
+    TABLE_STREAM_WINDOW,
+)
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+def is_table_candidate(page: Page, min_rows: int = TABLE_MIN_ROWS, min_columns: int = TABLE_MIN_COLUMNS) -> bool:
+    """
+    Cheap check, on the span data only, for pages that may hold a table.
+
+    Text lines are bucketed by their vertical center into rows. A row with
+    two or more lines side by side is a candidate table row. The page is a
+    candidate when at least `min_rows` such rows share `min_columns` or more
+    left edges, and their fragments are short. The length check keeps
+    ordinary two-column text out.
+    """
+    rows: Dict[int, List[float]] = {}
+    widths: Dict[int, List[float]] = {}
+    for line in page_lines(page):
+        if not "".join(span.text for span in line).strip():
+            continue
+        x0 = min(span.bbox[0] for span in line)
+        x1 = max(span.bbox[2] for span in line)
+        center = (min(span.bbox[1] for span in line) + max(span.bbox[3] for span in line)) / 2
+        row = int(center / 2)
+        rows.setdefault(row, []).append(x0)
+        widths.setdefault(row, []).append(x1 - x0)
+
+    table_rows = [row for row, starts in rows.items() if len(starts) >= 2]
+    if len(table_rows) < min_rows:
+        return False
+    fragment_widths = [width for row in table_rows for width in widths[row]]
+    if sum(fragment_widths) / len(fragment_widths) > 0.3 * page.width:
+        return False
+
+    column_rows: Dict[int, int] = {}
+    for row in table_rows:
+        for column in {int(x0 / 2) for x0 in rows[row]}:
+            column_rows[column] = column_rows.get(column, 0) + 1
+    return sum(1 for count in column_rows.values() if count >= min_rows) >= min_columns
+
+def extract_tables(page: fitz.Page) -> List[Table]:
+    """
+    Runs PyMuPDF's table finder on a page and returns the tables with at
+    least two rows and two columns.
+    """
+    tables = []
+    for found in page.find_tables().tables:
+        rows = [[" ".join((cell or "").split()) for cell in row] for row in found.extract()]
+        if len(rows) < 2 or max(len(row) for row in rows) < 2:
+            continue
+        header = found.header is not None and not found.header.external
+        tables.append(Table(rows=rows, page_number=page.number + 1, bbox=tuple(found.bbox), header=header))
+    return tables
+
+def find_tables(doc: fitz.Document, page_numbers: List[int], workers: Optional[int] = None,
+                path: Optional[str] = None) -> Dict[int, List[Table]]:
+    """
+    Runs the table finder on the given pages only, splitting them across
+    processes when there are enough of them.
+
+    Args:
+        doc: The PyMuPDF Document object.
+        page_numbers: 1-based numbers of the candidate pages.
+        workers: Number of worker processes. Defaults to ANALYSIS_WORKERS.
+        path: Path the workers open. Defaults to the document's own file; an
+            in-memory document without one is searched serially.
+
+    Returns:
+        A dictionary from page number to the tables found on that page.
+    """
+    if workers is None:
+        workers = ANALYSIS_WORKERS
+    path = path or doc.name
+    ranges = page_ranges(len(page_numbers), workers) if page_numbers else []
+
+    if len(ranges) < 2 or len(page_numbers) < TABLE_PARALLEL_MIN_PAGES or not path or not os.path.isfile(path):
+        tables = {number: extract_tables(doc[number - 1]) for number in page_numbers}
+    else:
+        tables = {}
+        with ProcessPoolExecutor(max_workers=len(ranges)) as executor:
+            futures = [executor.submit(_find_tables_on_pages, path, page_numbers[start:stop]) for start, stop in ranges]
+            for future in futures:
+                tables.update(future.result())
+    return {number: found for number, found in tables.items() if found}
+
+def attach_tables(doc: fitz.Document, pages: List[Page], path: Optional[str] = None) -> int:
+    """
+    Prefilters the pages, runs the table finder on the candidates and sets
+    `tables` on the pages where tables were found.
+
+    Returns:
+        The number of candidate pages that were searched.
+    """
+    if not TABLE_DETECTION:
+        return 0
+    candidates = [page.number for page in pages if is_table_candidate(page)]
+    tables = find_tables(doc, candidates, path=path)
+    for page in pages:
+        if page.number in tables:
+            page.tables = tables[page.number]
+    return len(candidates)
+
+def iter_with_tables(doc: fitz.Document, pages: Iterable[Page], path: Optional[str] = None,
+                     workers: Optional[int] = None) -> Iterator[Page]:
+    """
+    Streaming counterpart of attach_tables: searches each candidate page for
+    tables as it passes.
+
+    With a file the workers can open, candidates are searched on a process
+    pool while later pages are read. Pages come back in order, and at most
+    TABLE_STREAM_WINDOW of them are held back waiting for a search.
+
+    Args:
+        doc: The PyMuPDF Document object.
+        pages: Page models in page order. May be a generator.
+        path: Path the workers open. Defaults to the document's own file; an
+            in-memory document without one is searched serially.
+        workers: Number of worker processes. Defaults to ANALYSIS_WORKERS.
+    """
+    if workers is None:
+        workers = ANALYSIS_WORKERS
+    path = path or doc.name
+    if not TABLE_DETECTION or workers < 2 or not path or not os.path.isfile(path):
+        for page in pages:
+            if TABLE_DETECTION and is_table_candidate(page):
+                page.tables = extract_tables(doc[page.number - 1]) or None
+            yield page
+        return
+
+    window = deque()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for page in pages:
+            future = executor.submit(_find_tables_on_pages, path, [page.number]) if is_table_candidate(page) else None
+            window.append((page, future))
+            # Hand back the pages at the head that are done, or wait once the window is full
+            while window and (window[0][1] is None or window[0][1].done() or len(window) > TABLE_STREAM_WINDOW):
+                yield _with_tables(*window.popleft())
+        while window:
+            yield _with_tables(*window.popleft())
+
+def _with_tables(page: Page, future: Optional[Future]) -> Page:
+    if future is not None:
+        page.tables = future.result()[page.number] or None
+    return page
+
+# Document a worker process keeps open between calls, with its path
+_worker_doc: Optional[Tuple[str, fitz.Document]] = None
+
+def _find_tables_on_pages(path: str, page_numbers: List[int]) -> Dict[int, List[Table]]:
+    """
+    Worker entry point: searches the given pages of its own copy of the
+    document, which stays open for the next call on the same file.
+    """
+    global _worker_doc
+    if _worker_doc is None or _worker_doc[0] != path:
+        if _worker_doc is not None:
+            _worker_doc[1].close()
+        _worker_doc = (path, fitz.open(path))
+    doc = _worker_doc[1]
+    return {number: extract_tables(doc[number - 1]) for number in page_numbers}
@@ -0,0 +1,86 @@
+# app/core/text_normalizer.py
+import re
+import unicodedata
+from app.models import Page
+
+# Ligatures, hyphen variants, odd spaces and invisible characters, and what
+# each is replaced with
+REPLACEMENTS = {
+    # Ligatures
+    "\ufb00": "ff", "\ufb01": "fi", "\ufb02": "fl", "\ufb03": "ffi", "\ufb04": "ffl", "\ufb05": "st", "\ufb06": "st",
+    "\u0132": "IJ", "\u0133": "ij",
+    # Hyphens and minus signs
+    "\u2010": "-", "\u2011": "-", "\u2212": "-",
+    # Tabs and the no-break, fixed-width and ideographic spaces
+    "\t": " ", "\u00a0": " ", "\u202f": " ", "\u205f": " ", "\u3000": " ",
+    **{chr(code): " " for code in range(0x2000, 0x200b)},
+    # Zero-width characters, byte order marks and control characters
+    "\u200b": "", "\u2060": "", "\ufeff": "", "\r": "", "\x7f": "",
+    **{chr(code): "" for code in range(0x00, 0x20) if chr(code) not in "\t\n\r"},
+}
+
+# One character class over all of them. Substituting through it costs a C scan
+# plus a dict lookup per match, which beats str.translate() on non-ASCII text
+REPLACED_CHARS = re.compile("[%s]" % re.escape("".join(REPLACEMENTS)))
+
+# Control characters other than tab, line feed and carriage return. They are
+# dropped, but counted first: in a text layer they mark undecodable glyphs
+CONTROL_CHARS = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+# Soft hyphens inside a word and words hyphenated across a line break. A soft
+# hyphen at the end of a text is kept: it marks a line-end break that the
+# paragraph builder rejoins.
+BROKEN_WORDS = re.compile(r"\u00ad+(?=\w)|-[ ]*\n[ ]*(?=[a-z])")
+
+# Runs of spaces
+SPACES = re.compile(r" {2,}")
+
+def _replace_char(match: re.Match) -> str:
+    return REPLACEMENTS[match.group()]
+
+def _join_word(match: re.Match) -> str:
+    # A line-end hyphen only splits a word when a letter comes before it
+    if match.group()[0] == "-" and not match.string[match.start() - 1:match.start()].isalpha():
+        return match.group()
+    return ""
+
+def normalize_text(text: str) -> str:
+    """
+    Normalizes extracted text: expands ligatures, unifies hyphens and spaces,
+    drops invisible and control characters, removes soft hyphens inside words,
+    rejoins words hyphenated across a line break, collapses runs of spaces and
+    composes the result to Unicode NFC.
+
+    Odd characters are replaced in one pass of a precompiled character class.
+    The other fixes are guarded by substring tests, so clean text, the common
+    case, is only scanned; their regexes run only on text that needs them.
+
+    Args:
+        text: The text of a span, block or page.
+
+    Returns:
+        The normalized text.
+    """
+    text = REPLACED_CHARS.sub(_replace_char, text)
+    if "\u00ad" in text or "-" in text and "\n" in text:
+        text = BROKEN_WORDS.sub(_join_word, text)
+    if "  " in text:
+        text = SPACES.sub(" ", text)
+    if not text.isascii() and not unicodedata.is_normalized("NFC", text):
+        text = unicodedata.normalize("NFC", text)
+    return text
+
+def normalize_page(page: Page) -> Page:
+    """
+    Normalizes the span texts and the OCR text of a page in place.
+
+    The control characters removed from the spans are counted in
+    page.control_chars, so OCR triage still sees a garbled text layer.
+    """
+    for span in page.spans:
+        if not span.text.isprintable():  # Only then can it hold control characters
+            page.control_chars += len(CONTROL_CHARS.findall(span.text))
+        span.text = normalize_text(span.text)
+    if page.ocr_text:
+        page.ocr_text = normalize_text(page.ocr_text)
+    return page
@@ -0,0 +1,99 @@
+# app/core/upload.py
+import hashlib
+import mmap
+import os
+from app.models import UploadedPDF
+from config import UPLOAD_CHUNK_SIZE
+from typing import BinaryIO, Optional, Union
+
+def copy_upload(source: str, target: str, chunk_size: int = UPLOAD_CHUNK_SIZE) -> str:
+    """
+    Copies a file one chunk at a time, hashing each chunk on the way, so the
+    copy and the digest take a single read of the file.
+
+    Returns:
+        The SHA-256 digest of the file.
+    """
+    digest = hashlib.sha256()
+    buffer = bytearray(chunk_size)
+    with open(source, "rb") as src, open(target, "wb") as dst:
+        while True:
+            read = src.readinto(buffer)
+            if not read:
+                break
+            chunk = memoryview(buffer)[:read]
+            digest.update(chunk)
+            dst.write(chunk)
+    return digest.hexdigest()
+
+def read_upload(source: Union[str, BinaryIO], chunk_size: int = UPLOAD_CHUNK_SIZE, digest: Optional[str] = None) -> UploadedPDF:
+    """
+    Reads an upload into memory once, hashing each chunk as it arrives.
+
+    Chunks are read straight into one growing buffer, so the data is not copied
+    again before PyMuPDF opens it, and the digest is ready as soon as the last
+    chunk is in.
+
+    Args:
+        source: A path or a binary file object, such as an upload stream.
+        chunk_size: Number of bytes read at a time.
+        digest: The SHA-256 digest of the upload, if it is known already. The
+            data is then not hashed again.
+
+    Returns:
+        An UploadedPDF holding the data and its SHA-256 digest.
+    """
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            upload = read_upload(f, chunk_size, digest)
+        upload.path = source
+        return upload
+
+    # Preallocate when the size is known. The buffer only grows once it is
+    # full and there is more to read, and is trimmed to the data at the end.
+    try:
+        expected = os.fstat(source.fileno()).st_size
+    except (AttributeError, OSError, ValueError):
+        expected = 0
+    buffer = bytearray(expected or chunk_size)
+    hasher = hashlib.sha256() if digest is None else None
+    size = 0
+    while True:
+        if size == len(buffer):
+            chunk = source.read(chunk_size)
+            if not chunk:
+                break
+            buffer += chunk
+            read = len(chunk)
+        else:
+            with memoryview(buffer)[size:size + chunk_size] as view:
+                read = source.readinto(view)
+            if not read:
+                break
+        if hasher is not None:
+            with memoryview(buffer)[size:size + read] as view:
+                hasher.update(view)
+        size += read
+    del buffer[size:]
+
+    return UploadedPDF(memoryview(buffer), hasher.hexdigest() if hasher is not None else digest,
+                       getattr(source, "name", None))
+
+def map_upload(path: str, chunk_size: int = UPLOAD_CHUNK_SIZE) -> UploadedPDF:
+    """
+    Memory-maps a PDF file that is already on local disk and hashes it.
+
+    Args:
+        path: The path to the PDF file.
+        chunk_size: Number of bytes hashed at a time.
+
+    Returns:
+        An UploadedPDF whose data is a view of the mapped file.
+    """
+    with open(path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    data = memoryview(mapped)
+    digest = hashlib.sha256()
+    for start in range(0, len(data), chunk_size):
+        digest.update(data[start:start + chunk_size])
+    return UploadedPDF(data, digest.hexdigest(), path)
@@ -1,22 +1,30 @@
 # app/models.py
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple, Union
 
 class ParsedPDF:
     """
     Represents a parsed PDF document.
     """
-    def __init__(self, title: str, author: str, chapters: List["Chapter"], metadata: Dict, content: str):
+    def __init__(self, title: str, author: str, chapters: List["Chapter"], metadata: Dict, content: str, pages: Optional[List["Page"]] = None, font_counts: Optional[Dict] = None):
         self.title = title
         self.author = author
         self.chapters = chapters
         self.metadata = metadata
         self.content = content
+        self.pages = pages
+        self.font_counts = font_counts
+        self.images = None  # ImagePipeline holding the images of the figures, set by analyze_structure
+        self.path: Optional[str] = None  # File the document was read from, which worker processes open
 
 class Chapter:
     """
     Represents a chapter in a document.
+
+    Content entries are Heading markers, plain text, Paragraph, Table or Figure objects.
+    Headings appear in the content where they occur, so rendering does not have
+    to look them up by text.
     """
-    def __init__(self, title: str, content: List[str], headings: List["Heading"], page_number: int):
+    def __init__(self, title: str, content: List[Union[str, "Heading", "Paragraph", "Table", "Figure"]], headings: List["Heading"], page_number: int):
         self.title = title
         self.content = content
         self.headings = headings
@@ -28,4 +36,210 @@ class Heading:
     """
     def __init__(self, text: str, level: int):
         self.text = text
-        self.level = level
\ No newline at end of file
+        self.level = level
+
+    def __str__(self):
+        return self.text
+
+    def __eq__(self, other):
+        if not isinstance(other, Heading):
+            return NotImplemented
+        return (self.text, self.level) == (other.text, other.level)
+
+    def __repr__(self):
+        return f"Heading({self.text!r}, level={self.level})"
+
+class TextRun:
+    """
+    Represents a run of paragraph text sharing one style.
+    """
+    def __init__(self, text: str, bold: bool = False, italic: bool = False):
+        self.text = text
+        self.bold = bold
+        self.italic = italic
+
+    def __eq__(self, other):
+        if not isinstance(other, TextRun):
+            return NotImplemented
+        return (self.text, self.bold, self.italic) == (other.text, other.bold, other.italic)
+
+    def __repr__(self):
+        return f"TextRun({self.text!r}, bold={self.bold}, italic={self.italic})"
+
+class Paragraph:
+    """
+    Represents a paragraph rebuilt from the lines of a page, as styled runs.
+    """
+    def __init__(self, runs: List[TextRun], page_number: int):
+        self.runs = runs
+        self.page_number = page_number
+
+    @property
+    def text(self) -> str:
+        return "".join(run.text for run in self.runs)
+
+    def __str__(self):
+        return self.text
+
+    def __eq__(self, other):
+        if not isinstance(other, Paragraph):
+            return NotImplemented
+        return (self.runs, self.page_number) == (other.runs, other.page_number)
+
+    def __repr__(self):
+        return f"Paragraph({self.runs!r}, page_number={self.page_number})"
+
+class Table:
+    """
+    Represents a table found on a PDF page, as rows of cell texts.
+    """
+    def __init__(self, rows: List[List[str]], page_number: int, bbox: Tuple[float, float, float, float], header: bool = False):
+        self.rows = rows
+        self.page_number = page_number
+        self.bbox = bbox
+        self.header = header  # Whether the first row is a header row
+
+class Figure:
+    """
+    Represents an image placed in the text flow. Every placement of the same
+    image refers to the same file in the book.
+    """
+    def __init__(self, file_name: str, page_number: int, bbox: Tuple[float, float, float, float]):
+        self.file_name = file_name  # Path of the image inside the book
+        self.page_number = page_number
+        self.bbox = bbox
+
+    def __eq__(self, other):
+        if not isinstance(other, Figure):
+            return NotImplemented
+        return (self.file_name, self.page_number, self.bbox) == (other.file_name, other.page_number, other.bbox)
+
+    def __repr__(self):
+        return f"Figure({self.file_name!r}, page_number={self.page_number})"
+
+class BookImage:
+    """
+    Represents an encoded image file ready to be added to the book.
+    """
+    def __init__(self, file_name: str, media_type: str, data: bytes, width: int, height: int):
+        self.file_name = file_name
+        self.media_type = media_type
+        self.data = data
+        self.width = width
+        self.height = height
+
+class Job:
+    """
+    Represents a conversion waiting for, running on or finished by the job queue.
+    """
+    def __init__(self, job_id: str, pdf_path: str, profile: Optional[str] = None, key: Optional[str] = None,
+                 digest: Optional[str] = None):
+        self.id = job_id
+        self.pdf_path = pdf_path  # Copy of the upload, removed when the job finishes
+        self.profile = profile
+        self.key = key  # Identifies the conversion; jobs with the same key are merged
+        self.digest = digest  # SHA-256 of the upload
+        self.status = "queued"  # queued, running, done or failed
+        self.result: Optional[str] = None  # Path of the EPUB
+        self.error: Optional[str] = None
+        self.submitted: Optional[float] = None
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+
+    def __repr__(self):
+        return f"Job({self.id!r}, status={self.status!r})"
+
+class Span:
+    """
+    Represents a run of text sharing one font, as extracted from a PDF page.
+    """
+    def __init__(self, text: str, font: str, size: float, flags: int, bbox: Tuple[float, float, float, float], block: int = 0, line: int = 0):
+        self.text = text
+        self.font = font
+        self.size = size
+        self.flags = flags
+        self.bbox = bbox
+        self.block = block
+        self.line = line
+
+    @property
+    def font_key(self) -> Tuple[str, float]:
+        return (self.font, self.size)
+
+    def to_list(self) -> list:
+        return [self.text, self.font, self.size, self.flags, list(self.bbox), self.block, self.line]
+
+    @classmethod
+    def from_list(cls, data: list) -> "Span":
+        text, font, size, flags, bbox, block, line = data
+        return cls(text=text, font=font, size=size, flags=flags, bbox=tuple(bbox), block=block, line=line)
+
+class PageImage:
+    """
+    Represents an image placed on a PDF page.
+    """
+    def __init__(self, xref: int, bbox: Tuple[float, float, float, float], width: int, height: int):
+        self.xref = xref
+        self.bbox = bbox
+        self.width = width
+        self.height = height
+
+    def to_list(self) -> list:
+        return [self.xref, list(self.bbox), self.width, self.height]
+
+    @classmethod
+    def from_list(cls, data: list) -> "PageImage":
+        xref, bbox, width, height = data
+        return cls(xref=xref, bbox=tuple(bbox), width=width, height=height)
+
+class Page:
+    """
+    Represents the content extracted from a single PDF page.
+    """
+    def __init__(self, number: int, width: float, height: float, spans: List[Span], images: List[PageImage], ocr_text: Optional[str] = None,
+                 tables: Optional[List["Table"]] = None, figures: Optional[List["Figure"]] = None, control_chars: int = 0):
+        self.number = number
+        self.width = width
+        self.height = height
+        self.spans = spans
+        self.images = images
+        self.ocr_text = ocr_text
+        self.control_chars = control_chars  # Control characters removed from the spans; they count as garbage in OCR triage
+        self.tables = tables
+        self.figures = figures
+
+    def to_dict(self) -> Dict:
+        return {
+            "number": self.number,
+            "width": self.width,
+            "height": self.height,
+            "spans": [span.to_list() for span in self.spans],
+            "images": [image.to_list() for image in self.images],
+            "ocr_text": self.ocr_text,
+            "control_chars": self.control_chars,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Page":
+        return cls(
+            number=data["number"],
+            width=data["width"],
+            height=data["height"],
+            spans=[Span.from_list(span) for span in data["spans"]],
+            images=[PageImage.from_list(image) for image in data["images"]],
+            ocr_text=data["ocr_text"],
+            control_chars=data.get("control_chars", 0),
+        )
+
+class UploadedPDF:
+    """
+    Represents an uploaded PDF held in memory, with the SHA-256 digest of its content.
+    """
+    def __init__(self, data: Union[bytes, memoryview], digest: str, path: Optional[str] = None):
+        self.data = data
+        self.digest = digest
+        self.path = path
+
+    @property
+    def size(self) -> int:
+        return len(self.data)
@@ -1,19 +1,36 @@
 import os
 import tempfile
+import time
 import fitz
 import gradio as gr
-from app.core.pdf_parser import parse_pdf
-from app.core.epub_generator import create_epub
-from app.core.structure_analyzer import analyze_structure
+from typing import Dict, Iterator, Optional, Tuple
+from app.core.pdf_parser import parse_pdf, iter_parse_pdf, extract_metadata
+from app.core.page_extractor import extract_page, open_pdf
+from app.core.upload import read_upload
+from app.core.checkpoint import PageCheckpoint
+from app.core.conversion_cache import ConversionCache, conversion_key, get_conversion_cache
+from app.core.running_lines import RunningLineIndex
+from app.core.table_detector import iter_with_tables
+from app.core.image_pipeline import ImagePipeline, iter_with_figures
+from app.core.job_queue import JobQueue
+from app.models import Job, UploadedPDF
+from app.core.epub_generator import create_epub, create_epub_from_events
+from app.core.structure_analyzer import (
+    analyze_structure, get_font_stats, identify_heading_fonts, iter_structure, sample_font_stats,
+    outline_entries, structure_strategy, iter_outline_structure,
+)
 from app.core.utils import cleanup_temp_files
-from config import UPLOAD_FOLDER, OUTPUT_FOLDER  # Make sure OUTPUT_FOLDER is defined
+from config import UPLOAD_FOLDER, OUTPUT_FOLDER, STREAMING_MIN_PAGES, CHECKPOINT_FOLDER, RUNNING_LINE_SAMPLE_PAGES, IMAGE_EXTRACTION, JOB_POLL_INTERVAL  # Make sure OUTPUT_FOLDER is defined
 
-def convert_pdf_to_epub(pdf_file):
+def convert_pdf_to_epub(pdf_file, profile: Optional[str] = None):
     """
-    Handles the PDF to EPUB conversion process.
+    Handles the PDF to EPUB conversion process inside the request handler.
+
+    Args:
+        pdf_file: The uploaded file.
+        profile: Name of the output profile; OUTPUT_PROFILE when not chosen.
     """
     print("Function called")
-    temp_output_dir = None
 
     try:
         # Check if the uploaded file is a PDF
@@ -21,55 +38,231 @@ def convert_pdf_to_epub(pdf_file):
             gr.Error("Invalid file type. Please upload a PDF file.")
             return None
 
+        return convert_file(pdf_file.name, profile)
+
+    except Exception as e:
+        # Handle errors and provide feedback to the user
+        print(f"An error occurred during conversion: {e}")
+        gr.Error(f"An error occurred during conversion: {e}")
+        return None
+
+def convert_file(file_path: str, profile: Optional[str] = None, digest: Optional[str] = None) -> str:
+    """
+    Converts a PDF file to EPUB. Runs in the request handler, and in the
+    worker processes of the job queue.
+
+    Args:
+        file_path: The path of the PDF file.
+        profile: Name of the output profile; OUTPUT_PROFILE when not chosen.
+        digest: The SHA-256 digest of the file, if the caller hashed it already,
+            as the job queue does while copying the upload.
+
+    Returns:
+        The absolute path of the EPUB file.
+    """
+    temp_output_dir = None
+    doc = None
+
+    try:
+        print("File path:", file_path)
+
+        # Read the upload into memory once, hashing it on the way in unless
+        # the caller did. With a digest, the cache is checked before reading.
+        upload = None
+        if digest is None:
+            upload = read_upload(file_path)
+            digest = upload.digest
+        print("PDF file sha256:", digest)
+
+        # A PDF converted before with the same options is served from the
+        # cache, before any work is done on it
+        cache = get_conversion_cache()
+        cache_key = conversion_key(digest, profile)
+        cached_path = cache.get(cache_key) if cache else None
+        if cached_path is not None:
+            print("Served from the conversion cache:", cached_path)
+            return cached_path
+        if upload is None:
+            upload = read_upload(file_path, digest=digest)
+
         # Create a temporary directory for the output
         temp_output_dir = tempfile.mkdtemp()
         print("Created temporary output directory:", temp_output_dir)
 
-        # Use the path directly
-        file_path = pdf_file.name
-        print("File path:", file_path)
+        # Open the upload from memory
+        doc, _ = open_pdf(upload)
+
+        # Generate the EPUB
+        epub_filename = os.path.splitext(os.path.basename(file_path))[0] + ".epub"
+        epub_path = os.path.join(temp_output_dir, epub_filename)
+
+        # Pages are checkpointed per conversion, keyed like the conversion cache,
+        # so a restarted conversion of the same file with the same options redoes
+        # only the pages that were not finished, and jobs converting the same
+        # file with other options do not share (and clear) each other's pages
+        checkpoint = PageCheckpoint(os.path.join(CHECKPOINT_FOLDER, cache_key), upload.digest)
 
-        # Open the PDF file using the path from pdf_file.name
-        doc = fitz.open(file_path)
-        print("Open the PDF file")
+        if doc.page_count >= STREAMING_MIN_PAGES:
+            # Very large documents are converted page by page in constant memory
+            metadata = convert_streaming(doc, epub_path, upload, checkpoint, profile)
+            checkpoint.clear()
+            print("Epub created (streaming):", _output_summary(metadata["output"]))
+            return _publish(epub_path, cache, cache_key, metadata)
 
-        # Pass the doc object to parse_pdf
-        parsed_pdf = parse_pdf(doc)
+        # Pass the doc object to parse_pdf; it extracts every page once and
+        # keeps the page model on parsed_pdf for the structure analyzer
+        parsed_pdf = parse_pdf(doc, upload, checkpoint)
         print("# Pass the doc object to parse_pdf")
 
         # Analyze the structure
-        parsed_pdf = analyze_structure(parsed_pdf, doc)
+        parsed_pdf = analyze_structure(parsed_pdf, doc, profile)
         print("Analyze the structure")
 
         # Inspect the return value of analyze_structure
         print("Return value from analyze_structure:", parsed_pdf)
         print("Type of return value:", type(parsed_pdf))
 
-        # Generate the EPUB
-        epub_filename = os.path.splitext(os.path.basename(pdf_file.name))[0] + ".epub"
-        epub_path = os.path.join(temp_output_dir, epub_filename)
-
         # Inspect arguments to create_epub
         print("epub_filename:", epub_filename)
         print("epub_path:", epub_path)
 
-        create_epub(parsed_pdf, epub_path)
-        print("Epub created")
+        create_epub(parsed_pdf, epub_path, profile=profile)
+        checkpoint.clear()
+        print("Epub created:", _output_summary(parsed_pdf.metadata["output"]))
 
         # Get the absolute path:
-        absolute_epub_path = os.path.abspath(epub_path)
+        absolute_epub_path = _publish(epub_path, cache, cache_key, parsed_pdf.metadata)
         print("Absolute EPUB path:", absolute_epub_path)
 
         return absolute_epub_path
 
-    except Exception as e:
-        # Handle errors and provide feedback to the user
-        print(f"An error occurred during conversion: {e}")
-        gr.Error(f"An error occurred during conversion: {e}")
-        return None
-
     finally:
+        if doc is not None:
+            doc.close()
+
         # Clean up the temporary output directory if it exists
         if temp_output_dir:
             cleanup_temp_files(temp_output_dir)
-            print("Cleaned up temporary output directory")
\ No newline at end of file
+            print("Cleaned up temporary output directory")
+
+_job_queue: Optional[JobQueue] = None
+
+def get_job_queue() -> JobQueue:
+    """
+    Returns the process-wide job queue, which runs convert_file on JOB_WORKERS worker processes.
+    """
+    global _job_queue
+    if _job_queue is None:
+        _job_queue = JobQueue(convert_file, key=conversion_key)
+    return _job_queue
+
+def submit_conversion(pdf_file, profile: Optional[str] = None) -> str:
+    """
+    Queues the conversion of an uploaded PDF and returns the job ID at once.
+
+    Uploading the same file with the same options while it is still being
+    converted returns the job already converting it.
+
+    Args:
+        pdf_file: The uploaded file.
+        profile: Name of the output profile; OUTPUT_PROFILE when not chosen.
+    """
+    if pdf_file is None:
+        raise gr.Error("Please upload a PDF file.")
+    if not pdf_file.name.lower().endswith(".pdf"):
+        raise gr.Error("Invalid file type. Please upload a PDF file.")
+    try:
+        job = get_job_queue().submit(pdf_file.name, profile)
+    except ValueError as e:
+        raise gr.Error(str(e))
+    print("Queued job:", job.id)
+    return job.id
+
+def track_job(job_id: str) -> Iterator[Tuple[str, Optional[str]]]:
+    """
+    Streams the status of a job to the UI until it finishes, then its EPUB.
+
+    Closing the browser only stops the updates; the job keeps running and its
+    result can be fetched later with the same job ID.
+
+    Yields:
+        Tuples of a status message and the path of the EPUB, None until it is done.
+    """
+    jobs = get_job_queue()
+    job = jobs.get((job_id or "").strip())
+    if job is None:
+        yield "Unknown or expired job ID.", None
+        return
+    while job.status in ("queued", "running"):
+        yield _job_summary(job, jobs), None
+        time.sleep(JOB_POLL_INTERVAL)
+    yield _job_summary(job, jobs), job.result
+
+def _job_summary(job: Job, jobs: JobQueue) -> str:
+    """
+    Formats the status of a job for the UI.
+    """
+    now = time.time()
+    if job.status == "queued":
+        return f"Waiting for a worker, position {jobs.position(job)} in the queue"
+    if job.status == "running":
+        return f"Converting ({now - job.started:.0f} s)"
+    if job.status == "done":
+        return f"Done in {job.finished - job.started:.1f} s"
+    return f"An error occurred during conversion: {job.error}"
+
+def convert_streaming(doc: fitz.Document, epub_path: str, upload: Optional[UploadedPDF] = None,
+                      checkpoint: Optional[PageCheckpoint] = None, profile: Optional[str] = None) -> Dict:
+    """
+    Converts a document without holding its pages, text or chapters in memory.
+
+    Running heads and footers are found on a sample of the pages and dropped
+    from every page before it is counted or classified, and pages that pass
+    the table prefilter are searched for tables as they go by. Their images
+    are encoded in the background and added to the book after their chapter. Documents with an
+    outline take their chapters from it, and only the pages before its first
+    entry are analyzed by font. Otherwise font statistics come before any page
+    can be classified, so they are taken from a sample of the pages first (see
+    sample_font_stats); the pages are then read once more to parse, analyze
+    and write them.
+
+    Returns:
+        The document metadata, with the output report under "output".
+    """
+    metadata = extract_metadata(doc)
+    running_lines = RunningLineIndex.from_document_sample(doc, RUNNING_LINE_SAMPLE_PAGES)
+    pages = (running_lines.strip(page) for page in iter_parse_pdf(doc, metadata, upload, checkpoint))
+    pages = iter_with_tables(doc, pages, upload.path if upload is not None else None)
+    images = ImagePipeline(doc, profile=profile) if IMAGE_EXTRACTION else None
+    if images is not None:
+        pages = iter_with_figures(pages, images)
+    entries = outline_entries(doc)
+    metadata["structure_strategy"] = structure_strategy(entries)
+    if entries:
+        front_pages = (running_lines.strip(extract_page(doc[page_num])) for page_num in range(entries[0][2] - 1))
+        heading_fonts = identify_heading_fonts(get_font_stats(front_pages))
+        events = iter_outline_structure(pages, entries, heading_fonts)
+    else:
+        font_counts, metadata["font_stats"] = sample_font_stats(doc, page_filter=running_lines.strip)
+        heading_fonts = identify_heading_fonts(font_counts)
+        events = iter_structure(pages, heading_fonts)
+    create_epub_from_events(events, metadata, epub_path, images=images, profile=profile)
+    return metadata
+
+def _publish(epub_path: str, cache: Optional[ConversionCache], cache_key: str, metadata: Dict) -> str:
+    """
+    Moves a finished EPUB into the conversion cache, out of the temporary
+    output directory, and returns the absolute path it is served from.
+
+    Books with pages whose OCR failed are not cached, so the next upload of
+    the PDF tries those pages again.
+    """
+    if cache is not None and not metadata.get("ocr_failed_pages"):
+        epub_path = cache.put(cache_key, epub_path)
+    return os.path.abspath(epub_path)
+
+def _output_summary(output: Dict) -> str:
+    """
+    Formats the output report of a conversion for the log.
+    """
+    return f"{output['bytes']} bytes in {output['seconds']:.2f} s ({output['profile']} profile)"
@@ -0,0 +1,73 @@
+# benchmarks/chapter_renderer.py
+"""
+Scaling benchmark for app.core.epub_generator.render_chapter.
+
+Renders one chapter with a growing number of sections and reports the time per
+content entry, which stays flat when rendering is linear. --legacy also times
+the text-equality heading lookup the renderer replaced. Run from the
+repository root:
+
+    python -m benchmarks.chapter_renderer [--sections 500 1000 2000 4000] [--legacy]
+"""
+import argparse
+import time
+from app.core.epub_generator import render_chapter
+from app.models import Chapter, Heading, Paragraph, TextRun
+
+def build_chapter(sections: int, paragraphs: int, markers: bool = True) -> Chapter:
+    content = []
+    headings = []
+    for i in range(sections):
+        heading = Heading(f"Section {i + 1}", 1 + i % 3)
+        headings.append(heading)
+        content.append(heading if markers else heading.text)
+        for j in range(paragraphs):
+            content.append(Paragraph([
+                TextRun(f"Paragraph {j + 1} of section {i + 1} explains "),
+                TextRun("one detail", bold=True),
+                TextRun(" of the procedure & its <limits>."),
+            ], 1))
+    return Chapter(title="Manual", content=content, headings=headings, page_number=1)
+
+def render_legacy(chapter: Chapter) -> str:
+    """
+    The renderer as it was: a heading list rebuilt and searched for every entry,
+    and the markup grown with +=.
+    """
+    html = f"<h1>{chapter.title}</h1>"
+    for part in chapter.content:
+        if part in [h.text for h in chapter.headings]:
+            html += f"<h2>{part}</h2>"
+        else:
+            html += f"<p>{part}</p>"
+    return html
+
+def best_time(function, chapter: Chapter, repeat: int) -> float:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(chapter)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sections", type=int, nargs="+", default=[500, 1000, 2000, 4000, 8000], help="Sections per chapter")
+    parser.add_argument("--paragraphs", type=int, default=3, help="Paragraphs per section")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs; the best one is reported")
+    parser.add_argument("--legacy", action="store_true", help="Also time the text-equality renderer")
+    args = parser.parse_args()
+
+    for sections in args.sections:
+        chapter = build_chapter(sections, args.paragraphs)
+        entries = len(chapter.content)
+        elapsed = best_time(render_chapter, chapter, args.repeat)
+        line = f"{sections:>6} sections, {entries:>6} entries: {elapsed * 1e3:8.1f} ms, {elapsed / entries * 1e6:5.2f} us/entry"
+        if args.legacy:
+            legacy = best_time(render_legacy, build_chapter(sections, args.paragraphs, markers=False), 1)
+            line += f" | legacy {legacy * 1e3:9.1f} ms, {legacy / entries * 1e6:7.2f} us/entry"
+        print(line)
+
+if __name__ == "__main__":
+    main()
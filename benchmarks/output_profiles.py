@@ -0,0 +1,38 @@
+# benchmarks/output_profiles.py
+"""
+Compares the output profiles on a PDF: converts it once per profile and
+reports the size of each EPUB and the time spent writing it. Run from the
+repository root:
+
+    python -m benchmarks.output_profiles book.pdf [--profiles fast balanced small]
+"""
+import argparse
+import os
+import tempfile
+import time
+from app.core.pdf_parser import parse_pdf
+from app.core.page_extractor import open_pdf
+from app.core.structure_analyzer import analyze_structure
+from app.core.epub_generator import create_epub
+from app.core.output_profiles import OUTPUT_PROFILES
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pdf", help="PDF file to convert")
+    parser.add_argument("--profiles", nargs="+", default=list(OUTPUT_PROFILES), choices=list(OUTPUT_PROFILES))
+    args = parser.parse_args()
+
+    doc, _ = open_pdf(args.pdf)
+    with tempfile.TemporaryDirectory() as output_dir:
+        for profile in args.profiles:
+            start = time.perf_counter()
+            parsed_pdf = analyze_structure(parse_pdf(doc), doc, profile)
+            analyzed = time.perf_counter() - start
+            create_epub(parsed_pdf, os.path.join(output_dir, f"{profile}.epub"), profile=profile)
+            output = parsed_pdf.metadata["output"]
+            print(f"{profile:>9}: {output['bytes'] / 1e6:8.2f} MB, written in {output['seconds']:6.2f} s "
+                  f"(analysis {analyzed:6.2f} s)")
+    doc.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+# benchmarks/text_normalizer.py
+"""
+Throughput benchmark for app.core.text_normalizer.
+
+Normalizes a synthetic corpus block by block, the way pages are normalized
+during extraction, and reports MB/s of UTF-8 input. Run from the repository root:
+
+    python -m benchmarks.text_normalizer [--mb 16] [--block 2048]
+"""
+import argparse
+import random
+import time
+from app.core.text_normalizer import normalize_text
+
+# Extracted text is mostly clean; one sentence in ten carries an artifact the
+# normalizer fixes
+CLEAN_SAMPLES = [
+    "The first results were measured over several runs and averaged. ",
+    "Plain ASCII text makes up most of a typical book, so the fast path matters. ",
+    "Each chapter opens with a short summary of the material that follows. ",
+    "Figures and tables are numbered consecutively within each chapter. ",
+]
+ARTIFACT_SAMPLES = [
+    "The e\ufb03ciency of the \ufb01rst \ufb02ow was measured. ",
+    "Words are hy\u00adphen\u00adated in places and split across line-\nends. ",
+    "Spaces vary:\u2009thin,\u00a0no-break and  doubled   ones. ",
+    "Accents may be decomposed: cafe\u0301, nai\u0308ve. ",
+]
+
+def build_blocks(total_bytes: int, block_chars: int, seed: int = 0):
+    rng = random.Random(seed)
+    blocks, size = [], 0
+    while size < total_bytes:
+        block = []
+        length = 0
+        while length < block_chars:
+            sample = rng.choice(ARTIFACT_SAMPLES if rng.random() < 0.1 else CLEAN_SAMPLES)
+            block.append(sample)
+            length += len(sample)
+        text = "".join(block)
+        blocks.append(text)
+        size += len(text.encode("utf-8"))
+    return blocks, size
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mb", type=float, default=16, help="Corpus size in MB")
+    parser.add_argument("--block", type=int, default=2048, help="Characters per block")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs; the best one is reported")
+    args = parser.parse_args()
+
+    blocks, size = build_blocks(int(args.mb * 1024 * 1024), args.block)
+    best = None
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        for block in blocks:
+            normalize_text(block)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    print(f"{size / 1e6:.1f} MB in {len(blocks)} blocks of ~{args.block} chars: "
+          f"{best:.3f} s, {size / 1e6 / best:.1f} MB/s")
+
+if __name__ == "__main__":
+    main()
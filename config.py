@@ -10,5 +10,192 @@ UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "upload
 # Output folder for storing generated EPUB files
 OUTPUT_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "outputs")
 
+# Version of the conversion pipeline. Bump it whenever a change alters the
+# output, so checkpoints and cached results from older versions are discarded.
+PIPELINE_VERSION = "5"
+
+# Directory holding per-page checkpoints of running conversions, one directory
+# per conversion cache key, so each profile of a file resumes on its own
+CHECKPOINT_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "jobs")
+
+# Number of bytes read and hashed at a time when reading an upload
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# CPU budget. Up to JOB_WORKERS conversions run at once, each in a job worker
+# process of its own (see the job queue settings below), and every conversion
+# starts its own pools for extraction and analysis, OCR and images. Each of
+# those pools gets an equal share of the cores, JOB_CPU_SHARE processes, so
+# the running conversions together keep about CPU_COUNT processes busy in any
+# one stage instead of JOB_WORKERS times that.
+CPU_COUNT = os.cpu_count() or 1
+JOB_WORKERS = min(2, CPU_COUNT)
+JOB_CPU_SHARE = max(1, CPU_COUNT // JOB_WORKERS)
+
+# Number of worker processes used for page extraction and structure analysis (1 = serial)
+ANALYSIS_WORKERS = JOB_CPU_SHARE
+
+# Documents with fewer pages than this are always extracted serially
+PARALLEL_MIN_PAGES = 200
+
+# Number of worker processes used for OCR (1 = run in-process)
+OCR_WORKERS = JOB_CPU_SHARE
+
+# Maximum number of pages queued for OCR at once; bounds memory held by pending images
+OCR_MAX_PENDING = 2 * OCR_WORKERS
+
+# Seconds allowed to OCR a single page before it is given up
+OCR_PAGE_TIMEOUT = 120
+
+# Keep the text of the pages that succeeded when some pages fail or time out
+OCR_ALLOW_PARTIAL = True
+
+# OCR triage: a page's text layer is used instead of OCR when it has at least
+# this many characters and no more than this share of undecodable glyphs
+OCR_MIN_TEXT_CHARS = 50
+OCR_MAX_GARBAGE_RATIO = 0.1
+
+# OCR triage: pages without a usable text layer are only OCR'd when images
+# cover at least this share of the page
+OCR_MIN_IMAGE_COVERAGE = 0.2
+
+# Documents with at least this many pages are converted with the streaming
+# pipeline, whose memory use does not grow with the page count
+STREAMING_MIN_PAGES = 1000
+
+# The streaming pipeline extracts pages on the ANALYSIS_WORKERS processes in
+# runs of this many pages, with at most two runs per worker submitted ahead
+STREAM_RANGE_PAGES = 32
+
+# Documents with at least this many pages get their font statistics from a
+# stratified sample of pages instead of a full pass. Pages are sampled in rounds
+# of FONT_SAMPLE_BATCH (one per stratum) until the heading fonts are stable and
+# the estimated error of the font frequencies is below FONT_SAMPLE_MAX_ERROR.
+# An ambiguous sample falls back to a full scan once FONT_SAMPLE_MAX_FRACTION
+# of the pages have been sampled.
+FONT_SAMPLE_MIN_PAGES = 500
+FONT_SAMPLE_BATCH = 25
+FONT_SAMPLE_MAX_FRACTION = 0.25
+FONT_SAMPLE_MAX_ERROR = 0.01
+
+# Running heads, footers and page numbers: a line in the top or bottom
+# RUNNING_LINE_MARGIN of the page (as a fraction of its height) whose text,
+# digits aside, recurs in the same RUNNING_LINE_BAND of height on at least
+# RUNNING_LINE_MIN_SHARE of the pages, and on RUNNING_LINE_MIN_PAGES pages or
+# more, is dropped before classification. Streaming conversions build the
+# index from RUNNING_LINE_SAMPLE_PAGES pages spread over the document.
+RUNNING_LINE_MARGIN = 0.12
+RUNNING_LINE_BAND = 0.02
+RUNNING_LINE_MIN_SHARE = 0.3
+RUNNING_LINE_MIN_PAGES = 3
+RUNNING_LINE_SAMPLE_PAGES = 200
+
+# Put the text blocks of each page into reading order with an XY-cut, so
+# multi-column pages are read column by column. Columns are separated by
+# vertical gaps of at least READING_ORDER_MIN_GAP points.
+READING_ORDER = True
+READING_ORDER_MIN_GAP = 4.0
+
+# Table detection. A page is a table candidate when at least TABLE_MIN_ROWS
+# rows of short text fragments start at TABLE_MIN_COLUMNS or more shared x
+# positions; only candidates go through PyMuPDF's table finder, in parallel
+# once there are TABLE_PARALLEL_MIN_PAGES candidates or more. The streaming
+# pipeline searches candidates on ANALYSIS_WORKERS processes while pages move
+# on, holding back at most TABLE_STREAM_WINDOW pages.
+TABLE_DETECTION = True
+TABLE_MIN_ROWS = 3
+TABLE_MIN_COLUMNS = 2
+TABLE_PARALLEL_MIN_PAGES = 8
+TABLE_STREAM_WINDOW = 64
+
+# Images: the images placed on text pages go into the book at their position in
+# the text. Pages that were OCR'd are represented by their text only. Images
+# placed smaller than IMAGE_MIN_SIZE points either way (rules, bullets,
+# ornaments) are left out, as are images covering at least IMAGE_SCAN_COVERAGE
+# of a page whose text layer is used: the scan under a searchable PDF.
+IMAGE_EXTRACTION = True
+IMAGE_MIN_SIZE = 24
+IMAGE_SCAN_COVERAGE = 0.9
+
+# Images larger than this many pixels are downscaled to fit, the screen of a
+# typical e-reader; photos are re-encoded as JPEG at IMAGE_JPEG_QUALITY
+IMAGE_MAX_WIDTH = 1264
+IMAGE_MAX_HEIGHT = 1680
+IMAGE_JPEG_QUALITY = 80
+
+# Number of worker processes re-encoding images (1 = run in-process), and the
+# maximum number of images submitted but not yet written to the book
+IMAGE_WORKERS = JOB_CPU_SHARE
+IMAGE_MAX_PENDING = 2 * IMAGE_WORKERS
+
+# Paragraph reconstruction: within a block, a line starts a new paragraph when
+# the gap above it exceeds PARAGRAPH_LINE_GAP times the previous line's height,
+# when it is indented by more than PARAGRAPH_INDENT ems, or when the previous
+# line ends a sentence more than PARAGRAPH_SHORT_LINE ems short of the right edge.
+PARAGRAPH_LINE_GAP = 0.5
+PARAGRAPH_INDENT = 0.8
+PARAGRAPH_SHORT_LINE = 2.0
+
+# Build chapters and headings from the PDF outline (bookmarks) when the
+# document has one with at least OUTLINE_MIN_ENTRIES usable entries. Font
+# analysis then only runs on the pages before the first outline entry.
+STRUCTURE_USE_OUTLINE = True
+OUTLINE_MIN_ENTRIES = 2
+
+# EPUB writer backend: "streaming" writes chapters straight into the zip as
+# they are rendered, "ebooklib" builds the whole book in memory first
+EPUB_BACKEND = "streaming"
+
+# Output profile used when a job does not choose one: "fast" (quickest to
+# write), "balanced" or "small" (smallest file). See app/core/output_profiles.py.
+OUTPUT_PROFILE = "balanced"
+
+# Size budget of one XHTML file in the EPUB, in bytes. Longer chapters are
+# split between paragraphs into several spine items, as e-readers are slow to
+# open large files. 0 disables splitting.
+EPUB_MAX_CHAPTER_BYTES = 256 * 1024
+
+# Tesseract language and extra command-line configuration
+OCR_LANG = "eng"
+OCR_CONFIG = ""
+
+# OCR backend: "tesserocr" keeps Tesseract loaded in each worker, "pytesseract"
+# starts the tesseract executable per image, "auto" prefers tesserocr if installed
+OCR_ENGINE = "auto"
+
+# Images are resampled down to this effective resolution (at their size on the
+# page) before OCR; higher values are slower and use more memory
+OCR_TARGET_DPI = 300
+
+# Convert images to black and white before OCR (grayscale otherwise)
+OCR_BINARIZE = False
+
+# Whole-conversion cache: finished EPUBs keyed by the content hash of the PDF,
+# the pipeline version and the conversion options, so a repeated upload is
+# served without converting it again. Entries unused for longer than
+# CONVERSION_CACHE_MAX_AGE seconds are evicted, then the least recently used
+# ones while the cache is over CONVERSION_CACHE_MAX_BYTES. Set
+# CONVERSION_CACHE_FOLDER to None to disable the cache.
+CONVERSION_CACHE_FOLDER = os.path.join(OUTPUT_FOLDER, "cache")
+CONVERSION_CACHE_MAX_BYTES = 2 * 1024 * 1024 * 1024
+CONVERSION_CACHE_MAX_AGE = 30 * 24 * 60 * 60
+
+# Persistent OCR result cache (set OCR_CACHE_PATH to None to disable it)
+OCR_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "ocr_cache.sqlite3")
+OCR_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# Background conversion jobs: the maximum number of jobs waiting for one of
+# the JOB_WORKERS job worker processes (see the CPU budget above). Uploads
+# beyond that are refused until the queue drains.
+JOB_QUEUE_DEPTH = 32
+
+# Directory holding the uploads of jobs until they are converted
+JOB_FOLDER = os.path.join(UPLOAD_FOLDER, "jobs")
+
+# Seconds between the status updates sent to the browser while a job runs
+JOB_POLL_INTERVAL = 1.0
+
+# Seconds the status and result of a finished job are kept
+JOB_RETENTION = 24 * 60 * 60
+
 # Database settings (if using SQLite in the future)
 DATABASE_URL = "sqlite:///./pdf_converter.db"
\ No newline at end of file
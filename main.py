@@ -1,22 +1,37 @@
 # main.py
 import os
 import gradio as gr
-from app.routes import convert_pdf_to_epub
-from config import UPLOAD_FOLDER, OUTPUT_FOLDER
+from app.routes import submit_conversion, track_job
+from app.core.output_profiles import OUTPUT_PROFILES
+from config import UPLOAD_FOLDER, OUTPUT_FOLDER, OUTPUT_PROFILE
 
 # Create upload and output directories if they don't exist
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(OUTPUT_FOLDER, exist_ok=True)
 
-# Define the Gradio interface
-iface = gr.Interface(
-    fn=convert_pdf_to_epub,
-    inputs=gr.File(label="Upload PDF"),
-    outputs=gr.File(label="Download EPUB"),
-    title="PDF to EPUB Converter",
-    description="Convert your PDF files to EPUB format with automatic structure recognition.",
-    allow_flagging="never",  # Disables the flagging feature
-)
+# Define the Gradio interface. Converting only queues a job and returns its ID;
+# the job runs on the job queue's worker processes while its status is
+# streamed back, and can be checked again later with the same ID.
+with gr.Blocks(title="PDF to EPUB Converter") as iface:
+    gr.Markdown("# PDF to EPUB Converter\nConvert your PDF files to EPUB format with automatic structure recognition.")
+    with gr.Row():
+        with gr.Column():
+            pdf_file = gr.File(label="Upload PDF")
+            profile = gr.Dropdown(choices=list(OUTPUT_PROFILES), value=OUTPUT_PROFILE, label="Output profile",
+                                  info="fast: quickest to write, small: smallest file")
+            convert_button = gr.Button("Convert", variant="primary")
+        with gr.Column():
+            job_id = gr.Textbox(label="Job ID", info="Keep it to check on the conversion later")
+            status = gr.Textbox(label="Status", interactive=False)
+            epub_file = gr.File(label="Download EPUB")
+            check_button = gr.Button("Check status")
 
-# Launch the app
-iface.launch()
\ No newline at end of file
+    # Status updates only wait on the job, so they are not limited by the handler concurrency
+    convert_button.click(submit_conversion, inputs=[pdf_file, profile], outputs=job_id).success(
+        track_job, inputs=job_id, outputs=[status, epub_file], concurrency_limit=None)
+    check_button.click(track_job, inputs=job_id, outputs=[status, epub_file], concurrency_limit=None)
+
+# Launch the app. Job workers are spawned and import this module again, so
+# only the process started as the script serves the UI.
+if __name__ == "__main__":
+    iface.queue().launch()
@@ -0,0 +1,104 @@
+import unittest
+import json
+import os
+import shutil
+import fitz
+from unittest import mock
+from concurrent.futures import ProcessPoolExecutor
+from app.core import checkpoint as checkpoint_module
+from app.core.checkpoint import PageCheckpoint
+from app.core.page_extractor import extract_page, page_text
+from app.core.pdf_parser import parse_pdf, iter_parse_pdf
+from app.models import Page
+
+class TestCheckpoint(unittest.TestCase):
+    def setUp(self):
+        # Create a sample PDF for testing
+        self.test_pdf_path = "tests/sample_checkpoint.pdf"
+        self.job_dir = "tests/checkpoint_job"
+        doc = fitz.open()
+        for i in range(4):
+            page = doc.new_page()
+            page.insert_text((50, 100), f"Page {i + 1} content", fontsize=12)
+        doc.save(self.test_pdf_path)
+        doc.close()
+
+    def tearDown(self):
+        os.remove(self.test_pdf_path)
+        if os.path.exists(self.job_dir):
+            shutil.rmtree(self.job_dir)
+
+    def test_page_round_trip(self):
+        doc = fitz.open(self.test_pdf_path)
+        page = extract_page(doc[0])
+        doc.close()
+        page.ocr_text = "ocr"
+        restored = Page.from_dict(json.loads(json.dumps(page.to_dict())))
+        self.assertEqual(restored.number, 1)
+        self.assertEqual(page_text(restored), page_text(page))
+        self.assertEqual(restored.spans[0].bbox, page.spans[0].bbox)
+        self.assertEqual(restored.ocr_text, "ocr")
+
+    def test_resume_from_first_missing_page(self):
+        parsed_pdf = parse_pdf(self.test_pdf_path, checkpoint=PageCheckpoint(self.job_dir, "abc"))
+        checkpoint = PageCheckpoint(self.job_dir, "abc")
+        self.assertEqual(checkpoint.completed_pages(), {1, 2, 3, 4})
+
+        # Drop the last two pages, as if the job had died after page 2
+        os.remove(checkpoint._page_path(3))
+        os.remove(checkpoint._page_path(4))
+        self.assertEqual(checkpoint.completed_pages(), {1, 2})
+        page, decision = checkpoint.load_page(1)
+        page.spans[0].text = "Restored"
+        checkpoint.save_page(page, decision)
+
+        metadata = {}
+        pages = list(iter_parse_pdf(self.test_pdf_path, metadata, checkpoint=checkpoint))
+        self.assertEqual([page.number for page in pages], [1, 2, 3, 4])
+        self.assertEqual(pages[0].spans[0].text, "Restored")  # Loaded, not extracted again
+        self.assertEqual(page_text(pages[3]), page_text(parsed_pdf.pages[3]))
+        self.assertEqual(len(metadata["ocr_pages"]), 4)
+        self.assertEqual(checkpoint.completed_pages(), {1, 2, 3, 4})
+
+    def test_resume_fills_gaps_with_parallel_extraction(self):
+        parsed_pdf = parse_pdf(self.test_pdf_path)
+        checkpoint = PageCheckpoint(self.job_dir, "abc")
+        page, decision = parsed_pdf.pages[1], parsed_pdf.metadata["ocr_pages"][1]
+        page.spans[0].text = "Restored"
+        checkpoint.save_page(page, decision)
+
+        with mock.patch("app.core.page_extractor.PARALLEL_MIN_PAGES", 1), \
+                mock.patch("app.core.page_extractor.ANALYSIS_WORKERS", 2), \
+                mock.patch("app.core.page_extractor.ProcessPoolExecutor", wraps=ProcessPoolExecutor) as executor:
+            resumed = parse_pdf(self.test_pdf_path, checkpoint=checkpoint)
+        executor.assert_called_once_with(max_workers=2)  # The missing pages are still extracted in parallel
+        self.assertEqual([page.number for page in resumed.pages], [1, 2, 3, 4])
+        self.assertEqual(resumed.pages[1].spans[0].text, "Restored")
+        self.assertEqual([page_text(page) for page in resumed.pages[2:]], [page_text(page) for page in parsed_pdf.pages[2:]])
+        self.assertEqual([decision["page"] for decision in resumed.metadata["ocr_pages"]], [1, 2, 3, 4])
+        self.assertIsNone(resumed.font_counts)  # Worker counts would miss the restored page
+        self.assertEqual(checkpoint.completed_pages(), {1, 2, 3, 4})
+
+    def test_failed_pages_are_not_checkpointed(self):
+        def ocr_pages(doc, pages, needs_ocr=None, cache=True, stats=None, path=None):
+            for page in pages:
+                yield page, page.number == 3
+
+        checkpoint = PageCheckpoint(self.job_dir, "abc")
+        with mock.patch("app.core.pdf_parser.iter_ocr_pages", side_effect=ocr_pages):
+            parsed_pdf = parse_pdf(self.test_pdf_path, checkpoint=checkpoint)
+        self.assertEqual(parsed_pdf.metadata["ocr_failed_pages"], [3])
+        self.assertEqual(checkpoint.completed_pages(), {1, 2, 4})
+
+    def test_pipeline_upgrade_invalidates_checkpoint(self):
+        parse_pdf(self.test_pdf_path, checkpoint=PageCheckpoint(self.job_dir, "abc"))
+        self.assertEqual(len(PageCheckpoint(self.job_dir, "abc").completed_pages()), 4)
+        with mock.patch.object(checkpoint_module, "PIPELINE_VERSION", "upgraded"):
+            self.assertEqual(PageCheckpoint(self.job_dir, "abc").completed_pages(), set())
+
+    def test_other_file_invalidates_checkpoint(self):
+        parse_pdf(self.test_pdf_path, checkpoint=PageCheckpoint(self.job_dir, "abc"))
+        self.assertEqual(PageCheckpoint(self.job_dir, "def").completed_pages(), set())
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+# tests/test_conversion_cache.py
+import unittest
+import io
+import os
+import shutil
+import time
+import fitz
+from unittest import mock
+from PIL import Image
+from app.core.conversion_cache import ConversionCache, conversion_key
+from app.core.pdf_parser import parse_pdf
+from app.core.structure_analyzer import analyze_structure
+from app.core.epub_generator import create_epub
+from app.core.image_pipeline import shutdown_image_pool
+
+class TestConversionCache(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = "tests/test_conversion_cache"
+        os.makedirs(self.test_dir, exist_ok=True)
+        self.cache = ConversionCache(os.path.join(self.test_dir, "cache"), max_bytes=10, max_age=60)
+
+    def tearDown(self):
+        shutdown_image_pool()
+        shutil.rmtree(self.test_dir)
+
+    def make_epub(self, name, data=b"epub"):
+        path = os.path.join(self.test_dir, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def test_conversion_key(self):
+        self.assertEqual(conversion_key("abc"), conversion_key("abc", "balanced"))
+        self.assertNotEqual(conversion_key("abc"), conversion_key("abc", "small"))
+        self.assertNotEqual(conversion_key("abc"), conversion_key("abd"))
+        self.assertTrue(conversion_key("abc").startswith("abc-"))
+        key = conversion_key("abc")
+        for setting, value in (("IMAGE_JPEG_QUALITY", 10), ("OCR_ALLOW_PARTIAL", False), ("OCR_PAGE_TIMEOUT", 1)):
+            with self.subTest(setting=setting), mock.patch(f"app.core.conversion_cache.{setting}", value):
+                self.assertNotEqual(conversion_key("abc"), key)
+
+    def test_get_put_and_counters(self):
+        self.assertIsNone(self.cache.get("a"))
+        path = self.cache.put("a", self.make_epub("book.epub"))
+        self.assertEqual(os.path.basename(path), "book.epub")
+        self.assertFalse(os.path.exists(os.path.join(self.test_dir, "book.epub")))  # Moved, not copied
+        self.assertEqual(self.cache.get("a"), path)
+        self.assertEqual(self.cache.stats(), {"hits": 1, "misses": 1, "entries": 1, "bytes": 4})
+
+    def test_put_keeps_existing_entry(self):
+        first = self.cache.put("a", self.make_epub("first.epub"))
+        self.assertEqual(self.cache.put("a", self.make_epub("second.epub")), first)
+        self.assertEqual(self.cache.stats()["entries"], 1)
+
+    def test_age_eviction(self):
+        path = self.cache.put("a", self.make_epub("book.epub"))
+        old = time.time() - 120
+        os.utime(os.path.dirname(path), (old, old))
+        self.assertIsNone(self.cache.get("a"))
+        self.assertEqual(self.cache.stats()["entries"], 0)
+
+    def test_lru_eviction(self):
+        self.cache.put("a", self.make_epub("a.epub"))
+        self.cache.put("b", self.make_epub("b.epub"))
+        for key, age in (("a", 20), ("b", 30)):
+            entry_dir = os.path.join(self.cache.directory, key)
+            os.utime(entry_dir, (time.time() - age,) * 2)
+        self.cache.get("a")  # "b" is now the least recently used entry
+        self.cache.put("c", self.make_epub("c.epub"))
+        self.assertIsNone(self.cache.get("b"))
+        self.assertIsNotNone(self.cache.get("a"))
+        self.assertIsNotNone(self.cache.get("c"))
+
+    def test_epub_is_deterministic(self):
+        pdf_path = os.path.join(self.test_dir, "sample.pdf")
+        output = io.BytesIO()
+        Image.new("RGB", (300, 200), (30, 30, 200)).save(output, "PNG")
+        doc = fitz.open()
+        for i in range(2):
+            page = doc.new_page()
+            page.insert_text((50, 60), f"Text on page {i + 1}.", fontsize=12)
+            page.insert_image(fitz.Rect(50, 100, 350, 300), stream=output.getvalue())
+        doc.save(pdf_path)
+        doc.close()
+
+        epubs = []
+        for name in ("first.epub", "second.epub"):
+            doc = fitz.open(pdf_path)
+            try:
+                epub_path = os.path.join(self.test_dir, name)
+                create_epub(analyze_structure(parse_pdf(doc), doc), epub_path)
+            finally:
+                doc.close()
+            with open(epub_path, "rb") as f:
+                epubs.append(f.read())
+        self.assertEqual(epubs[0], epubs[1])
+
+if __name__ == '__main__':
+    unittest.main()
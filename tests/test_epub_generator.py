@@ -3,8 +3,8 @@ import unittest
 import os
 import ebooklib
 from ebooklib import epub
-from app.core.epub_generator import create_epub
-from app.models import ParsedPDF, Chapter, Heading
+from app.core.epub_generator import create_epub, create_epub_from_events, render_chapter
+from app.models import ParsedPDF, Chapter, Heading, Paragraph, TextRun
 
 class TestEPUBGenerator(unittest.TestCase):
     def setUp(self):
@@ -42,5 +42,51 @@ class TestEPUBGenerator(unittest.TestCase):
         self.assertEqual(chapters[0].get_name(), 'chapter_1.xhtml')
         self.assertEqual(chapters[1].get_name(), 'chapter_2.xhtml')
 
+    def test_create_epub_from_events(self):
+        events = [
+            ("chapter_start", "Chapter 1", 1),
+            ("text", "This is the content of chapter 1."),
+            ("chapter_end",),
+            ("chapter_start", "Chapter 2", 2),
+            ("heading", "This is Heading 1", 1),
+            ("text", "This is under heading 1"),
+            ("chapter_end",),
+        ]
+        create_epub_from_events(iter(events), self.parsed_pdf.metadata, self.test_epub_path)
+
+        book = epub.read_epub(self.test_epub_path)
+        chapters = [item for item in book.get_items_of_type(ebooklib.ITEM_DOCUMENT) if item.get_name() != 'nav.xhtml']
+        self.assertEqual([c.get_name() for c in chapters], ['chapter_1.xhtml', 'chapter_2.xhtml'])
+        content = chapters[1].get_content().decode("utf-8")
+        self.assertIn("<h2>This is Heading 1</h2>", content)
+        self.assertIn("<p>This is under heading 1</p>", content)
+
+    def test_paragraph_runs_keep_inline_styles(self):
+        paragraph = Paragraph([TextRun("Plain "), TextRun("bold", bold=True), TextRun(" and "), TextRun("italic", italic=True)], 1)
+        events = [("chapter_start", "Chapter 1", 1), ("text", paragraph), ("chapter_end",)]
+        create_epub_from_events(iter(events), self.parsed_pdf.metadata, self.test_epub_path)
+
+        book = epub.read_epub(self.test_epub_path)
+        content = book.get_item_with_href("chapter_1.xhtml").get_content().decode("utf-8")
+        self.assertIn("<p>Plain <b>bold</b> and <i>italic</i></p>", content)
+
+    def test_render_chapter_heading_markers(self):
+        chapter = Chapter(
+            title="Q&A",
+            content=["Intro <1>", Heading("Part", 1), "Body", Heading("Detail", 3), Heading("Deep", 7), "Tail"],
+            headings=[],
+            page_number=1,
+        )
+        self.assertEqual(
+            render_chapter(chapter),
+            "<h1>Q&amp;A</h1><p>Intro &lt;1&gt;</p><h2>Part</h2><p>Body</p>"
+            "<h4>Detail</h4><h6>Deep</h6><p>Tail</p>",
+        )
+
+    def test_render_chapter_heading_texts(self):
+        # Chapters without markers still name their headings by text
+        html = render_chapter(self.parsed_pdf.chapters[1])
+        self.assertIn("<h2>This is Heading 1</h2><p>This is under heading 1</p>", html)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,166 @@
+# tests/test_epub_writer.py
+import unittest
+import os
+import re
+import zipfile
+import ebooklib
+from ebooklib import epub
+from unittest import mock
+from app.core.epub_writer import open_epub_writer
+from app.models import BookImage
+
+class TestEpubWriter(unittest.TestCase):
+    def setUp(self):
+        self.test_epub_path = "tests/sample_writer.epub"
+        self.metadata = {"title": "Tom & Jerry", "author": "Test Author", "id": "1234567890"}
+
+    def tearDown(self):
+        if os.path.exists(self.test_epub_path):
+            os.remove(self.test_epub_path)
+
+    def write_book(self, backend):
+        writer = open_epub_writer(self.metadata, self.test_epub_path, backend)
+        writer.start_chapter("Chapter 1")
+        writer.write("<h1>Chapter 1</h1>")
+        writer.write("<p>First &amp; only paragraph.</p>")
+        writer.end_chapter()
+        writer.add_chapter("Chapter <2>", "<p>Second chapter.</p>")
+        writer.close()
+
+    def test_streaming_layout(self):
+        self.write_book("streaming")
+        with zipfile.ZipFile(self.test_epub_path) as archive:
+            entries = archive.infolist()
+            self.assertEqual(entries[0].filename, "mimetype")
+            self.assertEqual(entries[0].compress_type, zipfile.ZIP_STORED)
+            self.assertEqual(archive.read("mimetype"), b"application/epub+zip")
+            names = [entry.filename for entry in entries]
+            # Chapters are written before the package document
+            self.assertLess(names.index("EPUB/chapter_2.xhtml"), names.index("EPUB/content.opf"))
+            self.assertTrue(all(entry.date_time == (1980, 1, 1, 0, 0, 0) for entry in entries))
+
+    def test_streaming_book_is_readable(self):
+        self.write_book("streaming")
+        book = epub.read_epub(self.test_epub_path)
+        self.assertEqual(book.get_metadata('DC', 'title')[0][0], "Tom & Jerry")
+        self.assertEqual(book.get_metadata('DC', 'creator')[0][0], "Test Author")
+        chapters = [item for item in book.get_items_of_type(ebooklib.ITEM_DOCUMENT) if item.get_name() != 'nav.xhtml']
+        self.assertEqual([c.get_name() for c in chapters], ['chapter_1.xhtml', 'chapter_2.xhtml'])
+        self.assertIn("First &amp; only paragraph.", chapters[0].get_content().decode("utf-8"))
+        self.assertEqual([(link.title, link.href) for link in book.toc],
+                         [("Chapter 1", "chapter_1.xhtml"), ("Chapter <2>", "chapter_2.xhtml")])
+
+    def test_ebooklib_backend(self):
+        self.write_book("ebooklib")
+        book = epub.read_epub(self.test_epub_path)
+        chapters = [item for item in book.get_items_of_type(ebooklib.ITEM_DOCUMENT) if item.get_name() != 'nav.xhtml']
+        self.assertEqual([c.get_name() for c in chapters], ['chapter_1.xhtml', 'chapter_2.xhtml'])
+
+    def write_long_chapter(self, backend):
+        writer = open_epub_writer(self.metadata, self.test_epub_path, backend, max_chapter_bytes=1000)
+        writer.start_chapter("Short")
+        writer.write("<p>Short chapter.</p>")
+        writer.end_chapter()
+        writer.start_chapter("Long")
+        for i in range(30):
+            if i == 12:
+                writer.write("<h2>Section</h2>", heading=True)
+            writer.write(f"<p>Paragraph {i:02d} of the long chapter, padded to some length.</p>")
+        writer.end_chapter()
+        writer.close()
+
+    def test_long_chapter_is_split(self):
+        for backend in ("streaming", "ebooklib"):
+            with self.subTest(backend=backend):
+                self.write_long_chapter(backend)
+                book = epub.read_epub(self.test_epub_path)
+                spine = [book.get_item_with_id(item_id).get_name() for item_id, _ in book.spine if item_id != "nav"]
+                self.assertEqual(spine[:3], ["chapter_1.xhtml", "chapter_2.xhtml", "chapter_2_2.xhtml"])
+                self.assertGreater(len(spine), 3)
+                # The TOC links the first part of each chapter
+                self.assertEqual([(link.title, link.href) for link in book.toc],
+                                 [("Short", "chapter_1.xhtml"), ("Long", "chapter_2.xhtml")])
+
+                bodies = [book.get_item_with_href(name).get_content().decode("utf-8") for name in spine[1:]]
+                paragraphs = [re.findall(r"Paragraph (\d+)", body) for body in bodies]
+                self.assertEqual([p for part in paragraphs for p in part], [f"{i:02d}" for i in range(30)])
+                # The heading opens a part of its own, once the part before it is half full
+                self.assertTrue(any(re.search(r"<body>\s*<h2>Section</h2>", body) for body in bodies))
+                for body in bodies:
+                    body_markup = re.search(r"<body>(.*)</body>", body, re.S).group(1)
+                    self.assertLessEqual(len(re.sub(r">\s+<", "><", body_markup).strip().encode("utf-8")), 1000)
+
+    def test_waiting_images_split_the_chapter(self):
+        writer = open_epub_writer(self.metadata, self.test_epub_path, "streaming", max_chapter_bytes=0)
+        with mock.patch("app.core.epub_writer.MAX_WAITING_IMAGE_BYTES", 10):
+            writer.start_chapter("Chapter 1")
+            for i in range(3):
+                writer.write(f'<div class="figure"><img src="images/image_{i}.png" alt=""/></div>')
+                writer.add_image(BookImage(f"images/image_{i}.png", "image/png", b"x" * 8, 1, 1))
+            writer.end_chapter()
+            writer.close()
+        with zipfile.ZipFile(self.test_epub_path) as archive:
+            names = [name for name in archive.namelist() if name.startswith("EPUB/chapter") or name.startswith("EPUB/images")]
+        # Two waiting images pass the limit, so the file is split to write them out
+        self.assertEqual(names, [
+            "EPUB/chapter_1.xhtml", "EPUB/images/image_0.png", "EPUB/images/image_1.png",
+            "EPUB/chapter_1_2.xhtml", "EPUB/images/image_2.png",
+        ])
+
+    def test_output_profiles(self):
+        image = BookImage("images/image_1.png", "image/png", b"\x89PNG" + bytes(2000), 10, 10)
+        sizes = {}
+        for profile in ("fast", "balanced", "small"):
+            with self.subTest(profile=profile):
+                writer = open_epub_writer(self.metadata, self.test_epub_path, "streaming", profile=profile)
+                writer.add_image(image)
+                for i in range(20):
+                    writer.add_chapter(f"Chapter {i}", "<p>Some fairly repetitive chapter text.</p>" * 50)
+                report = writer.close()
+                self.assertEqual(report["profile"], profile)
+                self.assertEqual(report["bytes"], os.path.getsize(self.test_epub_path))
+                self.assertGreaterEqual(report["seconds"], 0)
+                sizes[profile] = report["bytes"]
+
+                with zipfile.ZipFile(self.test_epub_path) as archive:
+                    stored = archive.getinfo("EPUB/images/image_1.png").compress_type == zipfile.ZIP_STORED
+                    self.assertEqual(stored, profile != "small")
+                    css = archive.read("EPUB/style/nav.css").decode("utf-8")
+                    self.assertEqual("\n" in css, profile != "small")
+                book = epub.read_epub(self.test_epub_path)
+                self.assertEqual(len(book.toc), 20)
+        self.assertLess(sizes["small"], sizes["fast"])
+
+    def test_ebooklib_compress_level(self):
+        sizes = {}
+        for profile in ("fast", "small"):
+            writer = open_epub_writer(self.metadata, self.test_epub_path, "ebooklib", profile=profile)
+            for i in range(20):
+                writer.add_chapter(f"Chapter {i}", "".join(f"<p>Line {i * j % 97} of {j}.</p>" for j in range(200)))
+            writer.close()
+            sizes[profile] = os.path.getsize(self.test_epub_path)
+            with zipfile.ZipFile(self.test_epub_path) as archive:
+                entries = archive.infolist()
+                self.assertEqual((entries[0].filename, entries[0].compress_type), ("mimetype", zipfile.ZIP_STORED))
+                self.assertIsNone(archive.testzip())
+        self.assertLess(sizes["small"], sizes["fast"])
+
+    def test_unknown_profile(self):
+        with self.assertRaises(ValueError):
+            open_epub_writer(self.metadata, self.test_epub_path, profile="tiny")
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            open_epub_writer(self.metadata, self.test_epub_path, "docx")
+
+    def test_streaming_writer_is_deterministic(self):
+        self.metadata["modified"] = "2024-01-01T00:00:00Z"
+        self.write_book("streaming")
+        with open(self.test_epub_path, "rb") as f:
+            first = f.read()
+        self.write_book("streaming")
+        with open(self.test_epub_path, "rb") as f:
+            self.assertEqual(f.read(), first)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+# tests/test_image_pipeline.py
+import unittest
+import io
+import os
+import zipfile
+import fitz
+from PIL import Image
+from app.core.pdf_parser import parse_pdf
+from app.core.page_extractor import extract_pages
+from app.core.structure_analyzer import analyze_structure
+from app.core.epub_generator import create_epub
+from app.core.image_pipeline import ImagePipeline, attach_figures, encode_image, shutdown_image_pool
+
+class TestImagePipeline(unittest.TestCase):
+    def setUp(self):
+        self.test_pdf_path = "tests/sample_images.pdf"
+        self.test_epub_path = "tests/sample_images.epub"
+        self.create_sample_pdf(self.test_pdf_path)
+        self.doc = fitz.open(self.test_pdf_path)
+
+    def tearDown(self):
+        self.doc.close()
+        shutdown_image_pool()
+        for path in (self.test_pdf_path, self.test_epub_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def image_data(self, size, color, fmt):
+        output = io.BytesIO()
+        Image.new("RGB", size, color).save(output, fmt)
+        return output.getvalue()
+
+    def create_sample_pdf(self, filepath):
+        photo = self.image_data((2400, 1200), (200, 30, 30), "JPEG")
+        icon = self.image_data((16, 16), (0, 0, 0), "PNG")
+        doc = fitz.open()
+        for i in range(2):
+            page = doc.new_page()
+            page.insert_text((50, 60), f"Text above the photo on page {i + 1}.", fontsize=12)
+            # The same photo on both pages, stored twice
+            page.insert_image(fitz.Rect(50, 100, 450, 300), stream=photo)
+            page.insert_image(fitz.Rect(50, 320, 60, 330), stream=icon)
+            page.insert_text((50, 360), f"Text below the photo on page {i + 1}.", fontsize=12)
+        doc.save(filepath)
+        doc.close()
+
+    def test_figures_are_deduplicated(self):
+        for workers in (1, 2):
+            with self.subTest(workers=workers):
+                pages = extract_pages(self.doc)
+                images = ImagePipeline(self.doc, workers=workers)
+                self.assertEqual(attach_figures(pages, images), 2)  # The icon is too small
+                self.assertEqual(pages[0].figures[0].file_name, pages[1].figures[0].file_name)
+                self.assertTrue(pages[0].figures[0].file_name.endswith(".jpg"))
+
+                encoded = list(images.finish())
+                self.assertEqual(len(encoded), 1)
+                self.assertEqual((encoded[0].width, encoded[0].height), (1264, 632))
+                self.assertEqual(encoded[0].media_type, "image/jpeg")
+                self.assertEqual(images.stats()["images"], 1)
+
+    def test_searchable_scans_are_left_out(self):
+        doc = fitz.open()
+        for i in range(3):
+            page = doc.new_page()
+            page.insert_image(page.rect, stream=self.image_data((600, 800), (250, 250, 250), "PNG"))
+            page.insert_text((50, 60), f"Recognised text of page {i + 1}.", fontsize=12)
+        page = doc.new_page()  # A full-page plate without text stays a figure
+        page.insert_image(page.rect, stream=self.image_data((600, 800), (30, 30, 30), "PNG"))
+        images = ImagePipeline(doc, workers=1)
+        pages = extract_pages(doc)
+        self.assertEqual(attach_figures(pages, images), 1)
+        self.assertEqual([len(page.figures or []) for page in pages], [0, 0, 0, 1])
+        self.assertEqual(len(list(images.finish())), 1)
+        doc.close()
+
+    def test_drain_keeps_the_newest_images(self):
+        doc = fitz.open()
+        page = doc.new_page()
+        for i in range(4):
+            page.insert_image(fitz.Rect(50, 50 + 100 * i, 150, 140 + 100 * i),
+                              stream=self.image_data((50, 40), (60 * i, 0, 0), "PNG"))
+        images = ImagePipeline(doc, workers=1)
+        attach_figures(extract_pages(doc), images)
+        drained = [image.file_name for image in images.drain(1)]
+        remaining = [image.file_name for image in images.finish()]
+        doc.close()
+        self.assertEqual(len(drained), 3)
+        self.assertEqual(len(remaining), 1)
+        self.assertEqual(len(set(drained + remaining)), 4)
+
+    def test_encode_image_keeps_small_images(self):
+        data = self.image_data((100, 50), (0, 128, 0), "PNG")
+        self.assertEqual(encode_image(data, "png"), (data, 100, 50))
+        # Recompressing keeps whichever encoding is smaller
+        recompressed, _, _ = encode_image(data, "png", recompress=True)
+        self.assertLessEqual(len(recompressed), len(data))
+        encoded, width, height = encode_image(data, "jpeg", max_width=40)
+        self.assertEqual((width, height), (40, 20))
+        self.assertEqual(Image.open(io.BytesIO(encoded)).format, "JPEG")
+
+    def test_images_in_epub(self):
+        parsed_pdf = analyze_structure(parse_pdf(self.doc), self.doc)
+        create_epub(parsed_pdf, self.test_epub_path)
+        self.assertEqual(parsed_pdf.metadata["figures"], 2)
+        self.assertEqual(parsed_pdf.metadata["images"]["images"], 1)
+
+        with zipfile.ZipFile(self.test_epub_path) as archive:
+            image_names = [name for name in archive.namelist() if name.startswith("EPUB/images/")]
+            self.assertEqual(len(image_names), 1)
+            image_name = image_names[0][len("EPUB/"):]
+            self.assertIn(f'href="{image_name}"', archive.read("EPUB/content.opf").decode("utf-8"))
+            chapter = archive.read("EPUB/chapter_1.xhtml").decode("utf-8")
+            self.assertEqual(chapter.count(f'<img src="{image_name}" alt=""/>'), 2)
+            # The figure sits between the text above and below it
+            self.assertLess(chapter.index("Text above the photo on page 1."), chapter.index(image_name))
+            self.assertLess(chapter.index(image_name), chapter.index("Text below the photo on page 1."))
+
+if __name__ == '__main__':
+    unittest.main()
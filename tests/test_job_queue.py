@@ -0,0 +1,117 @@
+# tests/test_job_queue.py
+import unittest
+import hashlib
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from unittest import mock
+from app.core.job_queue import JobQueue
+
+def fake_convert(pdf_path, profile=None, digest=None):
+    with open(pdf_path) as f:
+        content = f.read()
+    if content == "broken":
+        raise ValueError("Error opening PDF file")
+    if content == "slow":
+        time.sleep(0.5)
+    if digest != hashlib.sha256(content.encode("utf-8")).hexdigest():
+        raise ValueError("Wrong digest")
+    return f"{os.path.basename(pdf_path)}:{profile}"
+
+def fake_key(digest, profile=None):
+    return f"{digest}-{profile}"
+
+class TestJobQueue(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = "tests/test_job_queue"
+        os.makedirs(self.test_dir, exist_ok=True)
+        self.queue = None
+
+    def tearDown(self):
+        if self.queue is not None:
+            self.queue.shutdown()
+        shutil.rmtree(self.test_dir)
+
+    def make_queue(self, workers=1, max_depth=4, key=None):
+        if self.queue is not None:
+            self.queue.shutdown()
+        self.queue = JobQueue(fake_convert, workers=workers, max_depth=max_depth,
+                              directory=os.path.join(self.test_dir, "jobs"), key=key)
+        return self.queue
+
+    def make_pdf(self, name, content="pdf"):
+        path = os.path.join(self.test_dir, name)
+        with open(path, "w") as f:
+            f.write(content)
+        return path
+
+    def wait(self, job, timeout=30):
+        deadline = time.time() + timeout
+        while job.status in ("queued", "running") and time.time() < deadline:
+            time.sleep(0.05)
+        return job
+
+    def test_job_runs_in_background(self):
+        for workers in (1, 2):
+            with self.subTest(workers=workers):
+                queue = self.make_queue(workers)
+                job = queue.submit(self.make_pdf("book.pdf"), "small")
+                self.assertIs(queue.get(job.id), job)
+                self.assertEqual(self.wait(job).status, "done")
+                self.assertEqual(job.result, "book.pdf:small")
+                self.assertFalse(os.path.exists(job.pdf_path))  # The copy of the upload is removed
+                self.assertEqual(queue.stats(), {"queued": 0, "running": 0, "finished": 1})
+                queue.shutdown()
+
+    def test_digest_is_computed_while_copying(self):
+        job = self.make_queue().submit(self.make_pdf("book.pdf"), "small")
+        self.assertEqual(job.digest, hashlib.sha256(b"pdf").hexdigest())
+        self.assertEqual(self.wait(job).status, "done")  # fake_convert checks the digest it is given
+
+    def test_workers_are_spawned(self):
+        with mock.patch("app.core.job_queue.ProcessPoolExecutor", wraps=ProcessPoolExecutor) as executor:
+            job = self.make_queue().submit(self.make_pdf("book.pdf"))
+        self.assertEqual(executor.call_args.kwargs["mp_context"].get_start_method(), "spawn")
+        self.assertEqual(self.wait(job).status, "done")
+
+    def test_failed_job(self):
+        job = self.make_queue().submit(self.make_pdf("broken.pdf", "broken"))
+        self.assertEqual(self.wait(job).status, "failed")
+        self.assertEqual(job.error, "Error opening PDF file")
+        self.assertIsNone(job.result)
+
+    def test_queue_depth_and_position(self):
+        queue = self.make_queue(workers=1, max_depth=1)
+        running = queue.submit(self.make_pdf("first.pdf", "slow"))
+        waiting = queue.submit(self.make_pdf("second.pdf", "slow"))
+        self.assertEqual((running.status, waiting.status), ("running", "queued"))
+        self.assertEqual(queue.position(waiting), 1)
+        with self.assertRaises(ValueError):
+            queue.submit(self.make_pdf("third.pdf"))
+        self.assertEqual(self.wait(waiting).status, "done")
+        self.assertEqual(running.status, "done")
+        self.assertEqual(queue.position(waiting), 0)
+
+    def test_same_key_is_merged(self):
+        queue = self.make_queue(key=fake_key)
+        path = self.make_pdf("book.pdf", "slow")
+        job = queue.submit(path)
+        self.assertEqual(job.key, fake_key(job.digest))
+        self.assertIs(queue.submit(path), job)
+        self.assertEqual(len(os.listdir(queue.directory)), 1)  # The merged upload's copy is removed
+        self.assertIsNot(queue.submit(path, "small"), job)
+        self.wait(job)
+        self.assertIsNot(queue.submit(path), job)  # Finished jobs are not reused
+        self.assertIsNone(self.make_queue().submit(path).key)  # Without a key function, jobs are never merged
+
+    def test_finished_jobs_expire(self):
+        queue = self.make_queue()
+        queue.retention = 0
+        job = self.wait(queue.submit(self.make_pdf("book.pdf")))
+        time.sleep(0.01)
+        queue.submit(self.make_pdf("other.pdf"))
+        self.assertIsNone(queue.get(job.id))
+
+if __name__ == '__main__':
+    unittest.main()
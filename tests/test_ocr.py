@@ -0,0 +1,180 @@
+import unittest
+import io
+import multiprocessing
+from unittest import mock
+from PIL import Image
+import os
+import sys
+import types
+from app.core import ocr
+from app.core.text_normalizer import normalize_page
+from app.core.ocr import run_ocr, classify_page, get_ocr_engine, shutdown_ocr_pool, PytesseractEngine, TesserocrEngine
+from app.core.ocr import ocr_scale, preprocess_image
+from app.models import Page, Span, PageImage
+
+def make_png(width):
+    buffer = io.BytesIO()
+    Image.new("L", (width, 10), color=0).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+def fake_image_to_string(image, **kwargs):
+    return f"[{image.width}]"
+
+def crashing_image_to_string(image, **kwargs):
+    # Kills the worker on 13 px wide images, as a segfaulting Tesseract would
+    if image.width == 13:
+        os._exit(1)
+    return fake_image_to_string(image, **kwargs)
+
+class FakeTessBaseAPI:
+    instances = 0
+
+    def __init__(self, lang="eng", psm=None, oem=None):
+        FakeTessBaseAPI.instances += 1
+        self.lang = lang
+        self.psm = psm
+        self.variables = {}
+
+    def SetVariable(self, name, value):
+        self.variables[name] = value
+
+    def SetImage(self, image):
+        self.image = image
+
+    def Recognize(self, timeout=0):
+        self.timeout = timeout
+        return self.image.width != 13  # Cancelled on 13 px wide images
+
+    def GetUTF8Text(self):
+        return f"<{self.image.width}>"
+
+    def End(self):
+        pass
+
+class TestOCR(unittest.TestCase):
+    def tearDown(self):
+        shutdown_ocr_pool()
+        ocr._engine = None
+    def test_run_ocr_serial(self):
+        jobs = [(1, [make_png(10), make_png(20)]), (3, [make_png(30)])]
+        with mock.patch("app.core.ocr.pytesseract.image_to_string", side_effect=fake_image_to_string):
+            result = run_ocr(iter(jobs), workers=1)
+        self.assertEqual(result.page_texts, {1: "[10][20]", 3: "[30]"})
+        self.assertEqual(result.text, "[10][20][30]")
+        self.assertEqual(result.failed_pages, [])
+
+    @unittest.skipUnless(multiprocessing.get_start_method() == "fork", "workers inherit the patched OCR function")
+    def test_run_ocr_pool_partial_results(self):
+        jobs = [(page, [make_png(page)]) for page in range(1, 6)]
+        jobs[2] = (3, [b"not an image"])
+        with mock.patch("app.core.ocr.pytesseract.image_to_string", side_effect=fake_image_to_string):
+            result = run_ocr(iter(jobs), workers=2, max_pending=2, allow_partial=True)
+        self.assertEqual(result.failed_pages, [3])
+        self.assertEqual(result.text, "[1][2][4][5]")
+
+    @unittest.skipUnless(multiprocessing.get_start_method() == "fork", "workers inherit the patched OCR function")
+    def test_run_ocr_survives_worker_crash(self):
+        jobs = [(page, [make_png(page)]) for page in range(1, 6)]
+        jobs[2] = (3, [make_png(13)])
+        with mock.patch("app.core.ocr.pytesseract.image_to_string", side_effect=crashing_image_to_string), \
+                mock.patch("builtins.print") as log:
+            result = run_ocr(iter(jobs), workers=2, max_pending=4, allow_partial=True)
+        # The pages that shared the pool with the crashing one are resubmitted
+        self.assertEqual(result.failed_pages, [3])
+        self.assertEqual(result.text, "[1][2][4][5]")
+        self.assertIn("OCR failed on page 3:", log.call_args[0][0])
+
+    def test_failure_names_the_page(self):
+        page = Page(number=7, width=600, height=800, spans=[], images=[])
+        with self.assertRaisesRegex(ValueError, "OCR failed on page 7:"):
+            list(ocr.iter_ocr(iter([((page, [7], [7]), [b"not an image"])]), workers=1, allow_partial=False))
+
+    def test_tesserocr_engine_timeout(self):
+        fake_module = types.SimpleNamespace(PyTessBaseAPI=FakeTessBaseAPI)
+        with mock.patch.dict(sys.modules, {"tesserocr": fake_module}):
+            engine = TesserocrEngine("eng", "")
+            self.assertEqual(engine.image_to_string(Image.new("L", (20, 10)), timeout=2.5), "<20>")
+            self.assertEqual(engine.api.timeout, 2500)
+            with self.assertRaises(TimeoutError):
+                engine.image_to_string(Image.new("L", (13, 10)), timeout=2.5)
+
+    def test_run_ocr_without_partial_results(self):
+        with self.assertRaises(ValueError):
+            run_ocr(iter([(1, [b"not an image"])]), workers=1, allow_partial=False)
+
+    def make_page(self, text, image_bbox=None):
+        spans = [Span(text=text, font="Helvetica", size=12.0, flags=0, bbox=(50, 50, 500, 62))] if text else []
+        images = [PageImage(xref=7, bbox=image_bbox, width=1000, height=1400)] if image_bbox else []
+        return Page(number=1, width=600, height=800, spans=spans, images=images)
+
+    def test_classify_page(self):
+        body = "A perfectly good text layer with enough characters to be trusted."
+        self.assertEqual(classify_page(self.make_page(body))["reason"], "no_images")
+        self.assertEqual(classify_page(self.make_page(body, (0, 0, 600, 800)))["reason"], "text_layer")
+        self.assertEqual(classify_page(self.make_page("", (10, 10, 40, 40)))["reason"], "small_images")
+
+        scanned = classify_page(self.make_page("", (0, 0, 600, 800)))
+        self.assertTrue(scanned["ocr"])
+        self.assertEqual(scanned["reason"], "no_text_layer")
+        self.assertEqual(scanned["image_coverage"], 1.0)
+
+        garbled = classify_page(self.make_page("\ufffd" * 60, (0, 0, 600, 400)))
+        self.assertTrue(garbled["ocr"])
+        self.assertEqual(garbled["reason"], "garbled_text_layer")
+        self.assertEqual(garbled["garbage_ratio"], 1.0)
+
+        # Control characters are gone after normalization, but still count as garbage
+        page = normalize_page(self.make_page("Readable words" + "\x01\x02\x03" * 20, (0, 0, 600, 400)))
+        self.assertEqual(page.spans[0].text, "Readable words")
+        control = classify_page(page)
+        self.assertEqual(control["reason"], "garbled_text_layer")
+        self.assertEqual(control["chars"], 73)
+
+    def test_get_ocr_engine_falls_back_to_pytesseract(self):
+        with mock.patch.dict(sys.modules, {"tesserocr": None}):
+            engine = get_ocr_engine("auto")
+            self.assertIsInstance(engine, PytesseractEngine)
+            engine = get_ocr_engine("tesserocr")
+            self.assertIsInstance(engine, PytesseractEngine)
+
+    def test_tesserocr_engine_is_reused(self):
+        FakeTessBaseAPI.instances = 0
+        fake_module = types.SimpleNamespace(PyTessBaseAPI=FakeTessBaseAPI)
+        with mock.patch.dict(sys.modules, {"tesserocr": fake_module}), mock.patch("app.core.ocr.OCR_ENGINE", "auto"):
+            first = ocr.ocr_images([make_png(10), make_png(20)], lang="eng", config="--psm 6 -c preserve_interword_spaces=1")
+            second = ocr.ocr_images([make_png(30)], lang="eng", config="--psm 6 -c preserve_interword_spaces=1")
+            engine = get_ocr_engine("auto", "eng", "--psm 6 -c preserve_interword_spaces=1")
+
+        self.assertEqual(first + second, ["<10>", "<20>", "<30>"])
+        self.assertEqual(FakeTessBaseAPI.instances, 1)
+        self.assertIsInstance(engine, TesserocrEngine)
+        self.assertEqual(engine.api.psm, 6)
+        self.assertEqual(engine.api.variables, {"preserve_interword_spaces": "1"})
+
+    def test_ocr_scale(self):
+        # 2400 px over 2 inches is 1200 DPI
+        self.assertAlmostEqual(ocr_scale(2400, (144, 200), target_dpi=300), 0.25)
+        self.assertEqual(ocr_scale(300, (144, 200), target_dpi=300), 1.0)
+        self.assertEqual(ocr_scale(2400, None, target_dpi=300), 1.0)
+
+    def test_preprocess_image(self):
+        image = Image.new("RGB", (1200, 800), color="white")
+        image.paste((0, 0, 0), (200, 100, 1000, 700))
+        buffer = io.BytesIO()
+        image.save(buffer, format="JPEG")
+
+        prepared = preprocess_image(buffer.getvalue(), placement=(288, 192), target_dpi=150)
+        self.assertEqual(prepared.mode, "L")
+        # Downscaled by half to 600x400, then cropped to the dark rectangle
+        self.assertLessEqual(abs(prepared.width - 400), 4)
+        self.assertLessEqual(abs(prepared.height - 300), 4)
+
+        binary = preprocess_image(buffer.getvalue(), placement=(288, 192), target_dpi=150, binarize=True)
+        self.assertEqual({value for _, value in binary.getcolors()} - {0, 255}, set())
+
+        blank = io.BytesIO()
+        Image.new("L", (100, 100), color=255).save(blank, format="PNG")
+        self.assertIsNone(preprocess_image(blank.getvalue()))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import unittest
+import io
+import os
+import shutil
+import fitz
+from unittest import mock
+from PIL import Image
+from app.core.ocr_cache import OCRCache, cache_key
+from app.core.ocr import iter_ocr
+from app.core.pdf_parser import ocr_document
+
+class TestOCRCache(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = "tests/test_ocr_cache"
+        os.makedirs(self.test_dir, exist_ok=True)
+        self.cache = OCRCache(os.path.join(self.test_dir, "ocr.sqlite3"), max_bytes=10)
+
+    def tearDown(self):
+        self.cache.close()
+        shutil.rmtree(self.test_dir)
+
+    def test_cache_key(self):
+        self.assertEqual(cache_key(b"image", "eng", ""), cache_key(b"image", "eng", ""))
+        self.assertNotEqual(cache_key(b"image", "eng", ""), cache_key(b"image", "deu", ""))
+        self.assertNotEqual(cache_key(b"image", "eng", ""), cache_key(b"image", "eng", "--psm 6"))
+        self.assertNotEqual(cache_key(b"image", "eng", ""), cache_key(b"other", "eng", ""))
+
+    def test_get_put_and_counters(self):
+        self.assertIsNone(self.cache.get("a"))
+        self.cache.put("a", "text")
+        self.assertEqual(self.cache.get("a"), "text")
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+        self.assertEqual(self.cache.stats(), {"hits": 1, "misses": 1, "entries": 1, "bytes": 4})
+
+    def test_lru_eviction(self):
+        with mock.patch("app.core.ocr_cache.time.time", side_effect=[1, 2, 3, 4]):
+            self.cache.put("a", "1234")
+            self.cache.put("b", "1234")
+            self.cache.get("a")  # "b" is now the least recently used entry
+            self.cache.put("c", "1234")
+        self.assertEqual(self.cache.get("b"), None)
+        self.assertEqual(self.cache.get("a"), "1234")
+        self.assertEqual(self.cache.get("c"), "1234")
+
+    def test_repeated_images_are_ocred_once(self):
+        buffer = io.BytesIO()
+        Image.new("L", (40, 20), color=0).save(buffer, format="PNG")
+        pdf_path = os.path.join(self.test_dir, "repeated.pdf")
+        doc = fitz.open()
+        for _ in range(3):
+            page = doc.new_page()
+            page.insert_image(fitz.Rect(0, 0, 400, 200), stream=buffer.getvalue())
+        doc.save(pdf_path)
+        doc.close()
+
+        cache = OCRCache(os.path.join(self.test_dir, "repeated.sqlite3"))
+        with mock.patch("app.core.ocr.OCR_WORKERS", 1), \
+                mock.patch("app.core.ocr.pytesseract.image_to_string", return_value="logo") as image_to_string:
+            result = ocr_document(pdf_path, cache=cache)
+            self.assertEqual(image_to_string.call_count, 1)
+            self.assertEqual(result.page_texts, {1: "logo", 2: "logo", 3: "logo"})
+            self.assertEqual((result.cache_hits, result.cache_misses), (0, 1))
+
+            result = ocr_document(pdf_path, cache=cache)
+            self.assertEqual(image_to_string.call_count, 1)
+            self.assertEqual((result.cache_hits, result.cache_misses), (1, 0))
+            self.assertEqual(result.text, "logologologo")
+        cache.close()
+
+    def test_workers_extract_images_by_xref(self):
+        buffer = io.BytesIO()
+        Image.new("L", (40, 20), color=0).save(buffer, format="PNG")
+        pdf_path = os.path.join(self.test_dir, "scan.pdf")
+        doc = fitz.open()
+        doc.new_page().insert_image(fitz.Rect(0, 0, 400, 200), stream=buffer.getvalue())
+        doc.save(pdf_path)
+        doc.close()
+
+        handed_out = []
+        def spy(jobs, **kwargs):
+            def recorded():
+                for job in jobs:
+                    handed_out.extend(job[1])
+                    yield job
+            return iter_ocr(recorded(), **kwargs)
+
+        cache = OCRCache(os.path.join(self.test_dir, "scan.sqlite3"))
+        with mock.patch("app.core.ocr.OCR_WORKERS", 1), \
+                mock.patch("app.core.pdf_parser.iter_ocr", side_effect=spy), \
+                mock.patch("app.core.ocr.pytesseract.image_to_string", return_value="scan") as image_to_string:
+            result = ocr_document(pdf_path, cache=cache)
+            self.assertEqual(result.page_texts, {1: "scan"})
+            self.assertEqual(len(handed_out), 1)
+            self.assertIsInstance(handed_out[0], int)  # Only the xref; the image is extracted by the worker
+
+            # The key comes from the raw stream, so the same document opened from memory hits the cache
+            with open(pdf_path, "rb") as f:
+                result = ocr_document(f.read(), cache=cache)
+            self.assertEqual((result.cache_hits, result.cache_misses), (1, 0))
+            self.assertEqual(image_to_string.call_count, 1)
+        cache.close()
+
+if __name__ == '__main__':
+    unittest.main()
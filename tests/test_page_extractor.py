@@ -0,0 +1,111 @@
+import unittest
+import os
+import fitz
+from unittest import mock
+from concurrent.futures import ProcessPoolExecutor
+from app.core.page_extractor import (
+    extract_pages, extract_pages_with_font_stats, iter_extracted_pages, count_fonts, page_ranges, open_pdf,
+)
+from app.core.pdf_parser import iter_parse_pdf
+from app.models import Page
+
+class TestPageExtractor(unittest.TestCase):
+    def setUp(self):
+        # Create a sample PDF for testing
+        self.test_pdf_path = "tests/sample_pages.pdf"
+        self.create_sample_pdf(self.test_pdf_path)
+
+    def tearDown(self):
+        # Clean up the sample PDF
+        os.remove(self.test_pdf_path)
+
+    def create_sample_pdf(self, filepath):
+        doc = fitz.open()
+        page = doc.new_page()
+        page.insert_text((50, 50), "Chapter 1: Introduction", fontsize=14, fontname="Helvetica-Bold")
+        page.insert_text((50, 100), "This is the first paragraph.", fontsize=12)
+        page = doc.new_page()
+        page.insert_text((50, 100), "This is a paragraph on page 2.", fontsize=12)
+        doc.save(filepath)
+        doc.close()
+
+    def test_extract_pages(self):
+        doc = fitz.open(self.test_pdf_path)
+        pages = extract_pages(doc)
+        doc.close()
+
+        self.assertEqual(len(pages), 2)
+        self.assertIsInstance(pages[0], Page)
+        self.assertEqual([page.number for page in pages], [1, 2])
+        self.assertEqual(pages[0].spans[0].text, "Chapter 1: Introduction")
+        self.assertEqual(pages[0].spans[0].font_key, ("Helvetica-Bold", 14.0))
+        self.assertEqual(pages[1].spans[0].text, "This is a paragraph on page 2.")
+        self.assertEqual(pages[0].images, [])
+
+    def test_open_pdf(self):
+        doc, owned = open_pdf(self.test_pdf_path)
+        self.assertTrue(owned)
+        same_doc, owned = open_pdf(doc)
+        self.assertIs(same_doc, doc)
+        self.assertFalse(owned)
+        doc.close()
+
+        with self.assertRaises(ValueError):
+            open_pdf("tests/does_not_exist.pdf")
+
+    def test_page_ranges(self):
+        self.assertEqual(page_ranges(10, 3), [(0, 4), (4, 7), (7, 10)])
+        self.assertEqual(page_ranges(2, 8), [(0, 1), (1, 2)])
+        self.assertEqual(page_ranges(5, 1), [(0, 5)])
+
+    def test_parallel_matches_serial(self):
+        doc = fitz.open()
+        for i in range(7):
+            page = doc.new_page()
+            page.insert_text((50, 50), f"Heading {i}", fontsize=14 + i % 3, fontname="Helvetica-Bold")
+            page.insert_text((50, 100), f"Body text on page {i}.", fontsize=12)
+        doc.save(self.test_pdf_path)
+        doc.close()
+
+        doc = fitz.open(self.test_pdf_path)
+        serial_pages, serial_counts = extract_pages_with_font_stats(doc, workers=1)
+        with mock.patch("app.core.page_extractor.PARALLEL_MIN_PAGES", 1):
+            parallel_pages, parallel_counts = extract_pages_with_font_stats(doc, workers=3)
+        doc.close()
+
+        self.assertIsNone(serial_counts)
+        self.assertEqual(list(parallel_counts.items()), list(count_fonts(serial_pages).items()))
+        self.assertEqual(
+            [(p.number, [(s.text, s.font_key, s.bbox) for s in p.spans]) for p in parallel_pages],
+            [(p.number, [(s.text, s.font_key, s.bbox) for s in p.spans]) for p in serial_pages],
+        )
+
+    def test_streaming_extracts_bounded_runs_in_parallel(self):
+        doc = fitz.open()
+        for i in range(11):
+            doc.new_page().insert_text((50, 100), f"Body text on page {i + 1}.", fontsize=12)
+        doc.save(self.test_pdf_path)
+        doc.close()
+
+        doc = fitz.open(self.test_pdf_path)
+        serial_pages = list(iter_extracted_pages(doc, workers=1))
+        with mock.patch("app.core.page_extractor.PARALLEL_MIN_PAGES", 1), \
+                mock.patch("app.core.page_extractor.ANALYSIS_WORKERS", 2), \
+                mock.patch("app.core.pdf_parser.STREAM_RANGE_PAGES", 2), \
+                mock.patch("app.core.page_extractor.ProcessPoolExecutor", wraps=ProcessPoolExecutor) as executor, \
+                mock.patch.object(ProcessPoolExecutor, "submit", autospec=True, side_effect=ProcessPoolExecutor.submit) as submit:
+            streamed = iter_parse_pdf(doc)
+            first = next(streamed)
+            # Two runs per worker are submitted ahead of the one being yielded, not all six
+            self.assertEqual(submit.call_count, 5)
+            streamed_pages = [first] + list(streamed)
+            self.assertEqual(submit.call_count, 6)
+        doc.close()
+        executor.assert_called_once_with(max_workers=2)
+        self.assertEqual([page_text_of(page) for page in streamed_pages], [page_text_of(page) for page in serial_pages])
+
+def page_text_of(page):
+    return page.number, [span.text for span in page.spans]
+
+if __name__ == '__main__':
+    unittest.main()
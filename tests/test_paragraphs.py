@@ -0,0 +1,81 @@
+import unittest
+import fitz
+from app.core.paragraphs import ParagraphBuilder, TextLine, build_paragraphs
+from app.core.structure_analyzer import classify_spans
+from app.models import Page, Paragraph, Span, TextRun
+
+def make_line(text, x0, y0, page=1, block=0, size=10.0, width=300.0, flags=0):
+    span = Span(text=text, font="Times", size=size, flags=flags, bbox=(x0, y0, x0 + width, y0 + size * 1.2), block=block)
+    return TextLine([span], page)
+
+def paragraphs(lines):
+    return [item[1].text for item in build_paragraphs(("line", line, line.page_number) for line in lines)]
+
+class TestParagraphs(unittest.TestCase):
+    def test_lines_merge_into_one_paragraph(self):
+        lines = [
+            make_line("The first line of a", 50, 100),
+            make_line("paragraph goes on and", 50, 112),
+            make_line("ends here.", 50, 124, width=60),
+        ]
+        self.assertEqual(paragraphs(lines), ["The first line of a paragraph goes on and ends here."])
+
+    def test_paragraph_breaks(self):
+        lines = [
+            make_line("A short paragraph.", 50, 100, width=100),
+            make_line("Indented start of the next", 70, 112, width=280),
+            make_line("one, which continues.", 50, 124),
+            make_line("After a gap.", 50, 160),
+            make_line("• A list item", 50, 172),
+        ]
+        self.assertEqual(paragraphs(lines), [
+            "A short paragraph.",
+            "Indented start of the next one, which continues.",
+            "After a gap.",
+            "• A list item",
+        ])
+
+    def test_hyphenated_words_are_rejoined(self):
+        lines = [
+            make_line("a hyphen-", 50, 100),
+            make_line("ated word and a well-", 50, 112),
+            make_line("Known name, soft\u00ad", 50, 124),
+            make_line("ly.", 50, 136),
+        ]
+        self.assertEqual(paragraphs(lines), ["a hyphenated word and a well- Known name, softly."])
+
+    def test_paragraph_continues_across_pages(self):
+        lines = [
+            make_line("A sentence cut by the", 50, 700, page=1),
+            make_line("page break.", 50, 60, page=2),
+            make_line("A new paragraph.", 50, 100, page=2, block=1),
+        ]
+        self.assertEqual(paragraphs(lines), ["A sentence cut by the page break.", "A new paragraph."])
+
+    def test_inline_styles(self):
+        spans = [
+            Span(text="Plain ", font="Times", size=10.0, flags=0, bbox=(50, 100, 80, 112)),
+            Span(text="bold", font="Times-Bold", size=10.0, flags=fitz.TEXT_FONT_BOLD, bbox=(80, 100, 100, 112)),
+            Span(text=" and ", font="Times", size=10.0, flags=0, bbox=(100, 100, 120, 112)),
+            Span(text="italic.", font="Times-Italic", size=10.0, flags=fitz.TEXT_FONT_ITALIC, bbox=(120, 100, 150, 112)),
+        ]
+        builder = ParagraphBuilder()
+        builder.add(TextLine(spans, 1))
+        self.assertEqual(builder.flush().runs, [
+            TextRun("Plain "), TextRun("bold", bold=True), TextRun(" and "), TextRun("italic.", italic=True),
+        ])
+
+    def test_classify_spans_builds_paragraphs(self):
+        page = Page(number=1, width=600, height=800, images=[], spans=[
+            Span(text="Title", font="Big", size=20.0, flags=0, bbox=(50, 50, 150, 74), block=0),
+            Span(text="Body text that", font="Times", size=10.0, flags=0, bbox=(50, 100, 350, 112), block=1, line=0),
+            Span(text="wraps.", font="Times", size=10.0, flags=0, bbox=(50, 112, 90, 124), block=1, line=1),
+        ])
+        classified = list(classify_spans([page], [("Big", 20.0)]))
+        self.assertEqual(classified, [
+            ("heading", "Title", 1),
+            ("text", Paragraph([TextRun("Body text that wraps.")], 1), 1),
+        ])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -30,6 +30,13 @@ class TestPDFParser(unittest.TestCase):
         self.assertEqual(parsed_pdf.title, "Sample PDF")
         self.assertEqual(parsed_pdf.author, "Test Author")
 
+    def test_parse_pdf_uses_text_layer(self):
+        parsed_pdf = parse_pdf(self.test_pdf_path)
+        self.assertIn("Sample PDF Content", parsed_pdf.content)
+        self.assertEqual(parsed_pdf.metadata["ocr_pages"][0]["page"], 1)
+        self.assertFalse(parsed_pdf.metadata["ocr_pages"][0]["ocr"])
+        self.assertEqual(parsed_pdf.metadata["ocr_failed_pages"], [])
+
     def test_extract_metadata(self):
         doc = fitz.open(self.test_pdf_path)
         metadata = extract_metadata(doc)
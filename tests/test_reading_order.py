@@ -0,0 +1,78 @@
+import unittest
+import random
+import fitz
+from app.core.reading_order import xy_cut, order_spans, _column_intervals, _split
+from app.core.page_extractor import extract_page, page_text
+from app.models import Span
+
+class TestReadingOrder(unittest.TestCase):
+    def test_two_columns_between_full_width_blocks(self):
+        boxes = [
+            (320, 100, 550, 150),  # 0: right column, first paragraph
+            (50, 40, 550, 70),     # 1: full-width title
+            (50, 100, 280, 150),   # 2: left column, first paragraph
+            (50, 160, 280, 210),   # 3: left column, second paragraph (aligned with 4)
+            (320, 160, 550, 210),  # 4: right column, second paragraph
+            (50, 230, 550, 260),   # 5: full-width figure caption
+            (320, 280, 550, 330),  # 6: right column below the caption
+            (50, 280, 280, 330),   # 7: left column below the caption
+        ]
+        self.assertEqual(xy_cut(boxes), [1, 2, 3, 0, 4, 5, 7, 6])
+
+    def test_sidebar(self):
+        boxes = [
+            (200, 50, 550, 100),   # 0: main text
+            (50, 50, 180, 300),    # 1: sidebar
+            (200, 110, 550, 160),  # 2: main text
+        ]
+        self.assertEqual(xy_cut(boxes), [1, 0, 2])
+
+    def test_overlapping_blocks(self):
+        boxes = [(50, 60, 300, 100), (100, 50, 400, 90)]
+        self.assertEqual(xy_cut(boxes), [1, 0])
+        self.assertEqual(xy_cut([]), [])
+
+    def test_column_intervals_match_split(self):
+        rng = random.Random(7)
+        for _ in range(200):
+            boxes = []
+            for _ in range(rng.randint(1, 12)):
+                x0 = rng.uniform(0, 500)
+                boxes.append((x0, 0, x0 + rng.uniform(1, 150), 10))
+            indexes = list(range(len(boxes)))
+            starts, ends = _column_intervals(rng.sample(indexes, len(indexes)), boxes, 20)
+            columns = _split(indexes, boxes, 0, 20)
+            self.assertEqual(starts, [min(boxes[i][0] for i in column) for column in columns])
+            self.assertEqual(ends, [max(boxes[i][2] for i in column) for column in columns])
+
+    def test_long_two_column_page(self):
+        # Both columns of every row are regrouped into one group before it is cut
+        boxes = []
+        for row in range(2000):
+            boxes.append((50, row * 20, 280, row * 20 + 15))
+            boxes.append((320, row * 20, 550, row * 20 + 15))
+        boxes.append((50, -40, 550, -20))  # Full-width title
+        order = xy_cut(boxes)
+        self.assertEqual(order, [4000] + list(range(0, 4000, 2)) + list(range(1, 4000, 2)))
+
+    def test_order_spans_keeps_spans_of_a_block_together(self):
+        spans = [
+            Span(text="right", font="F", size=10, flags=0, bbox=(320, 100, 550, 112), block=0),
+            Span(text="left 1", font="F", size=10, flags=0, bbox=(50, 100, 280, 112), block=1, line=0),
+            Span(text="left 2", font="F", size=10, flags=0, bbox=(50, 112, 280, 124), block=1, line=1),
+        ]
+        self.assertEqual([span.text for span in order_spans(spans)], ["left 1", "left 2", "right"])
+
+    def test_extracted_columns_read_in_order(self):
+        doc = fitz.open()
+        page = doc.new_page()
+        # Written right column first, so the content stream order is wrong
+        page.insert_textbox(fitz.Rect(320, 100, 550, 300), "Right column text.", fontsize=11)
+        page.insert_textbox(fitz.Rect(50, 40, 550, 70), "Full Width Title", fontsize=16)
+        page.insert_textbox(fitz.Rect(50, 100, 280, 300), "Left column text.", fontsize=11)
+        text = page_text(extract_page(page))
+        doc.close()
+        self.assertEqual(text.split("\n")[:3], ["Full Width Title", "Left column text.", "Right column text."])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+import os
+import fitz
+from app.core.running_lines import RunningLineIndex, normalize_line
+from app.core.page_extractor import extract_pages, page_text
+from app.core.pdf_parser import parse_pdf
+from app.core.structure_analyzer import analyze_structure
+
+class TestRunningLines(unittest.TestCase):
+    def setUp(self):
+        # Create a sample PDF with a running head and page numbers
+        self.test_pdf_path = "tests/sample_running_lines.pdf"
+        doc = fitz.open()
+        for i in range(6):
+            page = doc.new_page()
+            page.insert_text((50, 40), "A Book Title", fontsize=8, fontname="Times-Italic")
+            page.insert_text((50, 300), f"Body text of page {i + 1}.", fontsize=12)
+            if i == 0:
+                page.insert_text((50, 60), "Only once at the top", fontsize=12)
+            page.insert_text((290, 820), f"{i + 1}", fontsize=8, fontname="Times-Italic")
+        doc.save(self.test_pdf_path)
+        doc.close()
+        self.doc = fitz.open(self.test_pdf_path)
+
+    def tearDown(self):
+        self.doc.close()
+        os.remove(self.test_pdf_path)
+
+    def test_normalize_line(self):
+        self.assertEqual(normalize_line("  Page 12  of 300 "), "page # of #")
+        self.assertEqual(normalize_line("Page 13 of 300"), normalize_line("page 12 OF 300"))
+
+    def test_strip_running_lines(self):
+        pages = extract_pages(self.doc)
+        index = RunningLineIndex.from_pages(pages)
+        stripped = [index.strip(page) for page in pages]
+        self.assertEqual(sorted(page_text(stripped[0]).splitlines()), ["Body text of page 1.", "Only once at the top"])
+        self.assertEqual(page_text(stripped[3]), "Body text of page 4.\n")
+        self.assertEqual(index.removed_lines, 12)
+        self.assertIn("A Book Title", page_text(pages[0]))  # The original pages are untouched
+
+    def test_few_pages_are_kept(self):
+        pages = extract_pages(self.doc)[:2]
+        index = RunningLineIndex.from_pages(pages)
+        self.assertEqual([index.strip(page) for page in pages], pages)
+
+    def test_document_sample(self):
+        index = RunningLineIndex.from_document_sample(self.doc, 3)
+        self.assertEqual(index.page_count, 3)
+        self.assertEqual(page_text(index.strip(extract_pages(self.doc)[5])), "Body text of page 6.\n")
+
+    def test_analyze_structure_drops_running_lines(self):
+        parsed_pdf = analyze_structure(parse_pdf(self.doc), self.doc)
+        self.assertEqual(parsed_pdf.metadata["running_lines_removed"], 12)
+        content = [str(part) for chapter in parsed_pdf.chapters for part in chapter.content]
+        self.assertNotIn("A Book Title", content)
+        self.assertIn("Body text of page 6.", content)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+from app.core.span_table import SpanTable, iter_span_tables, select_heading_fonts
+from app.core.page_extractor import count_fonts
+from app.models import Page, Span
+
+def make_page(number, spans):
+    return Page(number=number, width=600, height=800, spans=[
+        Span(text=text, font=font, size=size, flags=0, bbox=(0, i * 10, 100, i * 10 + 9), line=i)
+        for i, (text, font, size) in enumerate(spans)
+    ], images=[])
+
+class TestSpanTable(unittest.TestCase):
+    def setUp(self):
+        self.pages = [
+            make_page(1, [("Title ", "Bold", 14.0), ("Body", "Regular", 12.0), ("  ", "Regular", 12.0)]),
+            make_page(2, []),
+            make_page(3, [("Note", "Italic", 9.0), ("More body", "Regular", 12.0), ("Sub", "Bold", 13.0)]),
+        ]
+
+    def test_columns(self):
+        table = SpanTable.from_pages(self.pages)
+        self.assertEqual(len(table), 6)
+        self.assertEqual(table.fonts, ["Bold", "Regular", "Italic"])
+        self.assertEqual(table.font_ids.tolist(), [0, 1, 1, 2, 1, 0])
+        self.assertEqual(table.pages.tolist(), [1, 1, 1, 3, 3, 3])
+        self.assertEqual(table.bboxes.shape, (6, 4))
+        self.assertEqual(table.span_text(0), "Title")
+        self.assertEqual(table.nonblank_mask().tolist(), [True, True, False, True, True, True])
+
+    def test_font_counts_match_first_seen_order(self):
+        expected = {("Bold", 14.0): 1, ("Regular", 12.0): 3, ("Italic", 9.0): 1, ("Bold", 13.0): 1}
+        self.assertEqual(list(SpanTable.from_pages(self.pages).font_counts().items()), list(expected.items()))
+        # Chunked counting merges to the same result
+        self.assertEqual(list(count_fonts(self.pages).items()), list(expected.items()))
+        chunks = list(iter_span_tables(self.pages, max_spans=2))
+        self.assertEqual([[page.number for page in pages] for pages, _ in chunks], [[1], [2, 3]])
+
+    def test_heading_mask(self):
+        table = SpanTable.from_pages(self.pages)
+        mask = table.heading_mask([("Bold", 14.0), ("Bold", 13.0), ("Missing", 10.0)])
+        self.assertEqual(mask.tolist(), [True, False, False, False, False, True])
+
+    def test_select_heading_fonts(self):
+        font_counts = {("A", 1.0): 5, ("B", 1.0): 2, ("C", 1.0): 9, ("D", 1.0): 2, ("E", 1.0): 7}
+        self.assertEqual(select_heading_fonts(font_counts, 0.4), [("B", 1.0), ("D", 1.0)])
+        self.assertEqual(select_heading_fonts({}), [])
+
+    def test_empty_table(self):
+        table = SpanTable.from_pages([])
+        self.assertEqual(table.font_counts(), {})
+        self.assertEqual(table.heading_mask([("Bold", 14.0)]).tolist(), [])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,12 +2,19 @@
 import unittest
 import os
 import fitz
-from app.core.pdf_parser import parse_pdf
+from app.core.pdf_parser import parse_pdf, iter_parse_pdf
+from app.core.page_extractor import iter_pages
 from app.core.structure_analyzer import (
     analyze_structure,
     identify_heading_fonts,
     identify_chapters_and_headings,
-    get_font_stats
+    get_font_stats,
+    build_chapters,
+    classify_spans,
+    iter_structure,
+    sample_font_stats,
+    outline_entries,
+    iter_outline_structure
 )
 from app.models import ParsedPDF, Chapter, Heading
 
@@ -72,5 +79,85 @@ class TestStructureAnalyzer(unittest.TestCase):
         self.assertEqual(len(chapters[1].headings), 1)
         self.assertEqual(chapters[1].headings[0].text, "Heading 1")
 
+    def test_streaming_matches_batch(self):
+        heading_fonts = [("Helvetica-Bold", 14.0), ("Helvetica-Bold", 13.0)]
+        batch = build_chapters(classify_spans(self.parsed_pdf.pages, heading_fonts))
+
+        metadata = {}
+        events = list(iter_structure(iter_parse_pdf(self.doc, metadata), heading_fonts))
+        self.assertEqual(events[0], ("chapter_start", batch[0].title, batch[0].page_number))
+        self.assertEqual(events[-1], ("chapter_end",))
+        expected = [Heading(event[1], event[2]) if event[0] == "heading" else event[1] for event in events[1:-1]]
+        self.assertEqual(expected, batch[0].content)
+        self.assertEqual(len(metadata["ocr_pages"]), 2)
+
+        self.assertEqual(get_font_stats(iter_pages(self.doc)), get_font_stats(self.doc))
+
+    def test_sample_font_stats(self):
+        doc = fitz.open()
+        for i in range(120):
+            page = doc.new_page()
+            page.insert_text((50, 50), f"Section {i}", fontsize=14, fontname="Helvetica-Bold")
+            for line in range(3 + i % 4):
+                page.insert_text((50, 100 + 20 * line), f"Body line {line}", fontsize=12)
+            if i % 10 == 0:
+                page.insert_text((50, 300), "Note", fontsize=9)
+
+        heading_fonts = identify_heading_fonts(get_font_stats(doc))
+        font_counts, report = sample_font_stats(doc, min_pages=50, batch=10, max_fraction=0.5, max_error=0.05)
+        self.assertEqual(report["mode"], "sampled")
+        self.assertLess(report["sample_pages"], 120)
+        self.assertLessEqual(report["estimated_error"], 0.05)
+        self.assertEqual(identify_heading_fonts(font_counts), heading_fonts)
+
+        # An unreachable error bound makes the sample ambiguous: fall back to a full scan
+        font_counts, report = sample_font_stats(doc, min_pages=50, batch=10, max_fraction=0.5, max_error=0.0)
+        self.assertEqual(report["mode"], "full")
+        self.assertEqual(report["fallback"], "ambiguous sample")
+        self.assertEqual(font_counts, get_font_stats(doc))
+
+        # Short documents are always scanned in full
+        font_counts, report = sample_font_stats(doc)
+        self.assertEqual((report["mode"], report["sample_pages"]), ("full", 120))
+        doc.close()
+
+    def test_outline_strategy(self):
+        doc = fitz.open()
+        page = doc.new_page()
+        page.insert_text((50, 50), "Preface", fontsize=14, fontname="Helvetica-Bold")
+        page.insert_text((50, 100), "Front matter text.", fontsize=12)
+        for i in range(2):
+            page = doc.new_page()
+            page.insert_text((50, 50), f"Part {i + 1}", fontsize=14)
+            page.insert_text((50, 100), f"Text of part {i + 1}.", fontsize=12)
+            page.insert_text((50, 150), "Details", fontsize=12)
+            page.insert_text((50, 200), "More text.", fontsize=12)
+        doc.set_toc([[1, "Part 1", 2], [2, "Details", 2], [1, "Part 2", 3], [1, "Nowhere", -1]])
+        pdf_bytes = doc.tobytes()
+        doc.close()
+
+        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+        self.assertEqual(outline_entries(doc), [(1, "Part 1", 2), (2, "Details", 2), (1, "Part 2", 3)])
+        parsed_pdf = analyze_structure(parse_pdf(doc), doc)
+        self.assertEqual(parsed_pdf.metadata["structure_strategy"], "outline+fonts")
+        # The front matter before the first entry is structured by font analysis
+        self.assertEqual(len(parsed_pdf.chapters), 3)
+        self.assertEqual(str(parsed_pdf.chapters[0].content[-1]), "Front matter text.")
+        self.assertEqual([chapter.title for chapter in parsed_pdf.chapters[1:]], ["Part 1", "Part 2"])
+        part_1 = parsed_pdf.chapters[1]
+        self.assertEqual(part_1.page_number, 2)
+        self.assertEqual([str(part) for part in part_1.content], ["Text of part 1.", "Details", "More text."])
+        self.assertEqual([(heading.text, heading.level) for heading in part_1.headings], [("Details", 1)])
+        self.assertEqual([str(part) for part in parsed_pdf.chapters[2].content], ["Text of part 2.", "Details", "More text."])
+
+        # The streaming events close every chapter
+        events = list(iter_outline_structure(parse_pdf(doc).pages, outline_entries(doc), []))
+        self.assertEqual(sum(event[0] == "chapter_start" for event in events), 3)
+        self.assertEqual(sum(event[0] == "chapter_end" for event in events), 3)
+        doc.close()
+
+        self.assertEqual(outline_entries(self.doc), [])
+        self.assertEqual(analyze_structure(self.parsed_pdf, self.doc).metadata["structure_strategy"], "fonts")
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
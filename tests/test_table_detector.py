@@ -0,0 +1,110 @@
+import unittest
+import os
+import re
+import fitz
+from concurrent.futures import ProcessPoolExecutor
+from unittest import mock
+from app.core.table_detector import is_table_candidate, find_tables, attach_tables, iter_with_tables
+from app.core.page_extractor import extract_pages, open_pdf
+from app.core.upload import read_upload
+from app.core.pdf_parser import parse_pdf
+from app.core.structure_analyzer import analyze_structure
+from app.core.epub_generator import create_epub
+from app.models import Table
+from ebooklib import epub
+
+class TestTableDetector(unittest.TestCase):
+    def setUp(self):
+        # Create a sample PDF: a ruled table, plain text and two-column text
+        self.test_pdf_path = "tests/sample_tables.pdf"
+        self.test_epub_path = "tests/sample_tables.epub"
+        doc = fitz.open()
+        page = doc.new_page()
+        page.insert_text((50, 50), "Results table", fontsize=12)
+        xs, ys = [50, 150, 250, 350], [100, 120, 140, 160, 180]
+        for y in ys:
+            page.draw_line((50, y), (350, y))
+        for x in xs:
+            page.draw_line((x, 100), (x, 180))
+        data = [["Name", "Qty", "Price"], ["Apple", "3", "1.20"], ["Pear", "5", "0.80"], ["Plum", "7", "2.10"]]
+        for r, row in enumerate(data):
+            for c, cell in enumerate(row):
+                page.insert_text((xs[c] + 5, ys[r] + 14), cell, fontsize=10)
+        page.insert_text((50, 230), "After the table.", fontsize=12)
+
+        page = doc.new_page()
+        page.insert_text((50, 100), "Just a paragraph of ordinary text.", fontsize=12)
+
+        page = doc.new_page()
+        for i in range(6):
+            page.insert_text((50, 100 + 14 * i), "Left column text running wide across", fontsize=11)
+            page.insert_text((320, 100 + 14 * i), "right column text running wide across", fontsize=11)
+        doc.save(self.test_pdf_path)
+        doc.fullcopy_page(0)  # A second table page, so the candidates can be split across workers
+        self.test_routed_pdf_path = "tests/sample_tables_routed.pdf"
+        doc.save(self.test_routed_pdf_path)
+        doc.close()
+        self.doc = fitz.open(self.test_pdf_path)
+
+    def tearDown(self):
+        self.doc.close()
+        os.remove(self.test_pdf_path)
+        os.remove(self.test_routed_pdf_path)
+        if os.path.exists(self.test_epub_path):
+            os.remove(self.test_epub_path)
+
+    def test_prefilter(self):
+        pages = extract_pages(self.doc)
+        self.assertEqual([is_table_candidate(page) for page in pages], [True, False, False])
+
+    def test_find_tables_on_candidates_only(self):
+        tables = find_tables(self.doc, [1, 2])
+        self.assertEqual(list(tables), [1])
+        table = tables[1][0]
+        self.assertTrue(table.header)
+        self.assertEqual(table.rows[0], ["Name", "Qty", "Price"])
+        self.assertEqual(table.rows[-1], ["Plum", "7", "2.10"])
+
+        pages = extract_pages(self.doc)
+        self.assertEqual(attach_tables(self.doc, pages), 1)
+        self.assertEqual(len(pages[0].tables), 1)
+        self.assertIsNone(pages[1].tables)
+
+    def test_tables_in_structure_and_epub(self):
+        parsed_pdf = analyze_structure(parse_pdf(self.doc), self.doc)
+        self.assertEqual(parsed_pdf.metadata["table_candidate_pages"], 1)
+        content = [part for chapter in parsed_pdf.chapters for part in chapter.content]
+        tables = [part for part in content if isinstance(part, Table)]
+        self.assertEqual(len(tables), 1)
+        texts = [str(part) for part in content if not isinstance(part, Table)]
+        self.assertIn("After the table.", texts)
+        self.assertFalse(any("Apple" in text for text in texts))  # Cell text is not repeated as paragraphs
+
+        create_epub(parsed_pdf, self.test_epub_path)
+        book = epub.read_epub(self.test_epub_path)
+        html = re.sub(r">\s+<", "><", book.get_item_with_href("chapter_1.xhtml").get_content().decode("utf-8"))
+        self.assertIn("<th>Name</th>", html)
+        self.assertIn("<td>Apple</td><td>3</td><td>1.20</td>", html)
+
+    def test_tables_in_parallel_from_memory(self):
+        # As in the app: the document is opened from memory, so only the upload path lets workers open it
+        upload = read_upload(self.test_routed_pdf_path)
+        doc, _ = open_pdf(upload)
+        try:
+            with mock.patch("app.core.table_detector.ProcessPoolExecutor", wraps=ProcessPoolExecutor) as executor, \
+                    mock.patch("app.core.table_detector.ANALYSIS_WORKERS", 2), \
+                    mock.patch("app.core.table_detector.TABLE_PARALLEL_MIN_PAGES", 1):
+                parsed_pdf = analyze_structure(parse_pdf(doc, upload), doc)
+                self.assertEqual(executor.call_count, 1)
+                self.assertEqual([page.number for page in parsed_pdf.pages if page.tables], [1, 4])
+
+                pages = list(iter_with_tables(doc, extract_pages(doc), upload.path))
+                self.assertEqual(executor.call_count, 2)
+                self.assertEqual([page.number for page in pages], [1, 2, 3, 4])
+                self.assertEqual([page.number for page in pages if page.tables], [1, 4])
+                self.assertEqual(pages[3].tables[0].rows[-1], ["Plum", "7", "2.10"])
+        finally:
+            doc.close()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+import fitz
+from app.core.text_normalizer import normalize_text, normalize_page
+from app.core.page_extractor import extract_page
+from app.models import Page, Span
+
+class TestTextNormalizer(unittest.TestCase):
+    def test_ligatures(self):
+        self.assertEqual(normalize_text("\ufb01nd the \ufb02ow of e\ufb00ort, o\ufb03ce"), "find the flow of effort, office")
+
+    def test_soft_hyphens(self):
+        self.assertEqual(normalize_text("hy\u00adphen\u00adated"), "hyphenated")
+        # A trailing soft hyphen marks a line-end break and is left to the paragraph builder
+        self.assertEqual(normalize_text("hyphen\u00ad"), "hyphen\u00ad")
+
+    def test_whitespace_and_invisible_characters(self):
+        self.assertEqual(normalize_text("a\u00a0b\u2009c\t d\u200be\ufeff"), "a b c de")
+        self.assertEqual(normalize_text("  two   spaces  "), " two spaces ")
+        self.assertEqual(normalize_text("bell\x07 and\r\nline"), "bell and\nline")
+
+    def test_line_end_hyphenation(self):
+        self.assertEqual(normalize_text("a hyphen-\nated word"), "a hyphenated word")
+        self.assertEqual(normalize_text("the 1990-\n2000 range"), "the 1990-\n2000 range")
+        self.assertEqual(normalize_text("see Part-\nTwo"), "see Part-\nTwo")
+
+    def test_unicode_composition(self):
+        self.assertEqual(normalize_text("cafe\u0301 \u2010 \u2212"), "caf\u00e9 - -")
+
+    def test_normalize_page(self):
+        page = Page(number=1, width=600, height=800, images=[], ocr_text="o\ufb00ice  hours", spans=[
+            Span(text="\ufb01rst\u00a0line", font="F", size=10, flags=0, bbox=(0, 0, 10, 10)),
+        ])
+        normalize_page(page)
+        self.assertEqual(page.spans[0].text, "first line")
+        self.assertEqual(page.ocr_text, "office hours")
+        self.assertEqual(page.control_chars, 0)
+
+    def test_normalize_page_counts_control_characters(self):
+        page = Page(number=1, width=600, height=800, images=[], spans=[
+            Span(text="a\x01b\x02\tc\n", font="F", size=10, flags=0, bbox=(0, 0, 10, 10)),
+            Span(text="\x1f", font="F", size=10, flags=0, bbox=(0, 10, 10, 20)),
+        ])
+        normalize_page(page)
+        self.assertEqual([span.text for span in page.spans], ["ab c\n", ""])
+        self.assertEqual(page.control_chars, 3)  # Tab and line feed are not counted
+
+    def test_extracted_pages_are_normalized(self):
+        doc = fitz.open()
+        page = doc.new_page()
+        page.insert_text((50, 100), "no\u00a0break  here", fontsize=12)
+        text = "".join(span.text for span in extract_page(page).spans)
+        doc.close()
+        self.assertEqual(text, "no break here")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+import unittest
+import hashlib
+import io
+import os
+import fitz
+from unittest import mock
+from app.core.upload import copy_upload, read_upload, map_upload
+from app.core.page_extractor import open_pdf
+from app.core.pdf_parser import parse_pdf
+
+class TestUpload(unittest.TestCase):
+    def setUp(self):
+        # Create a sample PDF for testing
+        self.test_pdf_path = "tests/sample_upload.pdf"
+        doc = fitz.open()
+        for i in range(3):
+            page = doc.new_page()
+            page.insert_text((50, 100), f"Page {i + 1} content", fontsize=12)
+        doc.set_metadata({"title": "Sample Upload", "author": "Test Author"})
+        doc.save(self.test_pdf_path)
+        doc.close()
+        with open(self.test_pdf_path, "rb") as f:
+            self.data = f.read()
+
+    def tearDown(self):
+        os.remove(self.test_pdf_path)
+
+    def test_read_upload_from_path(self):
+        upload = read_upload(self.test_pdf_path, chunk_size=100)
+        self.assertEqual(upload.digest, hashlib.sha256(self.data).hexdigest())
+        self.assertEqual(bytes(upload.data), self.data)
+        self.assertEqual(upload.size, len(self.data))
+        self.assertEqual(upload.path, self.test_pdf_path)
+
+    def test_read_upload_from_stream(self):
+        upload = read_upload(io.BytesIO(self.data), chunk_size=64)
+        self.assertEqual(upload.digest, hashlib.sha256(self.data).hexdigest())
+        self.assertEqual(bytes(upload.data), self.data)
+        self.assertIsNone(upload.path)
+
+    def test_copy_upload(self):
+        copy_path = "tests/sample_upload_copy.pdf"
+        try:
+            digest = copy_upload(self.test_pdf_path, copy_path, chunk_size=100)
+            with open(copy_path, "rb") as f:
+                self.assertEqual(f.read(), self.data)
+        finally:
+            os.remove(copy_path)
+        self.assertEqual(digest, hashlib.sha256(self.data).hexdigest())
+
+    def test_read_upload_buffer_fits_the_data(self):
+        for chunk_size in (100, len(self.data), 1 << 20):
+            with self.subTest(chunk_size=chunk_size):
+                upload = read_upload(self.test_pdf_path, chunk_size=chunk_size)
+                self.assertEqual(len(upload.data.obj), len(self.data))
+                upload = read_upload(io.BytesIO(self.data), chunk_size=chunk_size)  # Size unknown
+                self.assertEqual(len(upload.data.obj), len(self.data))
+                self.assertEqual(bytes(upload.data), self.data)
+
+    def test_read_upload_with_known_digest(self):
+        with mock.patch("app.core.upload.hashlib.sha256") as sha256:
+            upload = read_upload(self.test_pdf_path, chunk_size=100, digest="abc")
+        sha256.assert_not_called()
+        self.assertEqual(upload.digest, "abc")
+        self.assertEqual(bytes(upload.data), self.data)
+
+    def test_map_upload(self):
+        upload = map_upload(self.test_pdf_path, chunk_size=100)
+        self.assertEqual(upload.digest, hashlib.sha256(self.data).hexdigest())
+        doc, owned = open_pdf(upload)
+        self.assertTrue(owned)
+        self.assertEqual(doc.page_count, 3)
+        doc.close()
+
+    def test_open_pdf_from_buffers(self):
+        for source in (self.data, bytearray(self.data), memoryview(self.data)):
+            doc, owned = open_pdf(source)
+            self.assertTrue(owned)
+            self.assertEqual(doc[1].get_text().strip(), "Page 2 content")
+            doc.close()
+
+    def test_open_pdf_without_memoryview_streams(self):
+        # PyMuPDF before 1.26 rejects memoryview streams
+        with mock.patch("app.core.page_extractor.STREAM_ACCEPTS_MEMORYVIEW", False):
+            for source in (memoryview(self.data), read_upload(self.test_pdf_path), map_upload(self.test_pdf_path)):
+                doc, _ = open_pdf(source)
+                self.assertEqual(doc.page_count, 3)
+                doc.close()
+
+    def test_parse_pdf_records_content_hash(self):
+        upload = read_upload(self.test_pdf_path)
+        parsed_pdf = parse_pdf(upload)
+        self.assertEqual(parsed_pdf.title, "Sample Upload")
+        self.assertEqual(parsed_pdf.metadata["content_hash"], upload.digest)
+        self.assertEqual(len(parsed_pdf.pages), 3)
+
+if __name__ == '__main__':
+    unittest.main()